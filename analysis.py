@@ -0,0 +1,219 @@
+import math
+
+from columnar import load_numpy
+from result_set import ResultSet
+from sql_builder import resolve_column
+
+# Các phép phân tích được hỗ trợ
+ANALYSES = ("describe", "correlation", "trend", "percentiles", "yoy")
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+def _number(value):
+    """Chuyển số NumPy sang số Python, NaN/vô cực thành None"""
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value) or math.isinf(value):
+        return None
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+def numeric_columns(data, columns=None):
+    """
+    Chọn các cột số của ColumnarResult, trả về danh sách (tên cột, mảng float64).
+    Nếu chỉ định columns thì cột không phải số sẽ báo lỗi.
+    """
+    np = load_numpy()
+    if columns:
+        names = [resolve_column(name, list(data.columns)) for name in columns]
+    else:
+        names = [name for name, array in zip(data.columns, data.arrays) if array.dtype.kind in "iufb"]
+
+    selected = []
+    for name in names:
+        array = data.column(name)
+        if array.dtype.kind not in "iufb":
+            raise ValueError(f"Cột {name} không phải cột số (kiểu {array.dtype})")
+        selected.append((name, array.astype(np.float64, copy=False)))
+    return selected
+
+def describe(data, columns=None, percentiles=DEFAULT_PERCENTILES):
+    """Thống kê mô tả từng cột số: count, nulls, sum, mean, std, min, các phân vị, max"""
+    np = load_numpy()
+    result = {}
+    for name, values in numeric_columns(data, columns):
+        valid = values[~np.isnan(values)]
+        stats = {"count": int(valid.size), "nulls": int(values.size - valid.size)}
+        if valid.size:
+            stats.update({
+                "sum": _number(valid.sum()),
+                "mean": _number(valid.mean()),
+                "std": _number(valid.std(ddof=1)) if valid.size > 1 else None,
+                "min": _number(valid.min()),
+            })
+            for q, value in zip(percentiles, np.percentile(valid, percentiles)):
+                stats[f"p{q:g}"] = _number(value)
+            stats["max"] = _number(valid.max())
+        result[name] = stats
+    return result
+
+def percentiles(data, columns=None, qs=DEFAULT_PERCENTILES):
+    """Các phân vị (0-100) của từng cột số"""
+    np = load_numpy()
+    result = {}
+    for name, values in numeric_columns(data, columns):
+        valid = values[~np.isnan(values)]
+        result[name] = {f"p{q:g}": _number(value) for q, value in zip(qs, np.percentile(valid, qs))} if valid.size else {}
+    return result
+
+def correlation(data, columns=None):
+    """Ma trận tương quan Pearson giữa các cột số (chỉ dùng các dòng không có NULL)"""
+    np = load_numpy()
+    selected = numeric_columns(data, columns)
+    if len(selected) < 2:
+        raise ValueError("Cần ít nhất hai cột số để tính tương quan")
+    matrix = np.vstack([values for _, values in selected])
+    matrix = matrix[:, ~np.isnan(matrix).any(axis=0)]
+    if matrix.shape[1] < 2:
+        raise ValueError("Không đủ dòng không có NULL để tính tương quan")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coefficients = np.corrcoef(matrix)
+    return {
+        "columns": [name for name, _ in selected],
+        "matrix": [[_number(value) for value in row] for row in coefficients],
+        "rows": int(matrix.shape[1]),
+    }
+
+def _axis(data, x_column):
+    """Trục x cho xu hướng: số thứ tự dòng, cột số, hoặc cột ngày (tính theo số ngày)"""
+    np = load_numpy()
+    if not x_column:
+        return None, np.arange(len(data), dtype=np.float64), "row"
+    name = resolve_column(x_column, list(data.columns))
+    array = data.column(name)
+    if array.dtype.kind in "iufb":
+        return name, array.astype(np.float64, copy=False), "value"
+    try:
+        days = np.array([None if value is None else str(value)[:10] for value in array], dtype="datetime64[D]")
+    except ValueError:
+        raise ValueError(f"Cột {name} không phải cột số hoặc ngày (YYYY-MM-DD) để làm trục xu hướng")
+    values = days.astype(np.float64)
+    values[np.isnat(days)] = np.nan
+    return name, values, "day"
+
+def trend(data, columns=None, x_column=None):
+    """Xu hướng tuyến tính (bình phương tối thiểu) của từng cột số theo trục x: hệ số góc, hệ số chặn, R²"""
+    np = load_numpy()
+    x_name, x, unit = _axis(data, x_column)
+    result = {}
+    for name, y in numeric_columns(data, columns):
+        if name == x_name:
+            continue
+        mask = ~(np.isnan(x) | np.isnan(y))
+        if mask.sum() < 2:
+            result[name] = {"points": int(mask.sum())}
+            continue
+        xs, ys = x[mask], y[mask]
+        slope, intercept = np.polyfit(xs, ys, 1)
+        residual = ys - (slope * xs + intercept)
+        total = ((ys - ys.mean()) ** 2).sum()
+        result[name] = {
+            "slope": _number(slope),
+            "intercept": _number(intercept),
+            "r2": _number(1 - (residual ** 2).sum() / total) if total else None,
+            "points": int(mask.sum()),
+            "per": unit,
+            "direction": "tăng" if slope > 0 else "giảm" if slope < 0 else "không đổi",
+        }
+    return result
+
+def _key_value(key):
+    """Giá trị khóa giống nhau ở mọi shard: số nguyên dạng thực (5.0 do cột có NULL) thành 5, NULL/NaN thành None"""
+    if key is None or (isinstance(key, float) and math.isnan(key)):
+        return None
+    if isinstance(key, float) and key.is_integer():
+        return int(key)
+    return key
+
+def _group_sums(np, keys, values):
+    """
+    Tổng theo khóa: trả về dictionary {(dạng chuỗi của khóa hoặc None): (khóa, tổng)}.
+    Khóa được so khớp theo dạng chuỗi để cùng một giá trị ở các shard có kiểu cột khác nhau
+    (int64, float64 khi có NULL, object) vẫn trùng nhau; NULL là khóa riêng, không lẫn với chuỗi rỗng.
+    """
+    if keys.dtype.kind == "O":
+        codes = {}
+        inverse = np.fromiter((codes.setdefault(key, len(codes)) for key in map(_key_value, keys)),
+                              dtype=np.int64, count=len(keys))
+        unique = list(codes)
+    else:
+        # Khóa số: nhóm bằng NumPy, chỉ các khóa phân biệt đi qua Python
+        unique, inverse = np.unique(keys, return_inverse=True)
+        unique = [_key_value(key) for key in unique.tolist()]
+    sums = np.bincount(inverse.ravel(), weights=np.nan_to_num(values), minlength=len(unique))
+    result = {}
+    for key, total in zip(unique, sums.tolist()):
+        text = None if key is None else str(key)
+        previous = result.get(text)
+        result[text] = (key, total if previous is None else previous[1] + total)
+    return result
+
+def year_over_year(shards, columns=None, key_column=None):
+    """
+    So sánh giữa các shard (ví dụ revenue_2020, revenue_2021) theo thứ tự đã cho: tổng từng cột số của mỗi shard
+    và chênh lệch tuyệt đối / phần trăm so với shard trước. Có key_column thì so sánh theo từng giá trị khóa
+    (ví dụ tháng, product_id).
+
+    Args:
+        shards: Danh sách (nhãn, ColumnarResult) cùng câu truy vấn
+
+    Returns:
+        ResultSet với các cột <cột>@<nhãn>, <cột>_delta@<nhãn>, <cột>_pct@<nhãn>
+    """
+    np = load_numpy()
+    if len(shards) < 2:
+        raise ValueError("Cần ít nhất hai database để so sánh (compare_with)")
+
+    labels = [label for label, _ in shards]
+    first = shards[0][1]
+    key_name = resolve_column(key_column, list(first.columns)) if key_column else None
+    names = [name for name, _ in numeric_columns(first, columns) if name != key_name]
+
+    # Giá trị tổng theo (cột, shard): {khóa: tổng}
+    totals = {}
+    for label, data in shards:
+        by_name = dict(numeric_columns(data, names))
+        keys = data.column(resolve_column(key_name, list(data.columns))) if key_name else None
+        for name in names:
+            values = by_name[name]
+            if keys is None:
+                totals[(name, label)] = {None: (None, float(np.nansum(values)))}
+            else:
+                totals[(name, label)] = _group_sums(np, keys, values)
+
+    # Giá trị khóa hiển thị: lấy từ shard đầu tiên có khóa đó
+    display = {}
+    for sums in totals.values():
+        for text, (key, _) in sums.items():
+            display.setdefault(text, key)
+    all_keys = sorted(display, key=lambda text: (text is None, text or ""))
+    result_columns = [key_name] if key_name else []
+    for name in names:
+        result_columns.extend(f"{name}@{label}" for label in labels)
+        for label in labels[1:]:
+            result_columns.extend([f"{name}_delta@{label}", f"{name}_pct@{label}"])
+
+    rows = []
+    for key in all_keys:
+        row = [display[key]] if key_name else []
+        for name in names:
+            values = [totals[(name, label)].get(key, (None, None))[1] for label in labels]
+            row.extend(_number(value) for value in values)
+            for previous, current in zip(values, values[1:]):
+                if previous is None or current is None:
+                    row.extend([None, None])
+                    continue
+                delta = current - previous
+                row.extend([_number(delta), _number(round(delta / previous * 100, 4)) if previous else None])
+        rows.append(tuple(row))
+    return ResultSet(result_columns, rows)
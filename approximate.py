@@ -0,0 +1,272 @@
+import math
+import statistics
+from collections import Counter
+
+from result_set import ResultSet
+from sql_builder import parse_dimension, parse_measure, resolve_column
+
+# Các phép đo có khoảng tin cậy (ước lượng không chệch từ mẫu)
+ESTIMABLE_FUNCTIONS = ("count", "sum", "avg")
+
+class _GroupStats:
+    """Tổng tích lũy của một nhóm trong một tầng (stratum) mẫu"""
+    __slots__ = ("hits", "non_null", "sums", "squares", "minimum", "maximum", "values")
+
+    def __init__(self, measure_count):
+        self.hits = 0
+        self.non_null = [0] * measure_count
+        self.sums = [0.0] * measure_count
+        self.squares = [0.0] * measure_count
+        self.minimum = [None] * measure_count
+        self.maximum = [None] * measure_count
+        self.values = [None] * measure_count
+
+def _accumulate(rows, group_size, measures, column_index):
+    """Gom các dòng mẫu của một tầng theo nhóm, tính tổng, tổng bình phương, min/max"""
+    groups = {}
+    for row in rows:
+        key = tuple(row[:group_size])
+        stats = groups.get(key)
+        if stats is None:
+            stats = groups[key] = _GroupStats(len(measures))
+        stats.hits += 1
+        for i, measure in enumerate(measures):
+            if measure.column == "*":
+                continue
+            value = row[column_index[measure.column]]
+            if value is None:
+                continue
+            stats.non_null[i] += 1
+            if measure.func == "count_distinct":
+                if stats.values[i] is None:
+                    stats.values[i] = Counter()
+                stats.values[i][value] += 1
+            elif measure.func in ("min", "max"):
+                if stats.minimum[i] is None or value < stats.minimum[i]:
+                    stats.minimum[i] = value
+                if stats.maximum[i] is None or value > stats.maximum[i]:
+                    stats.maximum[i] = value
+            else:
+                number = float(value)
+                stats.sums[i] += number
+                stats.squares[i] += number * number
+    return groups
+
+def _total_variance(total, square_total, probes, population):
+    """Phương sai của ước lượng tổng N * mean(y) với mẫu ngẫu nhiên đơn giản không hoàn lại"""
+    if probes <= 1 or population <= probes:
+        return 0.0
+    variance = max(square_total - total * total / probes, 0.0) / (probes - 1)
+    return population * population * (1 - probes / population) * variance / probes
+
+def _estimate_group(strata_stats, measures, z):
+    """
+    Ước lượng giá trị một nhóm từ các tầng mẫu (Horvitz-Thompson cho count/sum, ước lượng tỷ số cho avg).
+
+    Returns:
+        danh sách (ước lượng, cận dưới, cận trên) cho từng phép đo
+    """
+    results = []
+    for i, measure in enumerate(measures):
+        func = measure.func
+
+        if func in ("count", "sum"):
+            estimate = 0.0
+            variance = 0.0
+            for stats, probes, population in strata_stats:
+                if func == "count":
+                    hits = stats.hits if measure.column == "*" else stats.non_null[i]
+                    total, square_total = hits, hits
+                else:
+                    total, square_total = stats.sums[i], stats.squares[i]
+                estimate += population * total / probes
+                variance += _total_variance(total, square_total, probes, population)
+            margin = z * math.sqrt(variance)
+            if func == "count":
+                estimate = round(estimate)
+            results.append((estimate, estimate - margin, estimate + margin))
+
+        elif func == "avg":
+            sum_estimate = sum(population * stats.sums[i] / probes for stats, probes, population in strata_stats)
+            count_estimate = sum(population * stats.non_null[i] / probes for stats, probes, population in strata_stats)
+            if not count_estimate:
+                results.append((None, None, None))
+                continue
+            ratio = sum_estimate / count_estimate
+            # Tuyến tính hóa: phần dư e = x - ratio trên các dòng có giá trị
+            variance = 0.0
+            for stats, probes, population in strata_stats:
+                residual = stats.sums[i] - ratio * stats.non_null[i]
+                residual_square = stats.squares[i] - 2 * ratio * stats.sums[i] + ratio * ratio * stats.non_null[i]
+                variance += _total_variance(residual, residual_square, probes, population)
+            margin = z * math.sqrt(variance) / count_estimate
+            results.append((ratio, ratio - margin, ratio + margin))
+
+        elif func in ("min", "max"):
+            # Min/max của mẫu chỉ là cận (không có khoảng tin cậy)
+            values = [getattr(stats, "minimum" if func == "min" else "maximum")[i] for stats, _, _ in strata_stats]
+            values = [value for value in values if value is not None]
+            value = (min(values) if func == "min" else max(values)) if values else None
+            results.append((value, None, None))
+
+        else:
+            # count_distinct: ước lượng GEE (Charikar et al.): sqrt(N/n) * f1 + tổng các f_j với j >= 2
+            merged = Counter()
+            for stats, _, _ in strata_stats:
+                if stats.values[i]:
+                    merged.update(stats.values[i])
+            sampled = sum(merged.values())
+            estimated_rows = sum(population * stats.non_null[i] / probes for stats, probes, population in strata_stats)
+            singletons = sum(1 for count in merged.values() if count == 1)
+            repeated = len(merged) - singletons
+            if sampled:
+                estimate = math.sqrt(max(estimated_rows, sampled) / sampled) * singletons + repeated
+                results.append((round(estimate), None, None))
+            else:
+                results.append((0, None, None))
+    return results
+
+def _draw_strata(server, table_name, columns, filters, sample_size, sampling, strata, seed):
+    """Lấy mẫu theo kiểu uniform (một tầng) hoặc stratified (chia đều khoảng khóa thành nhiều tầng)"""
+    bounds = server.get_key_bounds(table_name) if sampling == "stratified" else None
+    if bounds is None:
+        sample = server.sample_rows(table_name, columns, sample_size, filters, seed=seed, count_population=True)
+        if sample["status"] != "success":
+            return sample, None
+        return None, [sample]
+
+    # Stratified: khoảng khóa [low, high] được chia thành các đoạn liên tiếp có kích thước biết trước,
+    # mỗi đoạn được lấy mẫu riêng với cùng số lượng
+    low, high = bounds
+    width = (high - low + 1) / strata
+    per_stratum = max(sample_size // strata, 1)
+    samples = []
+    for index in range(strata):
+        stratum_bounds = (low + int(round(index * width)), low + int(round((index + 1) * width)) - 1)
+        if stratum_bounds[1] < stratum_bounds[0]:
+            continue
+        sample = server.sample_rows(table_name, columns, per_stratum, filters,
+                                    seed=None if seed is None else seed + index, key_bounds=stratum_bounds)
+        if sample["status"] != "success":
+            return sample, None
+        samples.append(sample)
+    return None, samples
+
+def approximate_aggregate(server, table_name, measures, group_by=None, filters=None, order_by=None, limit=1000,
+                          sample_size=10000, confidence=0.95, sampling="uniform", strata=10,
+                          target_error=None, max_rounds=4, seed=None):
+    """
+    Tổng hợp xấp xỉ trên mẫu ngẫu nhiên, kèm khoảng tin cậy.
+
+    Args:
+        server: DatabaseServer đang kết nối
+        sampling: "uniform" (một mẫu ngẫu nhiên đơn giản) hoặc "stratified" (chia khoảng khóa thành `strata` tầng)
+        target_error: Sai số tương đối mục tiêu (ví dụ 0.01 = 1%); nếu có, kích thước mẫu được tăng gấp đôi
+                      sau mỗi vòng cho tới khi đạt hoặc hết max_rounds
+        confidence: Mức tin cậy của khoảng tin cậy (mặc định 0.95)
+
+    Returns:
+        dictionary kết quả giống DatabaseServer.aggregate, kèm thông tin mẫu và các vòng tinh chỉnh
+    """
+    if sampling not in ("uniform", "stratified"):
+        return {"status": "error", "message": f"Kiểu lấy mẫu không hợp lệ: {sampling}. Các kiểu hợp lệ: uniform, stratified"}
+    if not 0 < confidence < 1:
+        return {"status": "error", "message": "confidence phải nằm trong khoảng (0, 1)"}
+
+    try:
+        table_name, all_columns = server.get_column_names(table_name)
+        parsed = [parse_measure(spec) for spec in measures]
+        dimensions = [parse_dimension(spec, all_columns) for spec in (group_by or [])]
+        if any(dimension.bucket is not None for dimension in dimensions):
+            raise ValueError("Chế độ approx chưa hỗ trợ nhóm theo thời gian, hãy dùng mode=\"exact\"")
+        group_columns = [dimension.column for dimension in dimensions]
+        parsed = [measure._replace(column=measure.column if measure.column == "*" else resolve_column(measure.column, all_columns))
+                  for measure in parsed]
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+    value_columns = []
+    for measure in parsed:
+        if measure.column != "*" and measure.column not in value_columns:
+            value_columns.append(measure.column)
+    columns = group_columns + value_columns
+    column_index = {column: len(group_columns) + i for i, column in enumerate(value_columns)}
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+    rounds = []
+    current_size = sample_size
+    for round_number in range(max(max_rounds, 1)):
+        error, samples = _draw_strata(server, table_name, columns or None, filters, current_size, sampling, strata,
+                                      None if seed is None else seed + round_number * 1000)
+        if error:
+            return error
+
+        strata_groups = [(_accumulate(sample["data"].rows, len(group_columns), parsed, column_index),
+                          sample["probes"], sample["key_range"]) for sample in samples if sample["probes"]]
+        group_keys = []
+        seen = set()
+        for groups, _, _ in strata_groups:
+            for key in groups:
+                if key not in seen:
+                    seen.add(key)
+                    group_keys.append(key)
+        if not group_by and not group_keys:
+            group_keys = [()]
+
+        empty = _GroupStats(len(parsed))
+        estimates = {}
+        worst_error = 0.0
+        for key in group_keys:
+            per_stratum = [(groups.get(key, empty), probes, population) for groups, probes, population in strata_groups]
+            estimates[key] = _estimate_group(per_stratum, parsed, z)
+            for measure, (value, low, high) in zip(parsed, estimates[key]):
+                if measure.func in ESTIMABLE_FUNCTIONS and value and low is not None:
+                    worst_error = max(worst_error, (high - low) / 2 / abs(value))
+
+        sampled_rows = sum(len(sample["data"]) for sample in samples)
+        exact = all(sample["method"] == "full" for sample in samples)
+        rounds.append({"sample_size": current_size, "sampled_rows": sampled_rows,
+                       "max_relative_error": round(worst_error, 6)})
+        if exact or target_error is None or worst_error <= target_error:
+            break
+        current_size *= 2
+
+    # Dựng kết quả: mỗi phép đo có thể kèm cột cận dưới/cận trên
+    result_columns = list(group_columns)
+    for measure in parsed:
+        result_columns.append(measure.alias)
+        if measure.func in ESTIMABLE_FUNCTIONS:
+            result_columns.extend([f"{measure.alias}_ci_low", f"{measure.alias}_ci_high"])
+
+    rows = []
+    for key in group_keys:
+        row = list(key)
+        for measure, (value, low, high) in zip(parsed, estimates[key]):
+            row.append(value)
+            if measure.func in ESTIMABLE_FUNCTIONS:
+                row.extend([low, high])
+        rows.append(tuple(row))
+
+    # Sắp xếp và giới hạn trên kết quả ước lượng
+    for item in reversed(order_by or group_columns):
+        name = item.lstrip("-")
+        if name in result_columns:
+            index = result_columns.index(name)
+            rows.sort(key=lambda row: (row[index] is None, row[index]), reverse=item.startswith("-"))
+    if limit is not None:
+        rows = rows[:int(limit)]
+
+    probes = sum(sample["probes"] or 0 for sample in samples)
+    population = sum(sample["key_range"] or 0 for sample in samples)
+    data = ResultSet(result_columns, rows)
+    return {
+        "status": "success",
+        "mode": "exact" if exact else "approx",
+        "data": data,
+        "count": len(data),
+        "method": samples[0]["method"] if samples else None,
+        "sampling": sampling if len(samples) > 1 else "uniform",
+        "sample_fraction": round(probes / population, 6) if population else None,
+        "confidence": confidence,
+        "rounds": rounds
+    }
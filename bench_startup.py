@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+# Benchmark thời gian import và khởi động (cold start) của mcp_tool.py.
+# Mỗi phiên client stdio sinh ra một process server mới, nên các con số này
+# cộng thẳng vào thời gian phản hồi đầu tiên của agent.
+
+SERVER_SCRIPT = "mcp_tool.py"
+
+def measure_import(runs):
+    """Đo thời gian `import mcp_tool` bằng -X importtime, trả về (danh sách ms, module nặng nhất)"""
+    timings = []
+    heaviest = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import mcp_tool, sys; print('mysql.connector' in sys.modules)"],
+            capture_output=True,
+            text=True,
+            encoding="utf-8"
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+        # Mỗi dòng: "import time: self [us] | cumulative | imported package"
+        entries = []
+        for line in proc.stderr.splitlines():
+            match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+            if match:
+                entries.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+
+        top_level = [cumulative for cumulative, indent, _ in entries if indent == 1]
+        timings.append(sum(top_level) / 1000)
+        heaviest = sorted(entries, reverse=True)[:10]
+
+        if proc.stdout.strip() == "True":
+            print("[WARN] mysql.connector đã bị import ngay khi load mcp_tool")
+    return timings, heaviest
+
+async def _first_response(cwd):
+    """Khởi động server qua stdio, trả về (ms tới initialize, ms tới kết quả tool đầu tiên)"""
+    server_params = StdioServerParameters(command=sys.executable, args=[SERVER_SCRIPT], cwd=cwd)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as errlog:
+        async with stdio_client(server_params, errlog=errlog) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                initialized = time.perf_counter()
+                await session.call_tool("list_available_databases", {})
+                first_result = time.perf_counter()
+    return (initialized - start) * 1000, (first_result - start) * 1000
+
+def measure_startup(runs, cwd):
+    """Đo thời gian khởi động server và trả lời tool đầu tiên"""
+    init_times = []
+    first_times = []
+    for _ in range(runs):
+        init_ms, first_ms = asyncio.run(_first_response(cwd))
+        init_times.append(init_ms)
+        first_times.append(first_ms)
+    return init_times, first_times
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import và cold start của mcp_tool.py")
+    parser.add_argument("--runs", type=int, default=5, help="Số lần đo (mặc định: 5)")
+    parser.add_argument("--skip-startup", action="store_true", help="Chỉ đo thời gian import")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="Trả về mã lỗi nếu median thời gian import vượt ngưỡng này")
+    parser.add_argument("--max-startup-ms", type=float, default=None,
+                        help="Trả về mã lỗi nếu median thời gian tới kết quả tool đầu tiên vượt ngưỡng này")
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    failed = False
+
+    import_times, heaviest = measure_import(args.runs)
+    import_median = statistics.median(import_times)
+    print(f"[IMPORT] median {import_median:.1f} ms (min {min(import_times):.1f}, max {max(import_times):.1f})")
+    for cumulative, _, module in heaviest:
+        print(f"    {cumulative / 1000:8.1f} ms  {module}")
+    if args.max_import_ms is not None and import_median > args.max_import_ms:
+        print(f"[FAIL] Thời gian import vượt ngưỡng {args.max_import_ms} ms")
+        failed = True
+
+    if not args.skip_startup:
+        init_times, first_times = measure_startup(args.runs, cwd)
+        first_median = statistics.median(first_times)
+        print(f"[STARTUP] initialize median {statistics.median(init_times):.1f} ms, "
+              f"tool đầu tiên median {first_median:.1f} ms")
+        if args.max_startup_ms is not None and first_median > args.max_startup_ms:
+            print(f"[FAIL] Thời gian khởi động vượt ngưỡng {args.max_startup_ms} ms")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+
+from result_encoder import dumps
+from summaries import CACHE_DIR
+
+class CatalogCache:
+    """
+    Cache catalog (bảng, cột, chỉ mục, số dòng, khóa ngoại) của từng database đã đăng ký.
+    Catalog chỉ được lấy lại khi phiên bản dữ liệu (get_data_version) thay đổi hoặc bị xóa khỏi cache.
+
+    Bản chụp được lưu ra file (path) sau mỗi lần cập nhật và nạp lại khi khởi động (load),
+    nên sau khi khởi động lại chỉ các database có phiên bản đổi mới phải đọc lại catalog.
+
+    Với MySQL, catalog được giữ riêng theo server đã kết nối ("<tên>@host:port"): các replica có dấu phiên bản
+    (UPDATE_TIME, TABLE_ROWS...) khác nhau, nên so dấu của replica này với catalog lấy từ replica khác
+    sẽ luôn thấy "đã đổi".
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Nạp bản chụp đã lưu (nếu có); file hỏng hoặc không đọc được thì bỏ qua"""
+        if not self.path:
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(entries, dict):
+            return 0
+        with self._lock:
+            for db_name, entry in entries.items():
+                self._entries.setdefault(db_name, entry)
+            return len(self._entries)
+
+    def save(self):
+        """Ghi bản chụp ra file tạm rồi đổi tên để không để lại file dở dang"""
+        if not self.path:
+            return
+        with self._lock:
+            text = dumps(self._entries)
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.part"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(temp_path, self.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _key(db_name, server):
+        return db_name if server.endpoint is None else f"{db_name}@{server.endpoint}"
+
+    @staticmethod
+    def _database(key):
+        """Tên database đã đăng ký của một khóa cache"""
+        return key.split("@", 1)[0]
+
+    def get(self, db_name, server):
+        """Lấy catalog của database đang kết nối, dùng bản cache nếu dữ liệu chưa đổi"""
+        key = self._key(db_name, server)
+        version = server.get_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry["version"] == version and entry.get("name") == server.db_name:
+            return entry
+
+        catalog = server.get_catalog()
+        if catalog["status"] == "success":
+            with self._lock:
+                self._entries[key] = catalog
+            self.save()
+        return catalog
+
+    def invalidate(self, db_name=None):
+        """Xóa catalog đã cache của một database (mọi server của nó) hoặc tất cả"""
+        with self._lock:
+            if db_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if self._database(key) == db_name]:
+                    del self._entries[key]
+        self.save()
+
+    def retain(self, db_names):
+        """Chỉ giữ catalog của các database còn được đăng ký"""
+        with self._lock:
+            removed = [key for key in self._entries if self._database(key) not in db_names]
+            for key in removed:
+                del self._entries[key]
+        if removed:
+            self.save()
+
+def database_summary(catalog):
+    """Thông tin tổng quan (như DatabaseServer.get_database_info) dựng từ catalog, không cần truy vấn database"""
+    tables = catalog["tables"]
+    return {
+        "type": catalog["type"],
+        "name": catalog["name"],
+        "tables": len(tables),
+        "table_details": [
+            {"name": table["name"], "columns": len(table["columns"]), "rows": table["rows"],
+             "rows_estimated": table.get("rows_estimated", False), "indexes": len(table.get("indexes", []))}
+            for table in tables
+        ],
+        "read_only": catalog["read_only"],
+        "version": catalog["version"],
+    }
+
+# Cache dùng chung trong process, bản chụp lưu trong thư mục cache
+catalog_cache = CatalogCache(os.path.join(CACHE_DIR, "catalog.json"))
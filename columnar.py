@@ -0,0 +1,163 @@
+import decimal
+
+from result_encoder import encode_value
+
+def load_numpy():
+    """Import numpy khi cần (không làm chậm khởi động server)"""
+    import numpy
+    return numpy
+
+def load_pyarrow():
+    """Import pyarrow khi cần (thư viện tùy chọn, import khá nặng)"""
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow
+
+def text_value(value):
+    """Dạng chuỗi của một giá trị (DECIMAL giữ nguyên độ chính xác, date/bytes theo result_encoder)"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    return str(encode_value(value))
+
+def _numpy_column(np, values):
+    """
+    Chuyển giá trị một cột (một lô) thành mảng NumPy: số nguyên/thực thành int64/float64
+    (NULL và DECIMAL được đưa về float64, NULL thành NaN), các kiểu khác giữ dạng object.
+    """
+    sample = next((value for value in values if value is not None), None)
+    if isinstance(sample, (int, float, decimal.Decimal)):
+        try:
+            if None not in values:
+                array = np.array(values)
+                if array.dtype.kind in "iufb":
+                    return array
+            return np.array(values, dtype=np.float64)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+class ColumnarResult:
+    """
+    Kết quả truy vấn dạng cột: mỗi cột là một mảng NumPy có kiểu.
+    Dùng cho các phép tính số trên cả cột mà không giữ lại đối tượng Python cho từng dòng.
+    """
+    __slots__ = ("columns", "arrays")
+
+    def __init__(self, columns, arrays):
+        self.columns = tuple(columns)
+        self.arrays = list(arrays)
+
+    def __len__(self):
+        return len(self.arrays[0]) if self.arrays else 0
+
+    def __repr__(self):
+        return f"ColumnarResult(columns={list(self.columns)}, rows={len(self)})"
+
+    @property
+    def count(self):
+        return len(self)
+
+    def column(self, name):
+        """Lấy mảng NumPy của một cột theo tên"""
+        return self.arrays[self.columns.index(name)]
+
+    def dtypes(self):
+        return {name: str(array.dtype) for name, array in zip(self.columns, self.arrays)}
+
+    def to_arrow(self):
+        """Chuyển sang pyarrow.Table (NaN của cột số được giữ là NaN)"""
+        pa = load_pyarrow()
+        return pa.Table.from_arrays([pa.array(array) for array in self.arrays], names=list(self.columns))
+
+    def to_payload(self):
+        """Dạng dữ liệu để serialize: {"columns": [...], "dtypes": {...}, "values": [[cột 1], ...], "count": n}"""
+        return {"columns": self.columns, "dtypes": self.dtypes(),
+                "values": [array.tolist() for array in self.arrays], "count": len(self)}
+
+def columnar_from_batches(batches):
+    """
+    Gom các lô (tên cột, dòng) thành ColumnarResult. Mỗi lô được chuyển vị và đổi sang mảng NumPy ngay,
+    nên các tuple của lô được giải phóng trước khi đọc lô tiếp theo.
+    """
+    np = load_numpy()
+    columns = []
+    chunks = None
+    for columns, rows in batches:
+        if chunks is None:
+            chunks = [[] for _ in columns]
+        if not rows:
+            continue
+        for chunk, values in zip(chunks, zip(*rows)):
+            chunk.append(_numpy_column(np, values))
+
+    arrays = []
+    for chunk in (chunks or []):
+        if not chunk:
+            arrays.append(np.empty(0, dtype=np.float64))
+        elif len(chunk) == 1:
+            arrays.append(chunk[0])
+        else:
+            # int64 + float64 -> float64, số + object -> object
+            arrays.append(np.concatenate(chunk))
+    return ColumnarResult(columns, arrays)
+
+def _text_array(pa, values):
+    return pa.array([None if value is None else text_value(value) for value in values], type=pa.string())
+
+def widen_type(pa, current, other):
+    """
+    Kiểu chung nhỏ nhất chứa được cả hai kiểu: số nguyên + số thực -> float64,
+    DECIMAL khác độ chính xác -> DECIMAL đủ rộng, các trường hợp khác -> chuỗi
+    """
+    if current == other or pa.types.is_null(other):
+        return current
+    if pa.types.is_null(current):
+        return other
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(current) for check in numeric) and any(check(other) for check in numeric):
+        return pa.float64() if not (pa.types.is_integer(current) and pa.types.is_integer(other)) else pa.int64()
+    if pa.types.is_decimal(current) and pa.types.is_decimal(other):
+        scale = max(current.scale, other.scale)
+        precision = max(current.precision - current.scale, other.precision - other.scale) + scale
+        if precision <= 38:
+            return pa.decimal128(precision, scale)
+    return pa.string()
+
+def record_batch(columns, rows, schema=None):
+    """
+    Tạo pyarrow.RecordBatch từ một lô dòng. Cột chỉ có NULL hoặc trộn nhiều kiểu (SQLite cho phép) được ghi dạng chuỗi.
+
+    Nếu có schema (từ lô trước), giá trị được ép theo kiểu của schema khi không mất dữ liệu (safe cast);
+    nếu không ép được (ví dụ số thực có phần lẻ trong cột int64, chuỗi trong cột số) thì lô được tạo với
+    schema nới rộng (xem widen_type): bên dùng so sánh batch.schema với schema cũ để chuyển các lô trước theo.
+    """
+    pa = load_pyarrow()
+    values_by_column = list(zip(*rows)) if rows else [() for _ in columns]
+    arrays = []
+    for index, values in enumerate(values_by_column):
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            array = _text_array(pa, values)
+        if schema is None:
+            if pa.types.is_null(array.type):
+                array = _text_array(pa, values)
+            arrays.append(array)
+            continue
+
+        field_type = schema.field(index).type
+        target = widen_type(pa, field_type, array.type)
+        try:
+            array = array.cast(target, safe=True)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            array = _text_array(pa, values)
+        arrays.append(array)
+
+    if schema is not None:
+        fields = [schema.field(index).with_type(array.type) for index, array in enumerate(arrays)]
+        return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
+    return pa.RecordBatch.from_arrays(arrays, names=list(columns))
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+# Số kết nối rảnh tối đa giữ lại cho mỗi database và thời gian (giây) một kết nối rảnh được giữ
+DEFAULT_MAX_IDLE = 4
+DEFAULT_IDLE_TIMEOUT = 300
+
+# Kết nối MySQL rảnh lâu hơn ngưỡng này được kiểm tra lại trước khi dùng
+MYSQL_CHECK_AFTER = 30
+
+class ConnectionPool:
+    """
+    Giữ lại các DatabaseServer đã kết nối theo tên database để các lời gọi tool sau dùng lại,
+    thay vì mở và đóng kết nối mới cho từng lời gọi. Mỗi kết nối chỉ được một lời gọi dùng tại một thời điểm
+    (các luồng worker khác nhau có thể lần lượt dùng cùng một kết nối).
+    """
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, db_name):
+        """Lấy một kết nối rảnh còn dùng được của database, hoặc None nếu không có"""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                entries = self._idle.get(db_name)
+                if not entries:
+                    return None
+                server, released_at = entries.pop()
+            if now - released_at > self.idle_timeout or not self._usable(server, now - released_at):
+                server.disconnect()
+                continue
+            return server
+
+    @staticmethod
+    def _usable(server, idle_seconds):
+        if server.connection is None:
+            return False
+        if server.db_type == "MySQL" and idle_seconds > MYSQL_CHECK_AFTER:
+            try:
+                return server.connection.is_connected()
+            except Exception:
+                return False
+        return True
+
+    def release(self, db_name, server):
+        """Trả kết nối về pool (transaction còn mở bị rollback); đóng kết nối nếu pool đã đủ"""
+        if server.connection is None:
+            return
+        try:
+            if server.in_transaction:
+                server.rollback()
+            elif server.db_type == "SQLite" and server.connection.in_transaction:
+                server.connection.rollback()
+        except Exception:
+            server.disconnect()
+            return
+
+        with self._lock:
+            entries = self._idle.setdefault(db_name, [])
+            if len(entries) < self.max_idle:
+                entries.append((server, time.monotonic()))
+                return
+        server.disconnect()
+
+    def clear(self, db_name=None):
+        """Đóng các kết nối rảnh của một database (hoặc tất cả), ví dụ khi cấu hình database thay đổi"""
+        with self._lock:
+            if db_name is None:
+                closing = [entry for entries in self._idle.values() for entry in entries]
+                self._idle.clear()
+            else:
+                closing = self._idle.pop(db_name, [])
+        for server, _ in closing:
+            server.disconnect()
+
+    def stats(self):
+        with self._lock:
+            return {db_name: len(entries) for db_name, entries in self._idle.items() if entries}
+
+# Pool dùng chung trong process
+connection_pool = ConnectionPool(
+    max_idle=int(os.environ.get("MCP_POOL_MAX_IDLE", DEFAULT_MAX_IDLE)),
+    idle_timeout=float(os.environ.get("MCP_POOL_IDLE_SECONDS", DEFAULT_IDLE_TIMEOUT)),
+)
@@ -0,0 +1,136 @@
+import json
+
+from langchain_core.messages import SystemMessage
+
+def _content_text(content):
+    """Nội dung tin nhắn dạng chuỗi (nội dung có thể là chuỗi hoặc danh sách phần tử)"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                parts.append(str(part.get("text", "")))
+            else:
+                parts.append(str(part))
+        return "".join(parts)
+    return str(content)
+
+class ConversationMemory:
+    """
+    Bộ nhớ hội thoại có giới hạn token cho agent.
+
+    Lịch sử được chia theo lượt (mỗi lượt bắt đầu bằng một tin nhắn của người dùng). Khi dựng ngữ cảnh gửi cho agent:
+    - keep_recent_turns lượt gần nhất được giữ nguyên văn;
+    - kết quả tool của các lượt cũ hơn được rút gọn (giữ tin nhắn để cặp tool call / tool result vẫn hợp lệ);
+    - nếu vẫn vượt max_tokens, các lượt cũ nhất bị bỏ và thay bằng một đoạn tóm tắt các câu hỏi trước đó.
+    Số token được ước lượng theo số ký tự (chars_per_token), không gọi tới model.
+    """
+
+    def __init__(self, max_tokens=8000, keep_recent_turns=3, tool_result_chars=300, chars_per_token=4):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_result_chars = tool_result_chars
+        self.chars_per_token = chars_per_token
+        self.messages = []
+        self.last_stats = {}
+
+    def add(self, message):
+        self.messages.append(message)
+
+    def extend(self, messages):
+        self.messages.extend(messages)
+
+    def truncate(self, length):
+        """Bỏ các tin nhắn từ vị trí length trở đi (hủy một lượt chưa hoàn tất)"""
+        del self.messages[length:]
+
+    def estimate_tokens(self, message):
+        """Ước lượng số token của một tin nhắn (nội dung và tham số tool call)"""
+        size = len(_content_text(message.content))
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            size += len(json.dumps(tool_calls, ensure_ascii=False, default=str))
+        return size // self.chars_per_token + 4
+
+    def _turns(self):
+        """Chia lịch sử thành các lượt; các tin nhắn trước câu hỏi đầu tiên (lời chào) là lượt 0"""
+        turns = []
+        current = []
+        for message in self.messages:
+            if message.type == "human" and current:
+                turns.append(current)
+                current = []
+            current.append(message)
+        if current:
+            turns.append(current)
+        return turns
+
+    def _compact(self, message):
+        """Rút gọn kết quả tool đã cũ: giữ phần đầu và độ dài gốc"""
+        if message.type != "tool":
+            return message
+        text = _content_text(message.content)
+        if len(text) <= self.tool_result_chars:
+            return message
+        short = f"[đã rút gọn, {len(text)} ký tự] {text[:self.tool_result_chars]}..."
+        return message.model_copy(update={"content": short})
+
+    def _summary(self, dropped_turns):
+        """Tóm tắt các lượt bị bỏ: liệt kê ngắn gọn các câu hỏi của người dùng"""
+        questions = []
+        for turn in dropped_turns:
+            for message in turn:
+                if message.type == "human":
+                    text = _content_text(message.content).strip().replace("\n", " ")
+                    questions.append(text[:120] + ("..." if len(text) > 120 else ""))
+        if not questions:
+            return None
+        return SystemMessage(content="Tóm tắt hội thoại trước (đã lược bỏ chi tiết): người dùng đã hỏi: "
+                                     + "; ".join(questions))
+
+    def context(self):
+        """Dựng danh sách tin nhắn gửi cho agent trong giới hạn token"""
+        turns = self._turns()
+        recent_count = max(self.keep_recent_turns, 1)
+        old_turns = [[self._compact(message) for message in turn] for turn in turns[:-recent_count]]
+        recent_turns = turns[-recent_count:]
+
+        def total(turn_list):
+            return sum(self.estimate_tokens(message) for turn in turn_list for message in turn)
+
+        # Bỏ dần các lượt cũ nhất cho tới khi vừa giới hạn
+        dropped = []
+        while old_turns and total(old_turns) + total(recent_turns) > self.max_tokens:
+            dropped.append(old_turns.pop(0))
+
+        # Vẫn vượt: rút gọn kết quả tool của các lượt gần đây, trừ lượt hiện tại
+        compacted_recent = False
+        if total(recent_turns) > self.max_tokens and len(recent_turns) > 1:
+            recent_turns = [[self._compact(message) for message in turn] for turn in recent_turns[:-1]] + recent_turns[-1:]
+            compacted_recent = True
+
+        messages = [message for turn in old_turns + recent_turns for message in turn]
+        summary = self._summary(dropped)
+        if summary is not None:
+            messages.insert(0, summary)
+
+        self.last_stats = {
+            "messages": len(messages),
+            "history_messages": len(self.messages),
+            "tokens": sum(self.estimate_tokens(message) for message in messages),
+            "history_tokens": sum(self.estimate_tokens(message) for message in self.messages),
+            "turns": len(turns),
+            "dropped_turns": len(dropped),
+            "compacted_recent": compacted_recent,
+        }
+        return messages
+
+    def describe(self):
+        """Mô tả ngắn kích thước ngữ cảnh của lần dựng gần nhất (để ghi log mỗi lượt)"""
+        stats = self.last_stats
+        if not stats:
+            return "[MEMORY] Chưa dựng ngữ cảnh"
+        return (f"[MEMORY] Ngữ cảnh: {stats['messages']} tin nhắn, ~{stats['tokens']} token "
+                f"(giới hạn {self.max_tokens}); lịch sử: {stats['history_messages']} tin nhắn, "
+                f"~{stats['history_tokens']} token; đã bỏ {stats['dropped_turns']} lượt cũ")
@@ -0,0 +1,167 @@
+import csv
+import datetime
+import decimal
+import os
+import re
+import threading
+import uuid
+
+from columnar import load_pyarrow, record_batch
+from result_encoder import dumps, encode_value
+from result_set import ResultSet
+
+# Các định dạng xuất file được hỗ trợ (parquet cần pyarrow)
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+
+# Thư mục chứa file xuất
+EXPORT_DIR = os.environ.get("MCP_EXPORT_DIR", "exports")
+
+def export_path(name, fmt, directory=None):
+    """Tạo đường dẫn file xuất trong thư mục xuất; chỉ giữ tên file để không ghi ra ngoài thư mục này"""
+    directory = directory or EXPORT_DIR
+    base = os.path.splitext(os.path.basename(str(name)))[0]
+    base = re.sub(r"[^\w\-]+", "_", base).strip("_") or "export"
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{base}.{fmt}")
+
+def _exists_message(path):
+    return f"File {os.path.basename(path)} đã tồn tại, hãy chọn tên khác hoặc dùng overwrite=True"
+
+def default_export_name(db_name):
+    return f"{db_name}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+def _csv_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        # Giữ nguyên độ chính xác của DECIMAL
+        return str(value)
+    return encode_value(value)
+
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, columns, rows):
+        self.writer.writerows([_csv_value(value) for value in row] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+class _JsonLinesWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", encoding="utf-8", newline="\n")
+
+    def write(self, columns, rows):
+        self.file.write("".join(dumps(dict(zip(columns, row))) + "\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+class _ParquetWriter:
+    """
+    Ghi Parquet theo từng lô (mỗi lô là một row group); schema lấy từ lô đầu tiên.
+    Nếu lô sau cần kiểu rộng hơn (số thực trong cột số nguyên, chuỗi trong cột số...) thì phần đã ghi
+    được chuyển sang schema mới và ghi lại, thay vì cắt bớt dữ liệu.
+    """
+
+    def __init__(self, path, columns):
+        self.pa = load_pyarrow()
+        self.path = path
+        self.writer = None
+
+    def write(self, columns, rows):
+        schema = self.writer.schema if self.writer is not None else None
+        batch = record_batch(columns, rows, schema)
+        if self.writer is None:
+            self.writer = self.pa.parquet.ParquetWriter(self.path, batch.schema)
+        elif not batch.schema.equals(schema):
+            self._widen(batch.schema)
+        self.writer.write_batch(batch)
+
+    def _widen(self, schema):
+        """Ghi lại các lô đã ghi theo schema rộng hơn"""
+        self.writer.close()
+        previous_path = self.path + ".prev"
+        os.replace(self.path, previous_path)
+        try:
+            written = self.pa.parquet.ParquetFile(previous_path)
+            self.writer = self.pa.parquet.ParquetWriter(self.path, schema)
+            for index in range(written.num_row_groups):
+                self.writer.write_table(written.read_row_group(index).cast(schema))
+        finally:
+            os.remove(previous_path)
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+
+_WRITERS = {"csv": _CsvWriter, "jsonl": _JsonLinesWriter, "parquet": _ParquetWriter}
+
+def export_batches(batches, path, fmt="csv", preview_rows=5, overwrite=False):
+    """
+    Ghi lần lượt các lô (tên cột, dòng) ra file, bộ nhớ chỉ phụ thuộc kích thước lô.
+    Dữ liệu được ghi vào file tạm riêng của lần xuất rồi đổi tên khi hoàn tất để không để lại file dở dang
+    (các lần xuất cùng tên chạy song song không ghi chung một file tạm).
+    File đã tồn tại chỉ bị ghi đè khi overwrite=True.
+
+    Returns:
+        {"status", "path", "format", "rows", "bytes", "columns", "preview": ResultSet}
+    """
+    if fmt not in EXPORT_FORMATS:
+        return {"status": "error", "message": f"Định dạng không hỗ trợ: {fmt}. Các định dạng hợp lệ: {', '.join(EXPORT_FORMATS)}"}
+    if not overwrite and os.path.exists(path):
+        return {"status": "error", "message": _exists_message(path)}
+
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.{uuid.uuid4().hex[:8]}.part"
+    writer = None
+    columns = []
+    preview = []
+    total = 0
+    try:
+        for columns, rows in batches:
+            if writer is None:
+                writer = _WRITERS[fmt](temp_path, columns)
+            writer.write(columns, rows)
+            if len(preview) < preview_rows:
+                preview.extend(rows[:preview_rows - len(preview)])
+            total += len(rows)
+        if writer is None:
+            writer = _WRITERS[fmt](temp_path, columns)
+        writer.close()
+        writer = None
+        if overwrite:
+            os.replace(temp_path, path)
+        else:
+            # Tạo hard link không ghi đè được file cùng tên vừa được lần xuất khác tạo trong lúc đang xuất
+            try:
+                os.link(temp_path, path)
+            except FileExistsError:
+                return {"status": "error", "message": _exists_message(path)}
+            except OSError:
+                # Hệ thống file không hỗ trợ hard link
+                if os.path.exists(path):
+                    return {"status": "error", "message": _exists_message(path)}
+                os.replace(temp_path, path)
+    except ImportError as e:
+        return {"status": "error", "message": f"Xuất Parquet cần cài đặt pyarrow: {str(e)}"}
+    except Exception as e:
+        return {"status": "error", "message": f"Lỗi khi xuất dữ liệu ra file: {str(e)}"}
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return {
+        "status": "success",
+        "path": os.path.abspath(path),
+        "format": fmt,
+        "rows": total,
+        "bytes": os.path.getsize(path),
+        "columns": list(columns),
+        "preview": ResultSet(columns, preview),
+    }
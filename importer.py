@@ -0,0 +1,148 @@
+import csv
+import itertools
+import json
+import os
+import re
+
+from result_encoder import loads
+
+# Các định dạng file nhập được hỗ trợ
+IMPORT_FORMATS = ("csv", "jsonl")
+
+_INTEGER_PATTERN = re.compile(r"^[+-]?\d+$")
+_REAL_PATTERN = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+# Chuỗi số có số 0 đứng đầu (số điện thoại, mã) giữ dạng TEXT để không mất số 0
+_LEADING_ZERO_PATTERN = re.compile(r"^[+-]?0\d")
+# Số chữ số tối đa của chuỗi được suy ra là INTEGER (vừa số nguyên 64 bit của SQLite)
+MAX_INTEGER_DIGITS = 18
+
+def detect_format(path):
+    """Đoán định dạng theo phần mở rộng của file"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension in ("csv", "tsv", "txt"):
+        return "csv"
+    return None
+
+def open_file(path, fmt):
+    """Mở file nhập ở chế độ đọc văn bản UTF-8 (bỏ qua BOM); người gọi chịu trách nhiệm đóng file"""
+    return open(path, "r", encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+
+def read_csv(handle, delimiter=","):
+    """Đọc file CSV đã mở (dòng đầu là tên cột), trả về (tên cột, iterator các dòng dạng list chuỗi)"""
+    reader = csv.reader(handle, delimiter=delimiter)
+    try:
+        columns = next(reader)
+    except StopIteration:
+        raise ValueError("File không có dòng tiêu đề")
+    return [column.strip() for column in columns], reader
+
+def read_jsonl(handle, infer_rows=1000):
+    """
+    Đọc file JSONL đã mở (mỗi dòng một object), trả về (tên cột, iterator các dòng dạng tuple).
+    Tên cột lấy từ các object trong infer_rows dòng đầu; khóa chỉ xuất hiện sau đó bị bỏ qua.
+    Cột có giá trị lồng nhau (object/mảng) trong các dòng đầu được lưu dạng chuỗi JSON.
+    """
+    records = (loads(line) for line in handle if line.strip())
+    sample = list(itertools.islice(records, infer_rows))
+    columns = []
+    nested = set()
+    for record in sample:
+        if not isinstance(record, dict):
+            raise ValueError("Mỗi dòng JSONL phải là một object")
+        for key, value in record.items():
+            if key not in columns:
+                columns.append(key)
+            if isinstance(value, (dict, list)):
+                nested.add(key)
+    nested_indexes = [index for index, column in enumerate(columns) if column in nested]
+
+    def rows():
+        for record in itertools.chain(sample, records):
+            row = tuple(map(record.get, columns))
+            if nested_indexes:
+                row = list(row)
+                for index in nested_indexes:
+                    if row[index] is not None:
+                        row[index] = json.dumps(row[index], ensure_ascii=False)
+            yield row
+    return columns, rows()
+
+def infer_types(columns, sample):
+    """
+    Suy ra kiểu SQLite (INTEGER, REAL, TEXT) cho từng cột từ các dòng mẫu; bỏ qua giá trị rỗng.
+    Chuỗi số có số 0 đứng đầu ("0912345678", "-01") hoặc chuỗi số nguyên dài hơn MAX_INTEGER_DIGITS chữ số
+    được coi là TEXT để giữ nguyên mã/số điện thoại.
+    """
+    types = {}
+    for index, column in enumerate(columns):
+        kind = None
+        for row in sample:
+            value = row[index] if index < len(row) else None
+            if value is None or value == "":
+                continue
+            if isinstance(value, bool) or isinstance(value, int):
+                current = "INTEGER"
+            elif isinstance(value, float):
+                current = "REAL"
+            elif isinstance(value, str) and _LEADING_ZERO_PATTERN.match(value.strip()):
+                kind = "TEXT"
+                break
+            elif isinstance(value, str) and _INTEGER_PATTERN.match(value.strip()):
+                if len(value.strip().lstrip("+-")) > MAX_INTEGER_DIGITS:
+                    kind = "TEXT"
+                    break
+                current = "INTEGER"
+            elif isinstance(value, str) and _REAL_PATTERN.match(value.strip()):
+                current = "REAL"
+            else:
+                kind = "TEXT"
+                break
+            if kind is None or (kind == "INTEGER" and current == "REAL"):
+                kind = current
+        types[column] = kind or "TEXT"
+    return types
+
+def import_file(server, path, table_name, fmt=None, if_exists="append", create=True,
+                batch_size=50000, infer_rows=1000, delimiter=","):
+    """
+    Nhập file CSV/JSONL vào bảng SQLite theo dạng luồng (xem DatabaseServer.bulk_insert).
+
+    Args:
+        server: DatabaseServer SQLite không ở chế độ chỉ đọc
+        fmt: "csv" hoặc "jsonl" (mặc định đoán theo phần mở rộng)
+        if_exists: append (thêm vào bảng có sẵn), replace (xóa bảng cũ rồi tạo lại) hoặc fail
+        create: Tạo bảng nếu chưa có, với kiểu cột suy ra từ infer_rows dòng đầu
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in IMPORT_FORMATS:
+        return {"status": "error", "message": f"Định dạng không hỗ trợ: {fmt}. Các định dạng hợp lệ: {', '.join(IMPORT_FORMATS)}"}
+    if not os.path.isfile(path):
+        return {"status": "error", "message": f"Không tìm thấy file: {path}"}
+
+    try:
+        handle = open_file(path, fmt)
+    except OSError as e:
+        return {"status": "error", "message": f"Lỗi khi đọc file {path}: {str(e)}"}
+
+    with handle:
+        try:
+            if fmt == "csv":
+                columns, rows = read_csv(handle, delimiter)
+            else:
+                columns, rows = read_jsonl(handle, infer_rows)
+        except (OSError, ValueError) as e:
+            return {"status": "error", "message": f"Lỗi khi đọc file {path}: {str(e)}"}
+        if not columns:
+            return {"status": "error", "message": f"Không xác định được cột nào trong file {path}"}
+
+        sample = list(itertools.islice(rows, infer_rows))
+        types = infer_types(columns, sample) if create else None
+        result = server.bulk_insert(
+            table_name, columns, itertools.chain(sample, rows), column_types=types, if_exists=if_exists,
+            batch_size=batch_size, empty_as_null=(fmt == "csv")
+        )
+    if result["status"] == "success":
+        result.update({"file": os.path.abspath(path), "format": fmt})
+    return result
@@ -1,7 +1,42 @@
 import sqlite3
-import mysql.connector
-from mysql.connector import Error as MySQLError
 import json
+import contextlib
+import os
+import random
+import itertools
+import time
+import zlib
+
+from result_set import ResultSet
+from sql_builder import compile_aggregate, compile_filters, quote_identifier, resolve_column, placeholder
+from profiler import profile_rows, profile_cache
+from approximate import approximate_aggregate
+from exporter import export_batches
+from columnar import columnar_from_batches
+
+# Mã lỗi MySQL ER_DUP_FIELDNAME ("Duplicate column name")
+MYSQL_DUPLICATE_COLUMN = 1060
+
+# Module mysql.connector được import lười ở lần đầu cần tới MySQL,
+# để server chỉ dùng SQLite không phải trả chi phí import driver khi khởi động
+_mysql_connector = None
+
+def load_mysql_connector():
+    """Import (một lần) và trả về module mysql.connector"""
+    global _mysql_connector
+    if _mysql_connector is None:
+        import mysql.connector
+        _mysql_connector = mysql.connector
+    return _mysql_connector
+
+def preload_driver(db_type):
+    """Nạp trước driver cho một loại database đã được đăng ký (gọi ngoài luồng chính)"""
+    if db_type == "mysql":
+        try:
+            load_mysql_connector()
+        except ImportError:
+            # Thiếu driver sẽ được báo lỗi khi kết nối thật sự
+            pass
 
 class DatabaseServer:
     """Server để quản lý kết nối và thao tác với cơ sở dữ liệu"""
@@ -10,17 +45,25 @@ class DatabaseServer:
         self.connection = None
         self.db_name = None
         self.db_type = None
+        # "host:port" của server MySQL đang kết nối (primary hoặc replica), None với SQLite
+        self.endpoint = None
         self.read_only = False
+        self.in_transaction = False
+        self._savepoints = []
     
     def connect_sqlite(self, db_path, read_only=False):
-        """Kết nối tới SQLite database với tùy chọn chế độ chỉ đọc"""
+        """
+        Kết nối tới SQLite database với tùy chọn chế độ chỉ đọc.
+        Kết nối có thể được dùng lần lượt từ nhiều luồng (pool kết nối, tool chạy trong luồng worker),
+        nhưng không đồng thời.
+        """
         try:
             if read_only:
                 # Kết nối với chế độ chỉ đọc bằng URI
-                self.connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+                self.connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
                 self.read_only = True
             else:
-                self.connection = sqlite3.connect(db_path)
+                self.connection = sqlite3.connect(db_path, check_same_thread=False)
                 self.read_only = False
                 
             self.connection.row_factory = sqlite3.Row
@@ -33,15 +76,24 @@ class DatabaseServer:
     def connect_mysql(self, host, user, password, database, port=3306, read_only=False):
         """Kết nối tới MySQL database với tùy chọn chế độ chỉ đọc"""
         try:
-            self.connection = mysql.connector.connect(
+            mysql_connector = load_mysql_connector()
+        except ImportError as e:
+            return {"status": "error", "message": f"Chưa cài đặt driver MySQL (mysql-connector-python): {str(e)}"}
+        
+        try:
+            self.connection = mysql_connector.connect(
                 host=host,
                 user=user,
                 password=password,
                 database=database,
-                port=port
+                port=port,
+                # Tự commit từng lệnh ngoài transaction tường minh (begin/transaction) để lệnh đọc
+                # không giữ snapshot cũ và không cần commit sau mỗi SELECT
+                autocommit=True
             )
             self.db_name = database
             self.db_type = "MySQL"
+            self.endpoint = f"{host}:{port}"
             self.read_only = read_only
             
             # Nếu là chế độ chỉ đọc, đặt session thành read-only nếu có thể
@@ -57,21 +109,32 @@ class DatabaseServer:
                     print("CẢNH BÁO: Không thể thiết lập chế độ READ ONLY cho MySQL")
             
             return {"status": "success", "message": f"Đã kết nối tới MySQL database: {database} tại {host}:{port}" + (" (CHỈ ĐỌC)" if read_only else "")}
-        except MySQLError as e:
+        except mysql_connector.Error as e:
             return {"status": "error", "message": f"Lỗi khi kết nối tới MySQL database: {str(e)}"}
     
     def disconnect(self):
         """Đóng kết nối database"""
         if self.connection:
+            if self.in_transaction:
+                # Transaction chưa commit thì hủy
+                self.rollback()
             self.connection.close()
             self.connection = None
             db_name = self.db_name
             self.db_name = None
             self.db_type = None
+            self.endpoint = None
             self.read_only = False
             return {"status": "success", "message": f"Đã đóng kết nối tới database: {db_name}"}
         return {"status": "error", "message": "Không có kết nối database nào để đóng"}
     
+    def _cursor(self):
+        """Tạo cursor trả về dòng dạng tuple (bỏ qua sqlite3.Row) để dựng ResultSet"""
+        cursor = self.connection.cursor()
+        if self.db_type == "SQLite":
+            cursor.row_factory = None
+        return cursor
+    
     def get_table_names(self):
         """Lấy danh sách tên các bảng trong database"""
         if not self.connection:
@@ -133,34 +196,19 @@ class DatabaseServer:
         if not self.connection:
             return {"status": "error", "message": "Không có kết nối database"}
         
+        if self.db_type not in ("SQLite", "MySQL"):
+            return {"status": "error", "message": "Loại database không được hỗ trợ"}
+        
         try:
-            cursor = self.connection.cursor()
-            # Lấy tên cột
-            if self.db_type == "SQLite":
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [row[1] for row in cursor.fetchall()]
-            elif self.db_type == "MySQL":
-                cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-                columns = [row[0] for row in cursor.fetchall()]
-            else:
-                return {"status": "error", "message": "Loại database không được hỗ trợ"}
+            cursor = self._cursor()
             
             # Đếm tổng số bản ghi
             cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
             total_count = cursor.fetchone()[0]
             
-            # Lấy dữ liệu với giới hạn
+            # Lấy dữ liệu với giới hạn (tên cột lấy từ cursor.description)
             cursor.execute(f"SELECT * FROM {table_name} LIMIT {limit}")
-            rows = cursor.fetchall()
-            
-            # Chuyển đổi dữ liệu sang dictionary
-            data = []
-            if self.db_type == "SQLite":
-                for row in rows:
-                    data.append({columns[i]: row[i] for i in range(len(columns))})
-            elif self.db_type == "MySQL":
-                for row in rows:
-                    data.append({columns[i]: row[i] for i in range(len(columns))})
+            data = ResultSet.from_cursor(cursor, total=total_count, limited=total_count > limit)
             
             cursor.close()
             return {
@@ -173,58 +221,261 @@ class DatabaseServer:
         except Exception as e:
             return {"status": "error", "message": f"Lỗi khi lấy dữ liệu từ bảng {table_name}: {str(e)}"}
     
-    def execute_query(self, query, params=None):
-        """Thực thi câu lệnh SQL"""
+    def execute_query(self, query, params=None, limit=None, offset=0):
+        """
+        Thực thi câu lệnh SQL.
+        Với SELECT và limit, câu lệnh được bọc thành SELECT * FROM (...) LIMIT limit + 1 OFFSET offset
+        để database chỉ trả về tối đa limit dòng; dòng thừa cho biết kết quả bị cắt (truncated, next_offset).
+        """
         if not self.connection:
             return {"status": "error", "message": "Không có kết nối database"}
         
         try:
             # Nếu là chế độ chỉ đọc, ngăn chặn các câu lệnh ghi dữ liệu
-            if self.read_only:
-                query_lower = query.strip().lower()
-                if (query_lower.startswith('insert') or 
-                    query_lower.startswith('update') or 
-                    query_lower.startswith('delete') or 
-                    query_lower.startswith('drop') or 
-                    query_lower.startswith('alter') or 
-                    query_lower.startswith('create')):
-                    return {"status": "error", "message": "Không thể thực hiện lệnh ghi dữ liệu ở chế độ CHỈ ĐỌC"}
+            if self.read_only and self._is_write_query(query):
+                return {"status": "error", "message": "Không thể thực hiện lệnh ghi dữ liệu ở chế độ CHỈ ĐỌC"}
             
-            cursor = self.connection.cursor()
+            if limit is not None and query.strip().upper().startswith(("SELECT", "WITH")):
+                return self._execute_limited(query, params, max(int(limit), 0), max(int(offset or 0), 0))
+            
+            cursor = self._cursor()
             
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             
-            # Nếu là câu lệnh SELECT
+            # Nếu là câu lệnh SELECT: không cần commit
             if query.strip().upper().startswith(("SELECT", "SHOW", "PRAGMA", "EXPLAIN", "DESCRIBE", "DESC")):
-                # Lấy tên cột
-                column_names = [desc[0] for desc in cursor.description] if cursor.description else []
-                
-                # Lấy kết quả
-                rows = cursor.fetchall()
-                result_data = []
-                
-                if self.db_type == "SQLite":
-                    for row in rows:
-                        result_data.append({column_names[i]: row[i] for i in range(len(column_names))})
-                elif self.db_type == "MySQL":
-                    for row in rows:
-                        result_data.append({column_names[i]: row[i] for i in range(len(column_names))})
-                
-                self.connection.commit()
+                data = ResultSet.from_cursor(cursor)
                 cursor.close()
-                return {"status": "success", "data": result_data, "count": len(result_data)}
+                return {"status": "success", "data": data, "count": len(data)}
             else:
-                # Nếu là câu lệnh INSERT, UPDATE, DELETE
+                # Nếu là câu lệnh INSERT, UPDATE, DELETE: commit ngay trừ khi đang trong transaction tường minh
                 affected_rows = cursor.rowcount
-                self.connection.commit()
+                if not self.in_transaction:
+                    self.connection.commit()
                 cursor.close()
                 return {"status": "success", "affected_rows": affected_rows, "message": "Thực thi thành công"}
         except Exception as e:
             return {"status": "error", "message": f"Lỗi khi thực thi câu lệnh SQL: {str(e)}"}
     
+    def _execute_limited(self, query, params, limit, offset):
+        """
+        Thực thi SELECT với giới hạn số dòng (xem execute_query).
+        Cột trùng tên trong câu lệnh: SQLite tự đổi tên cột thứ hai trở đi trong bảng dẫn xuất ("id", "id:1");
+        MySQL không cho phép nên báo lỗi yêu cầu đặt alias, thay vì chạy câu lệnh không giới hạn.
+        """
+        inner = query.strip().rstrip(";").rstrip()
+        # Xuống dòng trước ")" để chú thích "-- ..." ở cuối câu lệnh không nuốt phần bọc ngoài
+        wrapped = f"SELECT * FROM ({inner}\n) AS _q LIMIT {limit + 1} OFFSET {offset}"
+        cursor = self._cursor()
+        try:
+            try:
+                cursor.execute(wrapped, params or ())
+            except Exception as e:
+                if self.db_type == "MySQL" and getattr(e, "errno", None) == MYSQL_DUPLICATE_COLUMN:
+                    raise Exception(f"{str(e)}. Câu lệnh có nhiều cột trùng tên, hãy đặt alias khác nhau "
+                                    f"(ví dụ: a.id AS a_id, b.id AS b_id)")
+                raise
+            rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        finally:
+            cursor.close()
+        
+        truncated = len(rows) > limit
+        data = ResultSet(columns, rows[:limit], truncated=truncated, next_offset=offset + limit if truncated else None)
+        return {"status": "success", "data": data, "count": len(data), "truncated": truncated}
+    
+    @staticmethod
+    def _is_write_query(query):
+        """Câu lệnh có ghi/thay đổi dữ liệu hay không"""
+        return query.strip().lower().startswith(("insert", "update", "delete", "replace", "drop", "alter", "create"))
+    
+    def begin(self, snapshot=False):
+        """
+        Bắt đầu transaction tường minh: các lệnh ghi sau đó chỉ được lưu khi gọi commit().
+        snapshot=True: transaction chỉ đọc, mọi truy vấn trong đó thấy cùng một bản chụp dữ liệu
+        (MySQL: WITH CONSISTENT SNAPSHOT; SQLite: bản chụp được giữ từ lần đọc đầu tiên tới khi kết thúc).
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        if self.in_transaction:
+            return {"status": "error", "message": "Đang trong một transaction, hãy commit hoặc rollback trước"}
+        
+        try:
+            if self.db_type == "SQLite":
+                if self.connection.in_transaction:
+                    self.connection.commit()
+                self.connection.execute("BEGIN")
+            elif snapshot:
+                self.connection.start_transaction(consistent_snapshot=True, readonly=True)
+            else:
+                self.connection.start_transaction()
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi bắt đầu transaction: {str(e)}"}
+        self.in_transaction = True
+        self._savepoints = []
+        return {"status": "success", "message": "Đã bắt đầu transaction"}
+    
+    def commit(self):
+        """Lưu transaction hiện tại (một lần ghi xuống đĩa cho toàn bộ các lệnh)"""
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        try:
+            self.connection.commit()
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi commit transaction: {str(e)}"}
+        finally:
+            self.in_transaction = False
+            self._savepoints = []
+        return {"status": "success", "message": "Đã commit transaction"}
+    
+    def rollback(self):
+        """Hủy toàn bộ transaction hiện tại"""
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        try:
+            self.connection.rollback()
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi rollback transaction: {str(e)}"}
+        finally:
+            self.in_transaction = False
+            self._savepoints = []
+        return {"status": "success", "message": "Đã rollback transaction"}
+    
+    def _savepoint_command(self, command, name):
+        if not self.in_transaction:
+            return {"status": "error", "message": "Savepoint chỉ dùng được trong transaction (gọi begin trước)"}
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"{command} {quote_identifier(name, self.db_type)}")
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi thực hiện {command} {name}: {str(e)}"}
+        finally:
+            cursor.close()
+        return {"status": "success", "message": f"Đã thực hiện {command} {name}"}
+    
+    def savepoint(self, name):
+        """Tạo savepoint trong transaction hiện tại"""
+        result = self._savepoint_command("SAVEPOINT", name)
+        if result["status"] == "success":
+            self._savepoints.append(name)
+        return result
+    
+    def rollback_to_savepoint(self, name):
+        """Hủy các thay đổi từ sau savepoint (savepoint vẫn còn, transaction tiếp tục)"""
+        if name not in self._savepoints:
+            return {"status": "error", "message": f"Không tìm thấy savepoint: {name}"}
+        result = self._savepoint_command("ROLLBACK TO SAVEPOINT", name)
+        if result["status"] == "success":
+            del self._savepoints[self._savepoints.index(name) + 1:]
+        return result
+    
+    def release_savepoint(self, name):
+        """Bỏ savepoint (giữ lại các thay đổi từ sau savepoint)"""
+        if name not in self._savepoints:
+            return {"status": "error", "message": f"Không tìm thấy savepoint: {name}"}
+        result = self._savepoint_command("RELEASE SAVEPOINT", name)
+        if result["status"] == "success":
+            del self._savepoints[self._savepoints.index(name):]
+        return result
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Context manager cho transaction: commit khi khối lệnh kết thúc bình thường, rollback khi có exception.
+        
+        Ví dụ:
+            with server.transaction():
+                server.execute_query("UPDATE ...")
+                server.execute_many("INSERT ...", rows)
+        """
+        result = self.begin()
+        if result["status"] != "success":
+            raise Exception(result["message"])
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        result = self.commit()
+        if result["status"] != "success":
+            raise Exception(result["message"])
+    
+    def execute_many(self, query, params_list, batch_size=1000, savepoints=False):
+        """
+        Thực thi một câu lệnh ghi có tham số cho nhiều bộ tham số (executemany theo lô) và commit một lần.
+        
+        Args:
+            query: Câu lệnh INSERT/UPDATE/DELETE có tham số (? cho SQLite, %s cho MySQL)
+            params_list: Danh sách/iterator các bộ tham số
+            batch_size: Số bộ tham số mỗi lô
+            savepoints: Đặt savepoint cho từng lô; lô lỗi chỉ bị hủy riêng thay vì hủy toàn bộ
+        
+        Returns:
+            {"status", "affected_rows", "batches": [{"batch", "rows", "affected_rows"|"message", "status"}], "committed"}
+            Nếu đang trong transaction tường minh thì không commit (committed=False), để bên gọi commit.
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        if self.read_only and self._is_write_query(query):
+            return {"status": "error", "message": "Không thể thực hiện lệnh ghi dữ liệu ở chế độ CHỈ ĐỌC"}
+        
+        own_transaction = not self.in_transaction
+        if own_transaction:
+            result = self.begin()
+            if result["status"] != "success":
+                return result
+        
+        params_iter = iter(params_list)
+        batch_size = max(int(batch_size), 1)
+        batches = []
+        total = 0
+        cursor = self._cursor()
+        try:
+            index = 0
+            while True:
+                batch = list(itertools.islice(params_iter, batch_size))
+                if not batch:
+                    break
+                name = f"batch_{index}"
+                if savepoints:
+                    result = self.savepoint(name)
+                    if result["status"] != "success":
+                        raise Exception(result["message"])
+                try:
+                    cursor.executemany(query, batch)
+                except Exception as e:
+                    if not savepoints:
+                        raise
+                    self.rollback_to_savepoint(name)
+                    self.release_savepoint(name)
+                    batches.append({"batch": index, "rows": len(batch), "status": "error", "message": str(e)})
+                    index += 1
+                    continue
+                if savepoints:
+                    self.release_savepoint(name)
+                affected = cursor.rowcount
+                batches.append({"batch": index, "rows": len(batch), "status": "success", "affected_rows": affected})
+                total += max(affected, 0)
+                index += 1
+            if own_transaction:
+                result = self.commit()
+                if result["status"] != "success":
+                    raise Exception(result["message"])
+        except Exception as e:
+            if own_transaction and self.in_transaction:
+                self.rollback()
+            return {"status": "error", "message": f"Lỗi khi thực thi lô {len(batches)} (đã hủy các thay đổi chưa commit): {str(e)}",
+                    "batches": batches, "committed": False}
+        finally:
+            cursor.close()
+        
+        failed = sum(1 for batch in batches if batch["status"] != "success")
+        return {"status": "success", "affected_rows": total, "batches": batches, "failed_batches": failed,
+                "committed": own_transaction}
+    
     def get_database_info(self):
         """Lấy thông tin tổng quan về database"""
         if not self.connection:
@@ -261,6 +512,85 @@ class DatabaseServer:
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
+    def get_catalog(self):
+        """
+        Lấy toàn bộ catalog của database trong một lần: các bảng, cột, chỉ mục, số dòng và khóa ngoại,
+        kèm phiên bản dữ liệu để bên gọi biết khi nào cần lấy lại.
+        Số dòng của SQLite được đếm chính xác; MySQL dùng ước lượng TABLE_ROWS (rows_estimated) để không quét bảng.
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        try:
+            version = self.get_data_version()
+            foreign_keys = {}
+            indexes = {}
+            estimates = {}
+            cursor = self.connection.cursor()
+            if self.db_type == "MySQL":
+                cursor.execute(
+                    "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+                    "FROM information_schema.KEY_COLUMN_USAGE "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL"
+                )
+                for table, column, ref_table, ref_column in cursor.fetchall():
+                    foreign_keys.setdefault(table, []).append({"column": column, "references": f"{ref_table}.{ref_column}"})
+                cursor.execute(
+                    "SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS "
+                    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+                )
+                for table, index_name, non_unique, column in cursor.fetchall():
+                    table_indexes = indexes.setdefault(table, [])
+                    if not table_indexes or table_indexes[-1]["name"] != index_name:
+                        table_indexes.append({"name": index_name, "unique": not non_unique, "columns": []})
+                    table_indexes[-1]["columns"].append(column)
+                cursor.execute("SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+                estimates = {table: rows for table, rows in cursor.fetchall()}
+            
+            tables = []
+            for table_name in self.get_table_names():
+                schema_result = self.get_table_schema(table_name)
+                if schema_result["status"] != "success":
+                    continue
+                table_sql = quote_identifier(table_name, self.db_type)
+                if self.db_type == "MySQL" and estimates.get(table_name) is not None:
+                    row_count = int(estimates[table_name])
+                else:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table_sql}")
+                    row_count = cursor.fetchone()[0]
+                if self.db_type == "SQLite":
+                    cursor.execute(f"PRAGMA foreign_key_list({table_sql})")
+                    foreign_keys[table_name] = [{"column": row[3], "references": f"{row[2]}.{row[4]}"}
+                                                for row in cursor.fetchall()]
+                    cursor.execute(f"PRAGMA index_list({table_sql})")
+                    table_indexes = []
+                    for row in cursor.fetchall():
+                        index_name, unique = row[1], bool(row[2])
+                        cursor.execute(f"PRAGMA index_info({quote_identifier(index_name, self.db_type)})")
+                        table_indexes.append({"name": index_name, "unique": unique,
+                                              "columns": [info[2] for info in cursor.fetchall()]})
+                    indexes[table_name] = table_indexes
+                tables.append({
+                    "name": table_name,
+                    "rows": row_count,
+                    "rows_estimated": self.db_type == "MySQL" and estimates.get(table_name) is not None,
+                    "columns": schema_result["schema"],
+                    "indexes": indexes.get(table_name, []),
+                    "foreign_keys": foreign_keys.get(table_name, []),
+                })
+            cursor.close()
+            
+            return {
+                "status": "success",
+                "type": self.db_type,
+                "name": self.db_name,
+                "version": version,
+                "read_only": self.read_only,
+                "tables": tables,
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi lấy catalog của database: {str(e)}"}
+    
     def search_data(self, table_name, search_term, columns=None, limit=100):
         """Tìm kiếm dữ liệu trong bảng"""
         if not self.connection:
@@ -282,24 +612,527 @@ class DatabaseServer:
             params = [f"%{search_term}%" for _ in columns]
             
             # Thực thi truy vấn
-            cursor = self.connection.cursor()
+            cursor = self._cursor()
             cursor.execute(query, params)
+            data = ResultSet.from_cursor(cursor)
             
-            # Lấy tên cột
-            column_names = [desc[0] for desc in cursor.description]
-            
-            # Lấy kết quả
-            rows = cursor.fetchall()
-            result_data = []
-            
+            cursor.close()
+            return {"status": "success", "data": data, "count": len(data)}
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi tìm kiếm dữ liệu: {str(e)}"}
+    
+    def get_column_names(self, table_name):
+        """Lấy (tên bảng chuẩn, danh sách tên cột) sau khi kiểm tra bảng có tồn tại"""
+        tables = self.get_table_names()
+        lookup = {table.lower(): table for table in tables}
+        resolved = lookup.get(str(table_name).lower())
+        if resolved is None:
+            raise ValueError(f"Không tìm thấy bảng: {table_name}")
+        
+        schema_result = self.get_table_schema(resolved)
+        if schema_result["status"] != "success":
+            raise ValueError(schema_result["message"])
+        return resolved, [col["name"] for col in schema_result["schema"]]
+    
+    def aggregate(self, table_name, measures, group_by=None, filters=None, order_by=None, limit=1000, key_range=None):
+        """
+        Tổng hợp dữ liệu ngay trên database (GROUP BY) và chỉ trả về các dòng đã tổng hợp.
+        key_range=(sau, đến) giới hạn các dòng có khóa số nguyên (rowid/khóa chính) trong khoảng (sau, đến];
+        dùng để tổng hợp riêng phần dữ liệu mới thêm vào.
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        try:
+            table_name, columns = self.get_column_names(table_name)
+            conditions = None
+            if key_range is not None:
+                key = self._sampling_key(table_name, self.get_table_schema(table_name)["schema"])
+                if key is None:
+                    raise ValueError(f"Bảng {table_name} không có khóa số nguyên để lọc theo khoảng khóa")
+                after, upto = key_range
+                conditions = []
+                if after is not None:
+                    conditions.append(f"{key} > {int(after)}")
+                if upto is not None:
+                    conditions.append(f"{key} <= {int(upto)}")
+            sql, params, _ = compile_aggregate(
+                table_name, measures, group_by, filters, order_by, limit,
+                dialect=self.db_type, columns=columns, conditions=conditions
+            )
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        
+        try:
+            cursor = self._cursor()
+            cursor.execute(sql, params)
+            data = ResultSet.from_cursor(cursor)
+            cursor.close()
+            return {"status": "success", "data": data, "count": len(data), "query": sql, "params": params}
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi tổng hợp dữ liệu từ bảng {table_name}: {str(e)}"}
+    
+    def approximate_aggregate(self, table_name, measures, group_by=None, filters=None, order_by=None, limit=1000,
+                              sample_size=10000, confidence=0.95, sampling="uniform", target_error=None, max_rounds=4):
+        """Tổng hợp xấp xỉ trên mẫu ngẫu nhiên của bảng, kèm khoảng tin cậy (xem approximate.approximate_aggregate)"""
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        try:
+            return approximate_aggregate(
+                self, table_name, measures, group_by, filters, order_by, limit,
+                sample_size=sample_size, confidence=confidence, sampling=sampling,
+                target_error=target_error, max_rounds=max_rounds
+            )
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi tổng hợp xấp xỉ dữ liệu từ bảng {table_name}: {str(e)}"}
+    
+    def iter_batches(self, query, params=None, batch_size=5000):
+        """
+        Thực thi câu lệnh đọc và sinh lần lượt (tên cột, lô dòng) bằng fetchmany để giữ bộ nhớ ổn định.
+        Kết quả rỗng vẫn sinh một lô rỗng để bên dùng biết tên cột.
+        Nếu bên dùng dừng giữa chừng (đóng iterator hoặc lỗi), kết nối MySQL còn kết quả chưa đọc bị đóng
+        thay vì đọc hết phần còn lại; pool sẽ không giữ lại kết nối đã đóng.
+        """
+        cursor = self._cursor()
+        finished = False
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            first = True
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    if first:
+                        yield columns, []
+                    break
+                first = False
+                yield columns, rows
+            finished = True
+        finally:
+            if finished or self.db_type != "MySQL":
+                cursor.close()
+            else:
+                self._discard_connection()
+    
+    def _discard_connection(self):
+        """Đóng kết nối mà không đọc phần kết quả còn lại (transaction đang mở bị hủy theo)"""
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+        self.in_transaction = False
+        self._savepoints = []
+    
+    def fetch_columnar(self, query, params=None, batch_size=10000):
+        """
+        Thực thi câu lệnh đọc và trả về kết quả dạng cột (ColumnarResult: mỗi cột là một mảng NumPy có kiểu),
+        đọc theo từng lô để không giữ toàn bộ các dòng dạng tuple trong bộ nhớ.
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        try:
+            data = columnar_from_batches(self.iter_batches(query, params, batch_size))
+            return {"status": "success", "data": data, "count": len(data), "dtypes": data.dtypes()}
+        except ImportError as e:
+            return {"status": "error", "message": f"Đọc dữ liệu dạng cột cần cài đặt numpy: {str(e)}"}
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi thực thi câu lệnh: {str(e)}"}
+    
+    def export_query(self, query, path, fmt="csv", params=None, batch_size=5000, preview_rows=5, overwrite=False):
+        """Chạy câu lệnh đọc và ghi kết quả ra file theo từng lô fetchmany (xem exporter.export_batches)"""
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        batches = self.iter_batches(query, params, batch_size)
+        try:
+            return export_batches(batches, path, fmt, preview_rows, overwrite)
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi xuất kết quả truy vấn: {str(e)}"}
+        finally:
+            batches.close()
+    
+    def bulk_insert(self, table_name, columns, rows, column_types=None, if_exists="append", batch_size=50000,
+                    empty_as_null=False):
+        """
+        Ghi nhanh một luồng dòng vào bảng SQLite: executemany theo lô trong một transaction duy nhất
+        (lỗi thì không ghi gì), tạm tắt synchronous và tăng cache trong lúc ghi.
+        
+        Args:
+            columns: Tên cột theo thứ tự giá trị trong mỗi dòng
+            rows: Iterator các dòng (tuple/list)
+            column_types: {cột: kiểu SQLite} để tạo bảng nếu chưa có; None thì bảng phải có sẵn
+            if_exists: append, replace hoặc fail
+            empty_as_null: Chuỗi rỗng được lưu là NULL (dữ liệu CSV)
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        if self.db_type != "SQLite":
+            return {"status": "error", "message": "Chỉ hỗ trợ nhập dữ liệu hàng loạt vào SQLite"}
+        if self.read_only:
+            return {"status": "error", "message": "Database đang ở chế độ chỉ đọc"}
+        if if_exists not in ("append", "replace", "fail"):
+            return {"status": "error", "message": f"Giá trị if_exists không hợp lệ: {if_exists}. Các giá trị hợp lệ: append, replace, fail"}
+        
+        lookup = {table.lower(): table for table in self.get_table_names()}
+        existing = lookup.get(str(table_name).lower())
+        if existing and if_exists == "fail":
+            return {"status": "error", "message": f"Bảng {existing} đã tồn tại"}
+        if existing and if_exists == "append":
+            _, table_columns = self.get_column_names(existing)
+            try:
+                columns = [resolve_column(column, table_columns) for column in columns]
+            except ValueError as e:
+                return {"status": "error", "message": str(e)}
+        elif column_types is None:
+            return {"status": "error", "message": f"Không tìm thấy bảng: {table_name} (bật tạo bảng để tạo mới)"}
+        table_name = existing if existing and if_exists == "append" else table_name
+        
+        table_sql = quote_identifier(table_name, self.db_type)
+        marks = ", ".join(["NULLIF(?, '')" if empty_as_null else "?"] * len(columns))
+        insert_sql = f"INSERT INTO {table_sql} ({', '.join(quote_identifier(c, self.db_type) for c in columns)}) VALUES ({marks})"
+        
+        cursor = self.connection.cursor()
+        cursor.execute("PRAGMA synchronous")
+        synchronous = cursor.fetchone()[0]
+        cursor.execute("PRAGMA cache_size")
+        cache_size = cursor.fetchone()[0]
+        start = time.perf_counter()
+        total = 0
+        created = False
+        try:
+            # Tinh chỉnh tạm thời: không fsync từng bước, cache lớn, bảng tạm trong RAM
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA cache_size = -262144")
+            cursor.execute("PRAGMA temp_store = MEMORY")
+            result = self.begin()
+            if result["status"] != "success":
+                raise Exception(result["message"])
+            if existing and if_exists == "replace":
+                cursor.execute(f"DROP TABLE {quote_identifier(existing, self.db_type)}")
+            if not existing or if_exists == "replace":
+                definitions = ", ".join(f"{quote_identifier(column, self.db_type)} {column_types.get(column, 'TEXT')}"
+                                        for column in columns)
+                cursor.execute(f"CREATE TABLE {table_sql} ({definitions})")
+                created = True
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                cursor.executemany(insert_sql, batch)
+                total += len(batch)
+            result = self.commit()
+            if result["status"] != "success":
+                raise Exception(result["message"])
+        except Exception as e:
+            if self.in_transaction:
+                self.rollback()
+            return {"status": "error", "message": f"Lỗi khi nhập dữ liệu vào bảng {table_name} (đã hủy toàn bộ, dòng thứ ~{total + 1}): {str(e)}"}
+        finally:
+            cursor.execute(f"PRAGMA synchronous = {int(synchronous)}")
+            cursor.execute(f"PRAGMA cache_size = {int(cache_size)}")
+            cursor.execute("PRAGMA temp_store = DEFAULT")
+            cursor.close()
+        
+        seconds = time.perf_counter() - start
+        return {
+            "status": "success",
+            "table": table_name,
+            "rows": total,
+            "created": created,
+            "columns": column_types if created else columns,
+            "seconds": round(seconds, 3),
+            "rows_per_second": int(total / seconds) if seconds else total,
+        }
+    
+    def get_replication_lag(self):
+        """
+        Độ trễ replication (giây) của MySQL replica đang kết nối: Seconds_Behind_Source (MySQL 8.0.22+)
+        hoặc Seconds_Behind_Master. Trả về None nếu không phải replica hoặc không đọc được (thiếu quyền);
+        replication đang dừng được coi là trễ vô hạn.
+        """
+        if not self.connection or self.db_type != "MySQL":
+            return None
+
+        for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                                  ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+            cursor = self.connection.cursor(dictionary=True)
+            try:
+                cursor.execute(statement)
+                row = cursor.fetchone()
+                cursor.fetchall()
+            except Exception:
+                continue
+            finally:
+                cursor.close()
+            if row is None:
+                return None
+            lag = row.get(column)
+            return float("inf") if lag is None else float(lag)
+        return None
+
+    def get_data_version(self, table_name=None):
+        """
+        Lấy dấu phiên bản dữ liệu: thay đổi khi dữ liệu nguồn thay đổi.
+        SQLite dùng thời điểm sửa/kích thước file (kể cả WAL) và schema_version;
+        MySQL dùng UPDATE_TIME/TABLE_ROWS/AUTO_INCREMENT trong information_schema.
+        """
+        if not self.connection:
+            return None
+        
+        cursor = self.connection.cursor()
+        try:
             if self.db_type == "SQLite":
-                for row in rows:
-                    result_data.append({column_names[i]: row[i] for i in range(len(column_names))})
+                stamps = []
+                for suffix in ("", "-wal"):
+                    try:
+                        stat = os.stat(self.db_name + suffix)
+                        stamps.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+                    except OSError:
+                        pass
+                cursor.execute("PRAGMA schema_version")
+                stamps.append(str(cursor.fetchone()[0]))
+                return "|".join(stamps)
             elif self.db_type == "MySQL":
-                for row in rows:
-                    result_data.append({column_names[i]: row[i] for i in range(len(column_names))})
+                # MySQL 8 cache các cột thống kê của information_schema.TABLES (mặc định 1 ngày):
+                # tắt cache trong phiên để dấu phiên bản đổi ngay sau khi ghi (MySQL 5.7 không có biến này)
+                try:
+                    cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+                except Exception:
+                    pass
+                query = ("SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS, AUTO_INCREMENT, DATA_LENGTH "
+                         "FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+                params = ()
+                if table_name:
+                    query += " AND TABLE_NAME = %s"
+                    params = (table_name,)
+                cursor.execute(query + " ORDER BY TABLE_NAME", params)
+                return "|".join(":".join(str(value) for value in row) for row in cursor.fetchall())
+            return None
+        finally:
+            cursor.close()
+    
+    def _sampling_key(self, table_name, columns_info):
+        """Chọn khóa số nguyên dùng để lấy mẫu: rowid cho SQLite, khóa chính kiểu số nguyên cho MySQL"""
+        if self.db_type == "SQLite":
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(f"SELECT rowid FROM {quote_identifier(table_name, self.db_type)} LIMIT 1")
+                return "rowid"
+            except sqlite3.Error:
+                # Bảng WITHOUT ROWID
+                return None
+            finally:
+                cursor.close()
+        
+        primary = [col for col in columns_info if col.get("key") == "PRI"]
+        if len(primary) == 1 and "int" in str(primary[0]["type"]).lower():
+            return quote_identifier(primary[0]["name"], self.db_type)
+        return None
+    
+    def get_key_bounds(self, table_name):
+        """Trả về (MIN, MAX) của khóa số nguyên dùng để lấy mẫu, hoặc None nếu bảng không có khóa phù hợp"""
+        table_name, _ = self.get_column_names(table_name)
+        key = self._sampling_key(table_name, self.get_table_schema(table_name)["schema"])
+        if key is None:
+            return None
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {quote_identifier(table_name, self.db_type)}")
+            low, high = cursor.fetchone()
+        finally:
+            cursor.close()
+        if low is None:
+            return None
+        return int(low), int(high)
+
+    def get_range_checksum(self, table_name, columns, key_range=None):
+        """
+        Dấu kiểm (số dòng, tổng CRC32 của từng dòng) trên khóa và các cột cho trước, trong khoảng khóa (sau, đến].
+        Dòng bị sửa/xóa/thêm trong khoảng làm dấu kiểm đổi; dấu kiểm của hai khoảng liền nhau cộng lại được.
+        """
+        table_name, names = self.get_column_names(table_name)
+        key = self._sampling_key(table_name, self.get_table_schema(table_name)["schema"])
+        if key is None:
+            raise ValueError(f"Bảng {table_name} không có khóa số nguyên để lọc theo khoảng khóa")
+        values = [key] + [quote_identifier(resolve_column(column, names), self.db_type) for column in columns]
+        if self.db_type == "SQLite":
+            # SQLite không có CRC32: đăng ký hàm Python trên kết nối (quote() phân biệt NULL với chuỗi 'NULL')
+            self.connection.create_function(
+                "crc32", 1, lambda text: zlib.crc32(text.encode("utf-8")), deterministic=True
+            )
+            row_hash = "crc32(" + " || '#' || ".join(f"quote({value})" for value in values) + ")"
+        else:
+            row_hash = "CRC32(CONCAT_WS('#', " + ", ".join(f"QUOTE({value})" for value in values) + "))"
+        conditions = []
+        if key_range is not None:
+            after, upto = key_range
+            if after is not None:
+                conditions.append(f"{key} > {int(after)}")
+            if upto is not None:
+                conditions.append(f"{key} <= {int(upto)}")
+        sql = f"SELECT COUNT(*), COALESCE(SUM({row_hash}), 0) FROM {quote_identifier(table_name, self.db_type)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(sql)
+            count, checksum = cursor.fetchone()
+        finally:
+            cursor.close()
+        return int(count), int(checksum)
+
+    def sample_rows(self, table_name, columns=None, sample_size=10000, filters=None, seed=None,
+                    key_bounds=None, count_population=False):
+        """
+        Lấy mẫu ngẫu nhiên các dòng của bảng mà không quét toàn bộ bảng.
+        
+        Với bảng có khóa số nguyên (rowid của SQLite hoặc khóa chính số nguyên của MySQL), chọn ngẫu nhiên
+        các giá trị khóa trong khoảng [MIN, MAX] (hoặc key_bounds nếu có) rồi đọc các dòng tương ứng. Mỗi giá trị
+        khóa trong khoảng có cùng xác suất được chọn (probes / key_range), nên có thể dùng để ngoại suy cho toàn bảng.
+        
+        Nếu bảng không có khóa số nguyên thì dùng ORDER BY RANDOM(); khi count_population=True sẽ đếm thêm số dòng
+        thỏa điều kiện lọc để probes / key_range vẫn là tỷ lệ lấy mẫu.
+        
+        Returns:
+            {"status", "data": ResultSet, "method": full|key_probe|random, "probes", "key_range"}
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        try:
+            table_name, all_columns = self.get_column_names(table_name)
+            selected = [resolve_column(col, all_columns) for col in columns] if columns else all_columns
+            where_sql, filter_params = compile_filters(filters, self.db_type, all_columns)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        
+        dialect = self.db_type
+        table_sql = quote_identifier(table_name, dialect)
+        select_sql = ", ".join(quote_identifier(col, dialect) for col in selected)
+        rng = random.Random(seed)
+        
+        try:
+            key = self._sampling_key(table_name, self.get_table_schema(table_name)["schema"])
+            cursor = self._cursor()
+            
+            if key is None:
+                # Không có khóa số nguyên: dùng ORDER BY RANDOM() (phải quét bảng nhưng vẫn chỉ trả về mẫu)
+                random_fn = "RAND()" if dialect == "MySQL" else "RANDOM()"
+                cursor.execute(f"SELECT {select_sql} FROM {table_sql}{where_sql} ORDER BY {random_fn} LIMIT {int(sample_size)}",
+                               filter_params)
+                data = ResultSet(selected, cursor.fetchall())
+                probes = population = None
+                if count_population:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table_sql}{where_sql}", filter_params)
+                    population = cursor.fetchone()[0]
+                    probes = len(data)
+                cursor.close()
+                return {"status": "success", "data": data, "method": "random", "probes": probes, "key_range": population}
+            
+            if key_bounds:
+                low, high = key_bounds
+            else:
+                cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table_sql}")
+                low, high = cursor.fetchone()
+            if low is None:
+                cursor.close()
+                return {"status": "success", "data": ResultSet(selected, []), "method": "full", "probes": 0, "key_range": 0}
+            
+            key_range = int(high) - int(low) + 1
+            if sample_size <= 0 or key_range <= sample_size:
+                # Khoảng khóa nhỏ: đọc toàn bộ
+                range_filter = where_sql.replace(" WHERE ", " AND ", 1) if where_sql else ""
+                cursor.execute(f"SELECT {select_sql} FROM {table_sql} WHERE {key} BETWEEN {int(low)} AND {int(high)}{range_filter}",
+                               filter_params)
+                data = ResultSet(selected, cursor.fetchall())
+                cursor.close()
+                return {"status": "success", "data": data, "method": "full", "probes": key_range, "key_range": key_range}
             
+            # Chọn ngẫu nhiên (không lặp) các giá trị khóa, đọc theo từng lô cho tới khi đủ mẫu
+            max_probes = min(key_range, max(sample_size * 20, 1000))
+            candidates = rng.sample(range(int(low), int(high) + 1), max_probes)
+            mark = placeholder(dialect)
+            key_filter = where_sql.replace(" WHERE ", " AND ", 1) if where_sql else ""
+            rows = []
+            used = 0
+            while used < len(candidates) and len(rows) < sample_size:
+                need = sample_size - len(rows)
+                if used:
+                    # Ước lượng mật độ khóa tồn tại từ các lô trước để chọn số khóa cần thử tiếp theo
+                    density = max(len(rows), 1) / used
+                    need = int(need / density * 1.1) + 1
+                batch = min(len(candidates) - used, max(need, 100))
+                probe_keys = candidates[used:used + batch]
+                used += batch
+                for start in range(0, len(probe_keys), 500):
+                    chunk = probe_keys[start:start + 500]
+                    cursor.execute(
+                        f"SELECT {select_sql} FROM {table_sql} WHERE {key} IN ({', '.join([mark] * len(chunk))}){key_filter}",
+                        list(chunk) + list(filter_params)
+                    )
+                    rows.extend(cursor.fetchall())
             cursor.close()
-            return {"status": "success", "data": result_data, "count": len(result_data)}
+            return {"status": "success", "data": ResultSet(selected, rows), "method": "key_probe",
+                    "probes": used, "key_range": key_range}
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi lấy mẫu dữ liệu từ bảng {table_name}: {str(e)}"}
+    
+    def profile_table(self, table_name, sample_size=10000, top_k=5, bins=10):
+        """
+        Thống kê từng cột của bảng (tỷ lệ null, min/max, top-k, số giá trị phân biệt xấp xỉ, histogram)
+        từ một mẫu ngẫu nhiên. Kết quả được cache theo phiên bản dữ liệu của bảng.
+        """
+        if not self.connection:
+            return {"status": "error", "message": "Không có kết nối database"}
+        
+        try:
+            table_name, _ = self.get_column_names(table_name)
+            schema = self.get_table_schema(table_name)["schema"]
+            version = self.get_data_version(table_name)
         except Exception as e:
-            return {"status": "error", "message": f"Lỗi khi tìm kiếm dữ liệu: {str(e)}"}
\ No newline at end of file
+            return {"status": "error", "message": str(e)}
+        
+        cache_key = (self.db_type, self.db_name, table_name, version, sample_size, top_k, bins)
+        cached = profile_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, cached=True)
+        
+        declared_types = {col["name"]: col["type"] for col in schema}
+        column_names = [col["name"] for col in schema]
+        
+        if sample_size <= 0:
+            # Quét toàn bộ bảng theo luồng: các sketch giữ bộ nhớ cố định
+            query = f"SELECT * FROM {quote_identifier(table_name, self.db_type)}"
+            rows = (row for _, batch in self.iter_batches(query) for row in batch)
+            try:
+                scanned, columns = profile_rows(column_names, rows, declared_types, top_k, bins)
+            except Exception as e:
+                return {"status": "error", "message": f"Lỗi khi thống kê bảng {table_name}: {str(e)}"}
+            method, fraction = "full", 1.0
+        else:
+            sample = self.sample_rows(table_name, sample_size=sample_size)
+            if sample["status"] != "success":
+                return sample
+            data = sample["data"]
+            scanned, columns = profile_rows(data.columns, data.rows, declared_types, top_k, bins)
+            method = sample["method"]
+            fraction = round(sample["probes"] / sample["key_range"], 6) if sample["key_range"] else None
+        
+        result = {
+            "status": "success",
+            "table": table_name,
+            "sampled_rows": scanned,
+            "method": method,
+            "sample_fraction": fraction,
+            "version": version,
+            "columns": columns,
+            "cached": False
+        }
+        profile_cache.put(cache_key, result)
+        return result
@@ -1,22 +1,88 @@
 from mcp.server.fastmcp import FastMCP
-from mcp_server import DatabaseServer
+from mcp.types import Resource as MCPResource
+from mcp_server import DatabaseServer, preload_driver
+from catalog import catalog_cache, database_summary
+from connection_pool import connection_pool
+from replica_router import parse_endpoint, replica_router
+from result_encoder import dumps
+from summaries import summary_store
+from spill_store import spill_store
+from timeseries import MAX_BUCKETS, build_series, plan_measures
+from sql_builder import TIME_BUCKETS
+from result_set import ResultSet
+from exporter import EXPORT_FORMATS, default_export_name, export_path
+import analysis
+from importer import IMPORT_FORMATS, import_file
 import json
 import os
 import sys
 import glob
 import contextlib
+import concurrent.futures
+import itertools
 import re
+import threading
+import time
+import functools
+import anyio
 from typing import Optional, Dict, Any, List, Union
 
 # Đặt mã hóa UTF-8 cho đầu ra
 sys.stdout.reconfigure(encoding='utf-8')
 
+# URI resource chứa catalog (schema) của từng database
+SCHEMA_URI = "db://{name}/schema"
+
+class DatabaseMCP(FastMCP):
+    """
+    FastMCP liệt kê thêm resource db://<tên>/schema cho mỗi database đang có. Danh sách được tính
+    mỗi lần resources/list từ available_databases (đọc qua resource template database_schema), nên không phải
+    đăng ký/xóa resource từ luồng quét database. Server không khai báo resources.listChanged (FastMCP không có
+    API công khai cho việc này) nên không gửi thông báo thay đổi; client lấy danh sách mới ở lần resources/list kế tiếp.
+    """
+
+    async def list_resources(self) -> list[MCPResource]:
+        resources = await super().list_resources()
+        for name in list(available_databases):
+            resources.append(MCPResource(
+                uri=SCHEMA_URI.format(name=name),
+                name=f"{name}_schema",
+                description=f"Catalog của database {name}: các bảng, cột, số dòng và khóa ngoại",
+                mimeType="application/json",
+            ))
+        return resources
+
 # Khởi tạo FastMCP
-mcp = FastMCP("DatabaseTool")
+mcp = DatabaseMCP("DatabaseTool")
+
+# Các tool quản trị (ghi dữ liệu) chỉ được đăng ký khi bật MCP_ADMIN_TOOLS
+ADMIN_TOOLS = os.environ.get("MCP_ADMIN_TOOLS", "").lower() in ("1", "true", "yes")
+
+# Số dòng mặc định và tối đa mà execute_query trả về trong một lần gọi
+QUERY_ROW_LIMIT = int(os.environ.get("MCP_QUERY_ROW_LIMIT", "1000"))
+QUERY_MAX_ROWS = int(os.environ.get("MCP_QUERY_MAX_ROWS", "10000"))
+
+# Số câu lệnh tối đa của execute_batch và số database chạy song song
+BATCH_MAX_QUERIES = int(os.environ.get("MCP_BATCH_MAX_QUERIES", "20"))
+BATCH_MAX_WORKERS = int(os.environ.get("MCP_BATCH_MAX_WORKERS", "8"))
+
+# Số shard tối đa mà timeseries gộp trong một lần gọi
+TIMESERIES_MAX_SHARDS = int(os.environ.get("MCP_TIMESERIES_MAX_SHARDS", "32"))
+
+# Khởi động lại worker pre-fork bị dừng: chờ từ PREFORK_RESTART_DELAY giây, gấp đôi sau mỗi lần trong
+# PREFORK_RESTART_WINDOW giây (tối đa PREFORK_MAX_RESTART_DELAY); quá PREFORK_MAX_RESTARTS lần thì dừng server
+PREFORK_RESTART_DELAY = 1
+PREFORK_MAX_RESTART_DELAY = 30
+PREFORK_RESTART_WINDOW = 60
+PREFORK_MAX_RESTARTS = 10
 
 # Danh sách các database đã phát hiện
 available_databases = {}
 
+# Luồng quét database ban đầu (chạy nền để không chặn mcp.run)
+_discovery_thread = None
+_discovery_lock = threading.Lock()
+
 def discover_databases():
     """Tự động phát hiện các database có sẵn trong thư mục hiện tại"""
     databases = {}
@@ -28,7 +94,7 @@ def discover_databases():
             "type": "sqlite",
             "path": db_file
         }
-        print(f"[DISCOVER] Tìm thấy SQLite database: {db_name}")
+        print(f"[DISCOVER] Tìm thấy SQLite database: {db_name}", file=sys.stderr)
     
     # Đọc cấu hình MySQL từ file (nếu có)
     if os.path.exists("mysql_config.json"):
@@ -47,12 +113,51 @@ def discover_databases():
                         "database": config.get("database"),
                         "port": config.get("port", 3306)
                     }
-                    print(f"[DISCOVER] Tìm thấy MySQL database: {db_name} ({config.get('database')})")
+                    # Các replica (tùy chọn) nhận toàn bộ truy vấn chỉ đọc, primary chỉ dùng khi không có replica nào dùng được
+                    if config.get("replicas"):
+                        databases[db_name]["replicas"] = [parse_endpoint(replica, config.get("port", 3306)) for replica in config["replicas"]]
+                        if "max_replica_lag" in config:
+                            databases[db_name]["max_replica_lag"] = config["max_replica_lag"]
+                    print(f"[DISCOVER] Tìm thấy MySQL database: {db_name} ({config.get('database')})", file=sys.stderr)
         except Exception as e:
-            print(f"[ERROR] Lỗi khi đọc cấu hình MySQL: {str(e)}")
+            print(f"[ERROR] Lỗi khi đọc cấu hình MySQL: {str(e)}", file=sys.stderr)
     
     return databases
 
+def _run_discovery():
+    """Quét database rồi nạp trước driver cho các loại database tìm thấy"""
+    global available_databases
+    available_databases = discover_databases()
+    print(f"=== Đã phát hiện {len(available_databases)} database ===", file=sys.stderr)
+    
+    # Bản chụp catalog của lần chạy trước: chỉ database có phiên bản dữ liệu đổi mới phải đọc lại
+    catalog_cache.load()
+    catalog_cache.retain(available_databases)
+    
+    for db_type in {config["type"] for config in available_databases.values()}:
+        preload_driver(db_type)
+
+def start_discovery():
+    """Bắt đầu quét database trong nền (chỉ một lần) và trả về luồng quét"""
+    global _discovery_thread
+    with _discovery_lock:
+        if _discovery_thread is None:
+            _discovery_thread = threading.Thread(target=_run_discovery, name="discover-databases", daemon=True)
+            _discovery_thread.start()
+    return _discovery_thread
+
+def wait_for_discovery():
+    """Chờ lần quét database ban đầu hoàn tất (tự khởi động nếu chưa chạy)"""
+    start_discovery().join()
+
+def read_database_catalog(name):
+    """Đọc catalog của database (dùng cache, chỉ lấy lại khi dữ liệu thay đổi) dưới dạng JSON"""
+    with DatabaseHelper.connect_to_database(name) as server:
+        catalog = catalog_cache.get(name, server)
+    if catalog["status"] != "success":
+        raise Exception(catalog["message"])
+    return dumps(dict(catalog, database=name))
+
 class DatabaseHelper:
     """Helper class để làm việc với database"""
     
@@ -60,15 +165,39 @@ class DatabaseHelper:
     @contextlib.contextmanager
     def connect_to_database(db_name):
         """Kết nối tới database bằng tên"""
+        wait_for_discovery()
         if db_name not in available_databases:
             raise Exception(f"Không tìm thấy database: {db_name}")
         
         db_config = available_databases[db_name]
+        replicated = db_config["type"] == "mysql" and bool(db_config.get("replicas"))
+        pool_key = db_name
+        
+        # Dùng lại kết nối rảnh trong pool nếu có
+        # (database có replica lấy kết nối rảnh theo replica được router chọn, xem bên dưới)
+        server = None if replicated else connection_pool.acquire(db_name)
+        if server is not None:
+            try:
+                yield server
+            finally:
+                connection_pool.release(db_name, server)
+            return
+        
         server = DatabaseServer()
         
         # Kết nối dựa trên loại database
         if db_config["type"] == "sqlite":
             result = server.connect_sqlite(db_config["path"])
+        elif replicated:
+            # Mọi tool đều chỉ đọc: chọn replica theo độ trễ và tình trạng, lỗi thì chuyển sang replica khác/primary.
+            # Kết nối rảnh được giữ theo từng replica và chỉ dùng lại khi router vẫn chọn replica đó
+            server, endpoint = replica_router.connect(
+                db_config, functools.partial(DatabaseHelper._connect_endpoint, db_config),
+                acquire=lambda endpoint: connection_pool.acquire(DatabaseHelper._pool_key(db_name, endpoint))
+            )
+            # Kết nối tới primary khi không replica nào dùng được thì không giữ lại, để lần sau thử lại replica
+            pool_key = None if endpoint.get("primary") else DatabaseHelper._pool_key(db_name, endpoint)
+            result = {"status": "success"}
         elif db_config["type"] == "mysql":
             result = server.connect_mysql(
                 db_config["host"],
@@ -86,7 +215,29 @@ class DatabaseHelper:
         try:
             yield server
         finally:
-            server.disconnect()
+            if pool_key is None:
+                server.disconnect()
+            else:
+                connection_pool.release(pool_key, server)
+    
+    @staticmethod
+    def _pool_key(db_name, endpoint):
+        """Khóa pool kết nối của một replica"""
+        return f"{db_name}@{endpoint['host']}:{endpoint['port']}"
+    
+    @staticmethod
+    def _connect_endpoint(db_config, endpoint):
+        """Kết nối tới một endpoint (replica hoặc primary) của MySQL database; replica có thể ghi đè user/password"""
+        server = DatabaseServer()
+        result = server.connect_mysql(
+            endpoint["host"],
+            endpoint.get("user", db_config["user"]),
+            endpoint.get("password", db_config["password"]),
+            db_config["database"],
+            endpoint["port"],
+            read_only=not endpoint.get("primary", False)
+        )
+        return server, result
     
     @staticmethod
     def is_safe_query(query):
@@ -108,11 +259,19 @@ class DatabaseHelper:
         
         return True
 
+@mcp.resource(SCHEMA_URI, name="database_schema", mime_type="application/json",
+              description="Catalog của một database: các bảng, cột, số dòng và khóa ngoại")
+def database_schema(name: str) -> str:
+    """Catalog của database theo tên (thay cho nhiều lần gọi list_tables/describe_table)"""
+    return read_database_catalog(name)
+
 @mcp.tool()
 def list_available_databases() -> str:
     """Liệt kê tất cả các database có sẵn"""
     global available_databases
     
+    wait_for_discovery()
+    
     if not available_databases:
         return "[INFO] Không tìm thấy database nào."
     
@@ -129,22 +288,28 @@ def list_available_databases() -> str:
             db_info["host"] = config["host"]
             db_info["database"] = config["database"]
             db_info["user"] = config["user"]
+            if config.get("replicas"):
+                db_info["replicas"] = replica_router.stats(config)
         
         result["databases"][name] = db_info
     
     return json.dumps(result, indent=2)
 
 @mcp.tool()
-def explore_database(db_name: str, action: str = "list_tables", table_name: str = None, limit: int = 100, search_term: str = None) -> str:
+def explore_database(db_name: str, action: str = "list_tables", table_name: str = None, limit: int = 100, search_term: str = None,
+                     sample_size: int = 10000, top_k: int = 5, bins: int = 10) -> str:
     """
     Khám phá database và dữ liệu
     
     Args:
         db_name: Tên database để khám phá
-        action: Hành động cần thực hiện (list_tables, describe_table, get_data, search_data)
-        table_name: Tên bảng (cần thiết cho describe_table, get_data, search_data)
+        action: Hành động cần thực hiện (list_tables, describe_table, get_data, search_data, profile_table)
+        table_name: Tên bảng (cần thiết cho describe_table, get_data, search_data, profile_table)
         limit: Số lượng bản ghi tối đa trả về (cho get_data, search_data)
         search_term: Từ khóa tìm kiếm (cho search_data)
+        sample_size: Số dòng mẫu ngẫu nhiên để thống kê (cho profile_table, 0 = quét toàn bộ bảng)
+        top_k: Số giá trị phổ biến nhất của mỗi cột (cho profile_table)
+        bins: Số khoảng của histogram cho cột số (cho profile_table)
     
     Returns:
         Kết quả truy vấn
@@ -164,7 +329,7 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
                 result = server.get_table_schema(table_name)
                 if not result:
                     return f"[INFO] Không tìm thấy bảng: {table_name} trong database {db_name}."
-                return result
+                return dumps(result)
             
             elif action == "get_data":
                 if not table_name:
@@ -173,7 +338,7 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
                 result = server.get_all_data(table_name, limit)
                 if not result:
                     return f"[INFO] Không có dữ liệu trong bảng: {table_name} của database {db_name}."
-                return result
+                return dumps(result)
             
             elif action == "search_data":
                 if not table_name:
@@ -184,36 +349,501 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
                 result = server.search_data(table_name, search_term, limit=limit)
                 if not result:
                     return f"[INFO] Không tìm thấy dữ liệu phù hợp với từ khóa '{search_term}' trong bảng: {table_name}."
-                return result
+                return dumps(result)
+            
+            elif action == "profile_table":
+                if not table_name:
+                    return "[ERROR] Vui lòng cung cấp tham số table_name."
+                
+                result = server.profile_table(table_name, sample_size, top_k, bins)
+                if result["status"] != "success":
+                    return f"[ERROR] {result['message']}"
+                return dumps(result)
             
             else:
-                return f"[ERROR] Hành động không hợp lệ: {action}. Các hành động hợp lệ: list_tables, describe_table, get_data, search_data"
+                return f"[ERROR] Hành động không hợp lệ: {action}. Các hành động hợp lệ: list_tables, describe_table, get_data, search_data, profile_table"
     
     except Exception as e:
         return f"[ERROR] {str(e)}"
 
 @mcp.tool()
-def execute_query(db_name: str, query: str) -> str:
+def execute_query(db_name: str, query: str, limit: int = None, offset: int = 0, spill: bool = False) -> str:
     """
     Thực thi câu lệnh SQL chỉ đọc (SELECT) trên database
     
     Args:
         db_name: Tên database để thực thi câu lệnh
         query: Câu lệnh SQL (chỉ cho phép SELECT)
+        limit: Số dòng tối đa trả về (mặc định và tối đa theo cấu hình server)
+        offset: Bỏ qua số dòng này (dùng next_offset của lần gọi trước để lấy tiếp)
+        spill: Nếu kết quả dài hơn limit, lưu toàn bộ kết quả tạm trên server và trả về handle cùng trang đầu;
+            các trang sau lấy bằng fetch_result_page mà không chạy lại truy vấn
     
     Returns:
-        Kết quả của câu lệnh SQL
+        Kết quả của câu lệnh SQL; "truncated": true và "next_offset" nếu còn dòng chưa trả về
     """
     # Kiểm tra câu lệnh SQL có an toàn không
     if not DatabaseHelper.is_safe_query(query):
         return "[ERROR] Chỉ cho phép câu lệnh SELECT để đảm bảo chế độ chỉ đọc"
     
+    limit = min(max(int(limit), 1), QUERY_MAX_ROWS) if limit else QUERY_ROW_LIMIT
+    try:
+        with DatabaseHelper.connect_to_database(db_name) as server:
+            if spill and not offset:
+                return spill_query(server, db_name, query, limit)
+            result = server.execute_query(query, limit=limit, offset=offset)
+            if result["status"] != "success":
+                return f"[ERROR] {result['message']}"
+            return dumps(result["data"])
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+def spill_query(server, db_name, query, page_size):
+    """
+    Đọc kết quả theo lô (chạy truy vấn một lần); nếu không quá page_size dòng thì trả về trực tiếp,
+    ngược lại ghi toàn bộ vào spill_store và trả về handle cùng trang đầu tiên.
+    """
+    batches = server.iter_batches(query, batch_size=max(page_size, 5000))
+    try:
+        columns, first = next(batches)
+        second = next(batches, None)
+        if second is None and len(first) <= page_size:
+            return dumps(ResultSet(columns, first, truncated=False))
+        
+        head = [(columns, first)] + ([second] if second is not None else [])
+        stored = spill_store.spill(itertools.chain(head, batches), page_size=page_size,
+                                   info={"db_name": db_name, "query": query})
+    finally:
+        # Giải phóng kết quả chưa đọc nếu dừng ở max_rows hoặc lỗi
+        batches.close()
+    if stored["status"] != "success":
+        return f"[ERROR] {stored['message']}"
+    page = spill_store.page(stored["handle"], 1, page_size)
+    if page["status"] != "success":
+        return f"[ERROR] {page['message']}"
+    del page["status"]
+    page["expires_in"] = stored["expires_in"]
+    return dumps(page)
+
+@mcp.tool()
+def fetch_result_page(handle: str, page: int = 1, page_size: int = None) -> str:
+    """
+    Lấy một trang của kết quả đã lưu tạm bởi execute_query(spill=true), không chạy lại truy vấn
+    
+    Args:
+        handle: Handle trả về từ execute_query
+        page: Số trang (bắt đầu từ 1)
+        page_size: Số dòng mỗi trang (mặc định bằng limit khi lưu kết quả, tối đa theo cấu hình server)
+    
+    Returns:
+        Các dòng của trang cùng số trang (pages), tổng số dòng (rows) và has_more
+    """
+    page_size = min(max(int(page_size), 1), QUERY_MAX_ROWS) if page_size else None
+    result = spill_store.page(handle, page, page_size)
+    if result["status"] != "success":
+        return f"[ERROR] {result['message']}"
+    del result["status"]
+    return dumps(result)
+
+def _run_batch_group(db_name, items, limit, snapshot):
+    """Chạy lần lượt các truy vấn của cùng một database trên một kết nối (trong một transaction chỉ đọc nếu snapshot)"""
+    results = {}
+    try:
+        with DatabaseHelper.connect_to_database(db_name) as server:
+            if snapshot:
+                started = server.begin(snapshot=True)
+                if started["status"] != "success":
+                    raise Exception(started["message"])
+            try:
+                for index, item in items:
+                    start = time.perf_counter()
+                    result = server.execute_query(item["query"], item.get("params"), limit=limit)
+                    elapsed = round((time.perf_counter() - start) * 1000, 2)
+                    if result["status"] != "success":
+                        results[index] = {"status": "error", "message": result["message"], "elapsed_ms": elapsed}
+                    else:
+                        results[index] = {"status": "success", "data": result["data"], "elapsed_ms": elapsed}
+            finally:
+                if snapshot:
+                    server.rollback()
+    except Exception as e:
+        for index, _ in items:
+            results.setdefault(index, {"status": "error", "message": str(e)})
+    return results
+
+@mcp.tool()
+def execute_batch(queries: List[Dict[str, Any]], snapshot: bool = False, limit: int = None) -> str:
+    """
+    Thực thi nhiều câu lệnh SELECT trong một lần gọi: các database khác nhau chạy song song,
+    các câu lệnh cùng database chạy lần lượt trên cùng một kết nối
+    
+    Args:
+        queries: Danh sách {"db_name": ..., "query": ..., "params": [...] (tùy chọn)}
+        snapshot: Các câu lệnh cùng database chạy trong một transaction chỉ đọc, thấy cùng một bản chụp dữ liệu
+        limit: Số dòng tối đa của mỗi kết quả (như execute_query)
+    
+    Returns:
+        Danh sách kết quả theo đúng thứ tự đầu vào, mỗi phần tử có db_name, status, data hoặc message
+    """
+    if not queries:
+        return "[ERROR] Vui lòng cung cấp ít nhất một câu lệnh trong queries."
+    if len(queries) > BATCH_MAX_QUERIES:
+        return f"[ERROR] Tối đa {BATCH_MAX_QUERIES} câu lệnh mỗi lần gọi."
+    
+    limit = min(max(int(limit), 1), QUERY_MAX_ROWS) if limit else QUERY_ROW_LIMIT
+    results = {}
+    groups = {}
+    for index, item in enumerate(queries):
+        if not isinstance(item, dict) or not item.get("db_name") or not item.get("query"):
+            results[index] = {"status": "error", "message": "Mỗi phần tử cần có db_name và query"}
+        elif not DatabaseHelper.is_safe_query(item["query"]):
+            results[index] = {"status": "error", "message": "Chỉ cho phép câu lệnh SELECT để đảm bảo chế độ chỉ đọc"}
+        else:
+            groups.setdefault(item["db_name"], []).append((index, item))
+    
+    if groups:
+        wait_for_discovery()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(groups), BATCH_MAX_WORKERS)) as executor:
+            futures = [executor.submit(_run_batch_group, db_name, items, limit, snapshot) for db_name, items in groups.items()]
+            for future in futures:
+                results.update(future.result())
+    
+    return dumps({
+        "results": [dict(results[index], db_name=item.get("db_name") if isinstance(item, dict) else None, index=index)
+                    for index, item in enumerate(queries)],
+        "snapshot": snapshot,
+    })
+
+@mcp.tool()
+def export_query(db_name: str, query: str, format: str = "csv", file_name: str = None,
+                 batch_size: int = 5000, preview_rows: int = 5, overwrite: bool = False) -> str:
+    """
+    Xuất kết quả câu lệnh SELECT ra file trên máy (CSV, JSONL hoặc Parquet) thay vì trả dữ liệu qua MCP.
+    Dữ liệu được đọc và ghi theo từng lô nên dùng được cho kết quả rất lớn.
+    
+    Args:
+        db_name: Tên database
+        query: Câu lệnh SQL (chỉ cho phép SELECT)
+        format: Định dạng file (csv, jsonl, parquet)
+        file_name: Tên file (không kèm thư mục); mặc định <db_name>_<thời gian>
+        batch_size: Số dòng mỗi lô đọc từ database
+        preview_rows: Số dòng xem trước trả về
+        overwrite: Ghi đè nếu file cùng tên đã tồn tại (mặc định: báo lỗi)
+    
+    Returns:
+        Đường dẫn file, số dòng, kích thước (byte) và vài dòng xem trước
+    """
+    if format not in EXPORT_FORMATS:
+        return f"[ERROR] Định dạng không hợp lệ: {format}. Các định dạng hợp lệ: {', '.join(EXPORT_FORMATS)}"
+    
+    if not DatabaseHelper.is_safe_query(query):
+        return "[ERROR] Chỉ cho phép câu lệnh SELECT để đảm bảo chế độ chỉ đọc"
+    
+    try:
+        path = export_path(file_name or default_export_name(db_name), format)
+        with DatabaseHelper.connect_to_database(db_name) as server:
+            result = server.export_query(query, path, format, batch_size=max(int(batch_size), 1), preview_rows=preview_rows,
+                                         overwrite=overwrite)
+            if result["status"] != "success":
+                return f"[ERROR] {result['message']}"
+            return dumps(result)
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+@mcp.tool()
+def aggregate(db_name: str, table_name: str, measures: List[str], group_by: List[str] = None,
+              filters: List[Dict[str, Any]] = None, order_by: List[str] = None, limit: int = 1000,
+              mode: str = "exact", sample_size: int = 10000, confidence: float = 0.95, sampling: str = "uniform",
+              target_error: float = None, use_summaries: bool = True) -> str:
+    """
+    Tổng hợp dữ liệu ngay trên database (SUM/AVG/MIN/MAX/COUNT theo nhóm) và chỉ trả về kết quả đã tổng hợp.
+    Nên dùng thay cho việc lấy toàn bộ dữ liệu rồi tự tính. Với bảng rất lớn có thể dùng mode="approx"
+    để ước lượng nhanh trên mẫu ngẫu nhiên, kèm khoảng tin cậy (<alias>_ci_low, <alias>_ci_high).
+    
+    Args:
+        db_name: Tên database
+        table_name: Tên bảng
+        measures: Danh sách phép đo, ví dụ ["sum(total_price)", "count(*)", "count_distinct(customer_id) as buyers"].
+                  Các hàm hợp lệ: sum, avg, min, max, count, count_distinct
+        group_by: Danh sách cột dùng để nhóm (ví dụ ["product_id"])
+        filters: Danh sách điều kiện lọc dạng {"column": ..., "op": ..., "value": ...}.
+                 Các toán tử: =, !=, <, <=, >, >=, like, not like, in, not in, between, is null, is not null
+        order_by: Danh sách cột nhóm hoặc alias để sắp xếp, thêm '-' phía trước để sắp giảm dần (ví dụ ["-sum_total_price"])
+        limit: Số nhóm tối đa trả về (mặc định: 1000)
+        mode: "exact" (mặc định, chạy SQL chính xác) hoặc "approx" (ước lượng trên mẫu)
+        sample_size: Kích thước mẫu ban đầu cho mode="approx"
+        confidence: Mức tin cậy của khoảng tin cậy (mặc định: 0.95)
+        sampling: "uniform" hoặc "stratified" (chia bảng thành nhiều đoạn khóa và lấy mẫu từng đoạn)
+        target_error: Sai số tương đối mong muốn (ví dụ 0.01); mẫu được tăng dần cho tới khi đạt
+        use_summaries: Với mode="exact", trả lời từ bảng tổng hợp đã lưu (manage_summaries) nếu có bảng phù hợp
+    
+    Returns:
+        Kết quả tổng hợp (columns, rows) kèm câu SQL đã chạy (và "source" nếu lấy từ bảng tổng hợp)
+        hoặc thông tin mẫu khi ước lượng
+    """
+    if mode not in ("exact", "approx"):
+        return f"[ERROR] Chế độ không hợp lệ: {mode}. Các chế độ hợp lệ: exact, approx"
+    
+    try:
+        with DatabaseHelper.connect_to_database(db_name) as server:
+            if mode == "approx":
+                result = server.approximate_aggregate(
+                    table_name, measures, group_by, filters, order_by, limit,
+                    sample_size=sample_size, confidence=confidence, sampling=sampling, target_error=target_error
+                )
+            else:
+                result = None
+                if use_summaries:
+                    result = summary_store.answer(server, db_name, table_name, measures, group_by, filters, order_by, limit)
+                if result is None:
+                    result = server.aggregate(table_name, measures, group_by, filters, order_by, limit)
+            if result["status"] != "success":
+                return f"[ERROR] {result['message']}"
+            return dumps(result)
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+def expand_shards(db_name, shards):
+    """
+    Danh sách database cần gộp: mặc định chỉ db_name; shards là danh sách tên
+    hoặc khoảng "đầu..cuối" (các database đã đăng ký có tên nằm trong khoảng, theo thứ tự chữ cái)
+    """
+    if not shards:
+        return [db_name]
+    if isinstance(shards, str):
+        shards = [shards]
+    names = []
+    for shard in shards:
+        if ".." in shard:
+            low, _, high = shard.partition("..")
+            matched = sorted(name for name in available_databases if low.strip() <= name <= high.strip())
+            if not matched:
+                raise ValueError(f"Không có database nào trong khoảng {shard}")
+            names.extend(matched)
+        else:
+            names.append(shard)
+    return list(dict.fromkeys(names))
+
+def _timeseries_shard(db_name, table_name, measures, group_by, filters):
+    with DatabaseHelper.connect_to_database(db_name) as server:
+        result = server.aggregate(table_name, measures, group_by, filters, ["bucket"], MAX_BUCKETS + 1)
+    if result["status"] != "success":
+        raise Exception(f"{db_name}: {result['message']}")
+    if len(result["data"]) > MAX_BUCKETS:
+        raise Exception(f"{db_name}: quá {MAX_BUCKETS} nhóm thời gian, hãy chọn bucket lớn hơn hoặc thu hẹp start/end")
+    return result["data"]
+
+@mcp.tool()
+def timeseries(db_name: str, table_name: str, time_column: str, bucket: str = "month", measures: List[str] = None,
+               filters: List[Dict[str, Any]] = None, start: str = None, end: str = None, shards: List[str] = None,
+               points: int = None, downsample_by: str = None) -> str:
+    """
+    Chuỗi thời gian tổng hợp theo nhóm thời gian (ví dụ doanh thu theo tuần), tính ngay trên database.
+    Có thể gộp nhiều database cùng cấu trúc (ví dụ mỗi năm một file) và giảm số điểm để vẽ biểu đồ.
+    
+    Args:
+        db_name: Tên database (dùng khi không có shards)
+        table_name: Tên bảng
+        time_column: Cột ngày/giờ dùng để nhóm
+        bucket: Kích thước nhóm: day, week (bắt đầu từ thứ Hai), month, quarter, year (mặc định: month)
+        measures: Danh sách phép đo như tool aggregate (mặc định: ["count(*)"])
+        filters: Điều kiện lọc như tool aggregate
+        start: Chỉ lấy các dòng có time_column >= start (ví dụ "2021-01-01")
+        end: Chỉ lấy các dòng có time_column < end
+        shards: Danh sách database để gộp, hoặc khoảng tên như ["revenue_2020..revenue_2023"]
+        points: Số điểm tối đa trả về; nếu chuỗi dài hơn sẽ giảm điểm bằng LTTB (giữ hình dạng đường)
+        downsample_by: Phép đo (alias) dùng để giảm điểm (mặc định: phép đo đầu tiên)
+    
+    Returns:
+        series (bucket + các phép đo, sắp theo thời gian), số nhóm, số điểm trả về và downsampled;
+        "inexact" liệt kê các phép đo count_distinct bị cộng dồn khi nhiều shard có cùng nhóm
+    """
+    measures = measures or ["count(*)"]
+    try:
+        if bucket not in TIME_BUCKETS:
+            raise ValueError(f"Kích thước nhóm không hỗ trợ: {bucket}. Các giá trị hợp lệ: {', '.join(TIME_BUCKETS)}")
+        if points is not None and int(points) < 3:
+            raise ValueError("points phải lớn hơn hoặc bằng 3")
+        wait_for_discovery()
+        names = expand_shards(db_name, shards)
+        if len(names) > TIMESERIES_MAX_SHARDS:
+            raise ValueError(f"Tối đa {TIMESERIES_MAX_SHARDS} shard mỗi lần gọi.")
+        
+        query_measures, _ = plan_measures(measures)
+        conditions = list(filters or [])
+        if start is not None:
+            conditions.append({"column": time_column, "op": ">=", "value": start})
+        if end is not None:
+            conditions.append({"column": time_column, "op": "<", "value": end})
+        group_by = [f"{bucket}({time_column}) as bucket"]
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(names), BATCH_MAX_WORKERS)) as executor:
+            futures = [executor.submit(_timeseries_shard, name, table_name, query_measures, group_by, conditions)
+                       for name in names]
+            shard_results = [future.result() for future in futures]
+        
+        result = build_series(shard_results, measures, bucket, points, downsample_by)
+        return dumps(dict({"status": "success", "table": table_name, "time_column": time_column, "bucket": bucket,
+                           "shards": names}, **result))
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+@mcp.tool()
+def manage_summaries(action: str = "list", name: str = None, db_name: str = None, table_name: str = None,
+                     measures: List[str] = None, group_by: List[str] = None, filters: List[Dict[str, Any]] = None,
+                     full: bool = False) -> str:
+    """
+    Quản lý các bảng tổng hợp (materialized summary) dùng cho các truy vấn aggregate lặp lại nhiều lần.
+    Bảng tổng hợp được lưu trong cache phụ, tự làm mới tăng dần khi dữ liệu nguồn thay đổi, và truy vấn
+    aggregate khớp với nó (cùng bảng, nhóm con, phép đo sum/count/avg/min/max) được trả lời từ đây.
+    
+    Args:
+        action: Hành động (list, create, refresh, drop)
+        name: Tên bảng tổng hợp (cần cho create, refresh, drop)
+        db_name: Tên database (cần cho create; lọc danh sách với list)
+        table_name: Bảng nguồn (cần cho create)
+        measures: Phép đo cần lưu, ví dụ ["sum(total_price)", "count(*)", "avg(quantity)"] (cần cho create)
+        group_by: Các cột nhóm, hỗ trợ nhóm thời gian, ví dụ ["month(sale_date)", "product_id"]
+        filters: Điều kiện lọc cố định của bảng tổng hợp (cùng dạng với aggregate)
+        full: Với refresh, tính lại toàn bộ thay vì tăng dần
+    
+    Returns:
+        Danh sách bảng tổng hợp hoặc kết quả của hành động
+    """
+    valid_actions = ["list", "create", "refresh", "drop"]
+    if action not in valid_actions:
+        return f"[ERROR] Hành động không hợp lệ: {action}. Các hành động hợp lệ: {', '.join(valid_actions)}"
+    
+    try:
+        if action == "list":
+            summaries = summary_store.list(db_name)
+            if not summaries:
+                return "[INFO] Chưa có bảng tổng hợp nào."
+            return dumps(summaries)
+        
+        if not name:
+            return f"[ERROR] Cần cung cấp name cho hành động {action}"
+        
+        if action == "drop":
+            result = summary_store.drop(name)
+        elif action == "create":
+            if not db_name or not table_name:
+                return "[ERROR] Cần cung cấp db_name và table_name cho hành động create"
+            with DatabaseHelper.connect_to_database(db_name) as server:
+                result = summary_store.create(server, db_name, name, table_name, measures, group_by, filters)
+        else:
+            summary = summary_store.get(name)
+            if summary is None:
+                return f"[ERROR] Không tìm thấy bảng tổng hợp: {name}"
+            with DatabaseHelper.connect_to_database(summary["db_name"]) as server:
+                result = summary_store.refresh(server, name, full)
+        
+        if result["status"] != "success":
+            return f"[ERROR] {result['message']}"
+        return dumps(result)
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+@mcp.tool()
+def analyze(db_name: str, query: str, analyses: List[str] = None, columns: List[str] = None,
+            percentiles: List[float] = None, x_column: str = None, compare_with: List[str] = None,
+            key_column: str = None) -> str:
+    """
+    Chạy câu lệnh SELECT và tính thống kê trên các cột số của kết quả ngay tại server (NumPy),
+    thay vì lấy dữ liệu thô về rồi tự tính.
+    
+    Args:
+        db_name: Tên database
+        query: Câu lệnh SQL (chỉ cho phép SELECT)
+        analyses: Các phép phân tích (describe, correlation, trend, percentiles, yoy); mặc định ["describe"]
+        columns: Các cột số cần phân tích (mặc định: mọi cột số)
+        percentiles: Các phân vị 0-100 (cho describe, percentiles), mặc định [5, 25, 50, 75, 95]
+        x_column: Cột làm trục x cho trend (cột số hoặc ngày YYYY-MM-DD); mặc định là thứ tự dòng
+        compare_with: Các database khác chạy cùng câu lệnh để so sánh (cho yoy),
+                      ví dụ db_name="revenue_2020", compare_with=["revenue_2021"]
+        key_column: Cột khóa để so sánh yoy theo từng nhóm (ví dụ tháng, product_id)
+    
+    Returns:
+        Kết quả từng phép phân tích
+    """
+    analyses = analyses or ["describe"]
+    invalid = [name for name in analyses if name not in analysis.ANALYSES]
+    if invalid:
+        return f"[ERROR] Phép phân tích không hợp lệ: {', '.join(invalid)}. Các phép hợp lệ: {', '.join(analysis.ANALYSES)}"
+    if "yoy" in analyses and not compare_with:
+        return "[ERROR] Phép yoy cần tham số compare_with (danh sách database để so sánh)"
+    
+    if not DatabaseHelper.is_safe_query(query):
+        return "[ERROR] Chỉ cho phép câu lệnh SELECT để đảm bảo chế độ chỉ đọc"
+    
+    qs = tuple(percentiles) if percentiles else analysis.DEFAULT_PERCENTILES
+    try:
+        shards = []
+        for name in [db_name] + [name for name in (compare_with or []) if "yoy" in analyses]:
+            with DatabaseHelper.connect_to_database(name) as server:
+                fetched = server.fetch_columnar(query)
+            if fetched["status"] != "success":
+                return f"[ERROR] {name}: {fetched['message']}"
+            shards.append((name, fetched["data"]))
+        
+        data = shards[0][1]
+        result = {"status": "success", "rows": len(data), "columns": data.dtypes()}
+        for name in analyses:
+            if name == "describe":
+                result["describe"] = analysis.describe(data, columns, qs)
+            elif name == "percentiles":
+                result["percentiles"] = analysis.percentiles(data, columns, qs)
+            elif name == "correlation":
+                result["correlation"] = analysis.correlation(data, columns)
+            elif name == "trend":
+                result["trend"] = analysis.trend(data, columns, x_column)
+            elif name == "yoy":
+                result["yoy"] = analysis.year_over_year(shards, columns, key_column)
+        return dumps(result)
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+def import_data(db_name: str, file_path: str, table_name: str, format: str = None, if_exists: str = "append",
+                create: bool = True, batch_size: int = 50000, delimiter: str = ",") -> str:
+    """
+    [Quản trị] Nhập file CSV hoặc JSONL trên máy vào một bảng của database SQLite.
+    
+    Args:
+        db_name: Tên database SQLite
+        file_path: Đường dẫn file CSV (dòng đầu là tên cột) hoặc JSONL (mỗi dòng một object)
+        table_name: Bảng đích
+        format: csv hoặc jsonl (mặc định đoán theo phần mở rộng)
+        if_exists: append (thêm vào bảng có sẵn), replace (tạo lại bảng) hoặc fail
+        create: Tạo bảng nếu chưa có, kiểu cột được suy ra từ dữ liệu
+        batch_size: Số dòng mỗi lần executemany
+        delimiter: Ký tự phân cách cột của CSV
+    
+    Returns:
+        Số dòng đã nhập, thời gian và tốc độ
+    """
+    if format is not None and format not in IMPORT_FORMATS:
+        return f"[ERROR] Định dạng không hợp lệ: {format}. Các định dạng hợp lệ: {', '.join(IMPORT_FORMATS)}"
+    
+    wait_for_discovery()
+    config = available_databases.get(db_name)
+    if config is None:
+        return f"[ERROR] Không tìm thấy database: {db_name}"
+    if config["type"] != "sqlite":
+        return "[ERROR] Chỉ hỗ trợ nhập dữ liệu vào database SQLite"
+    
     try:
         with DatabaseHelper.connect_to_database(db_name) as server:
-            return server.execute_query(query)
+            result = import_file(server, file_path, table_name, format, if_exists, create,
+                                 batch_size=max(int(batch_size), 1), delimiter=delimiter)
+            if result["status"] != "success":
+                return f"[ERROR] {result['message']}"
+            return dumps(result)
     except Exception as e:
         return f"[ERROR] {str(e)}"
 
+if ADMIN_TOOLS:
+    mcp.tool()(import_data)
+
 @mcp.tool()
 def get_database_summary(db_name: str) -> str:
     """
@@ -226,11 +856,12 @@ def get_database_summary(db_name: str) -> str:
         Thông tin tổng quan về database
     """
     try:
+        # Dựng từ catalog đã cache (chỉ kiểm tra phiên bản dữ liệu), không đếm lại từng bảng
         with DatabaseHelper.connect_to_database(db_name) as server:
-            result = server.get_database_info()
-            if not result:
-                return f"[INFO] Không có thông tin nào về database {db_name}."
-            return result
+            catalog = catalog_cache.get(db_name, server)
+        if catalog["status"] != "success":
+            return f"[ERROR] {catalog['message']}"
+        return dumps({"status": "success", "info": database_summary(catalog)})
     except Exception as e:
         return f"[ERROR] {str(e)}"
 
@@ -239,10 +870,16 @@ def rescan_databases() -> str:
     """Quét lại tất cả các database có sẵn"""
     global available_databases
     
+    wait_for_discovery()
     old_count = len(available_databases)
     available_databases = discover_databases()
     new_count = len(available_databases)
     
+    # Catalog có thể đã đổi: bỏ catalog của database không còn (các database khác được kiểm tra theo phiên bản)
+    # và đóng kết nối rảnh
+    catalog_cache.retain(available_databases)
+    connection_pool.clear()
+    
     if new_count == 0:
         return "[INFO] Không tìm thấy database nào."
     elif new_count > old_count:
@@ -253,7 +890,8 @@ def rescan_databases() -> str:
         return f"[INFO] Không có thay đổi, vẫn có {new_count} database có sẵn."
 
 @mcp.tool()
-def add_mysql_database(name: str, host: str, user: str, password: str, database: str, port: int = 3306) -> str:
+def add_mysql_database(name: str, host: str, user: str, password: str, database: str, port: int = 3306,
+                       replicas: List[str] = None, max_replica_lag: int = None) -> str:
     """
     Thêm cấu hình MySQL database mới
     
@@ -264,12 +902,16 @@ def add_mysql_database(name: str, host: str, user: str, password: str, database:
         password: Mật khẩu
         database: Tên database
         port: Cổng kết nối (mặc định: 3306)
+        replicas: Các replica dạng "host" hoặc "host:port" (cùng user/password); truy vấn chỉ đọc sẽ đi tới replica
+        max_replica_lag: Độ trễ replication tối đa (giây) để một replica còn được dùng (mặc định 30)
     
     Returns:
         Kết quả của việc thêm cấu hình
     """
     global available_databases
     
+    wait_for_discovery()
+    
     # Kiểm tra xem tên đã tồn tại chưa
     if name in available_databases:
         return f"[ERROR] Database với tên '{name}' đã tồn tại."
@@ -293,20 +935,28 @@ def add_mysql_database(name: str, host: str, user: str, password: str, database:
         "database": database,
         "port": port
     }
+    if replicas:
+        available_databases[name]["replicas"] = [parse_endpoint(replica, port) for replica in replicas]
+        if max_replica_lag is not None:
+            available_databases[name]["max_replica_lag"] = max_replica_lag
     
     # Lưu vào file cấu hình
     try:
         configs = []
         for db_name, config in available_databases.items():
             if config["type"] == "mysql":
-                configs.append({
+                entry = {
                     "name": db_name,
                     "host": config["host"],
                     "user": config["user"],
                     "password": config["password"],
                     "database": config["database"],
                     "port": config["port"]
-                })
+                }
+                for key in ("replicas", "max_replica_lag"):
+                    if key in config:
+                        entry[key] = config[key]
+                configs.append(entry)
         
         with open("mysql_config.json", "w") as f:
             json.dump(configs, f, indent=2)
@@ -375,14 +1025,214 @@ class DatabaseChatClient:
             except Exception as e:
                 print(f"Lỗi: {str(e)}")
 
+def run_tools_in_threads(workers, max_pending=None):
+    """
+    Chạy các tool đồng bộ trong luồng worker (tối đa workers luồng cùng lúc) thay vì trực tiếp trên event loop,
+    để một lời gọi chậm không chặn các client khác khi phục vụ qua HTTP.
+    Khi số lời gọi đang chạy và đang chờ đạt max_pending, lời gọi mới bị từ chối ngay.
+    """
+    limiter = anyio.CapacityLimiter(workers)
+    pending = 0
+    
+    def threaded(fn):
+        @functools.wraps(fn)
+        async def run(**kwargs):
+            nonlocal pending
+            if max_pending and pending >= max_pending:
+                return f"[ERROR] Server đang quá tải ({pending} yêu cầu đang xử lý), vui lòng thử lại sau."
+            pending += 1
+            try:
+                return await anyio.to_thread.run_sync(functools.partial(fn, **kwargs), limiter=limiter)
+            finally:
+                pending -= 1
+        return run
+    
+    for tool in mcp._tool_manager.list_tools():
+        if not tool.is_async:
+            tool.fn = threaded(tool.fn)
+            tool.is_async = True
+
+def parse_args(argv=None):
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Database MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"],
+                        default=os.environ.get("MCP_TRANSPORT", "stdio"),
+                        help="stdio (mặc định, một client mỗi tiến trình) hoặc HTTP (nhiều client dùng chung một tiến trình)")
+    parser.add_argument("--host", default=os.environ.get("MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MCP_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Số luồng chạy tool đồng thời (mặc định 8 với HTTP, 0 = chạy trên event loop với stdio)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Số lời gọi tool đang chạy và chờ tối đa trước khi từ chối (mặc định 4 x workers)")
+    parser.add_argument("--max-connections", type=int, default=None,
+                        help="Số kết nối HTTP đồng thời tối đa, vượt quá trả về 503")
+    parser.add_argument("--max-sessions", type=int, default=None, help="Số phiên MCP HTTP tối đa")
+    parser.add_argument("--max-body-size", type=int, default=None, help="Kích thước body yêu cầu tối đa (byte)")
+    parser.add_argument("--stateless", action="store_true", help="Không giữ phiên MCP giữa các yêu cầu HTTP")
+    parser.add_argument("--processes", type=int, default=int(os.environ.get("MCP_PROCESSES", "0")),
+                        help="Số tiến trình worker của chế độ pre-fork (chỉ với streamable-http trên Linux/macOS; 0 = một tiến trình)")
+    return parser.parse_args(argv)
+
+def configure_http(args):
+    """Áp dụng các tùy chọn dòng lệnh vào cấu hình HTTP của FastMCP"""
+    from mcp.server.transport_security import TransportSecuritySettings
+    
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.settings.stateless_http = args.stateless
+    if args.max_sessions is not None:
+        mcp.settings.max_sessions = args.max_sessions
+    if args.max_body_size is not None:
+        mcp.settings.max_request_body_size = args.max_body_size
+    if args.host not in ("127.0.0.1", "localhost", "::1"):
+        # Bảo vệ DNS rebinding chỉ cho phép Host localhost; khi mở ra ngoài thì client gọi bằng địa chỉ khác
+        mcp.settings.transport_security = TransportSecuritySettings(enable_dns_rebinding_protection=False)
+
+def _uvicorn_config(args):
+    import uvicorn
+    
+    app = mcp.streamable_http_app() if args.transport == "streamable-http" else mcp.sse_app()
+    return uvicorn.Config(app, host=args.host, port=args.port, limit_concurrency=args.max_connections,
+                          log_level=mcp.settings.log_level.lower())
+
+def serve_http(args):
+    """Phục vụ MCP qua streamable HTTP hoặc SSE bằng uvicorn với các giới hạn yêu cầu đã cấu hình"""
+    import uvicorn
+    
+    configure_http(args)
+    uvicorn.Server(_uvicorn_config(args)).run()
+
+def snapshot_catalogs():
+    """Nạp catalog của mọi database vào catalog_cache (trước khi fork để các worker dùng chung bản chụp)"""
+    for name in list(available_databases):
+        try:
+            with DatabaseHelper.connect_to_database(name) as server:
+                catalog_cache.get(name, server)
+        except Exception as e:
+            print(f"[ERROR] Không lấy được catalog của {name}: {str(e)}", file=sys.stderr)
+
+def serve_prefork(args, processes):
+    """
+    Chế độ pre-fork: tiến trình chính mở socket, quét database và chụp catalog một lần, rồi fork processes worker
+    cùng nhận kết nối trên socket đó (hệ điều hành chia kết nối giữa các worker). Mỗi worker có event loop,
+    luồng worker và pool kết nối riêng nên việc serialize kết quả chạy song song trên nhiều nhân CPU;
+    danh sách database và catalog được kế thừa từ tiến trình chính (copy-on-write).
+    Phiên MCP không dùng chung được giữa các tiến trình nên HTTP chạy ở chế độ stateless.
+    Worker bị dừng bất thường được khởi động lại với thời gian chờ tăng dần; nếu worker liên tục bị dừng
+    (ví dụ lỗi cấu hình khi khởi động) thì dừng toàn bộ server với mã lỗi 1. rescan_databases/add_mysql_database chỉ cập nhật worker
+    nhận yêu cầu, các worker khác thấy thay đổi sau khi khởi động lại server.
+    """
+    import signal
+    import socket
+    import uvicorn
+    
+    args.stateless = True
+    configure_http(args)
+    
+    family = socket.AF_INET6 if ":" in args.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    
+    wait_for_discovery()
+    snapshot_catalogs()
+    # Kết nối mở trong tiến trình chính không được dùng chung với các worker
+    connection_pool.clear()
+    
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 1
+            try:
+                uvicorn.Server(_uvicorn_config(args)).run(sockets=[sock])
+                code = 0
+            finally:
+                os._exit(code)
+        return pid
+    
+    workers = {spawn() for _ in range(processes)}
+    print(f"=== Đã khởi động {processes} worker: {sorted(workers)} ===", file=sys.stderr)
+    
+    stopping = False
+    failed = False
+    restarts = []
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if stopping:
+            continue
+        
+        now = time.monotonic()
+        restarts = [started for started in restarts if now - started < PREFORK_RESTART_WINDOW]
+        code = os.waitstatus_to_exitcode(status)
+        if len(restarts) >= PREFORK_MAX_RESTARTS:
+            print(f"[ERROR] Worker {pid} đã dừng (mã {code}); worker bị dừng quá {PREFORK_MAX_RESTARTS} lần "
+                  f"trong {PREFORK_RESTART_WINDOW} giây, dừng server", file=sys.stderr)
+            failed = True
+            stop(None, None)
+            continue
+        delay = min(PREFORK_RESTART_DELAY * 2 ** len(restarts), PREFORK_MAX_RESTART_DELAY)
+        restarts.append(now)
+        print(f"[ERROR] Worker {pid} đã dừng (mã {code}), khởi động lại sau {delay} giây", file=sys.stderr)
+        # Chờ từng đoạn ngắn để vẫn dừng ngay khi nhận tín hiệu
+        deadline = now + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if not stopping:
+            workers.add(spawn())
+    sock.close()
+    if failed:
+        sys.exit(1)
+
 if __name__ == "__main__":
-    print("=== Đang quét database có sẵn... ===")
-    available_databases = discover_databases()
-    print(f"=== Đã phát hiện {len(available_databases)} database ===")
+    args = parse_args()
     
-    print("=== Khởi động FastMCP Server ===")
-    mcp.run(transport="stdio")
+    # Quét database trong nền để server trả lời initialize ngay;
+    # các tool sẽ chờ lần quét đầu tiên hoàn tất trước khi dùng danh sách database.
+    # Log ghi ra stderr vì stdout là kênh giao thức của transport stdio.
+    print("=== Đang quét database có sẵn (chạy nền)... ===", file=sys.stderr)
+    start_discovery()
+    
+    workers = args.workers if args.workers is not None else (0 if args.transport == "stdio" else 8)
+    if workers > 0:
+        run_tools_in_threads(workers, args.max_pending if args.max_pending is not None else workers * 4)
+    
+    if args.transport == "stdio":
+        print("=== Khởi động FastMCP Server ===", file=sys.stderr)
+        mcp.run(transport="stdio")
+    elif args.processes > 0:
+        if args.transport != "streamable-http" or not hasattr(os, "fork"):
+            print("[ERROR] Chế độ pre-fork (--processes) cần --transport streamable-http và hệ điều hành hỗ trợ fork", file=sys.stderr)
+            sys.exit(2)
+        print(f"=== Khởi động FastMCP Server (pre-fork, {args.processes} tiến trình) tại http://{args.host}:{args.port}, "
+              f"{workers} luồng worker mỗi tiến trình ===", file=sys.stderr)
+        serve_prefork(args, args.processes)
+    else:
+        print(f"=== Khởi động FastMCP Server ({args.transport}) tại http://{args.host}:{args.port}, "
+              f"{workers} luồng worker ===", file=sys.stderr)
+        serve_http(args)
     
     # Nếu muốn chạy giao diện chat thay vì FastMCP
     # client = DatabaseChatClient()
-    # client.start()
\ No newline at end of file
+    # client.start()
@@ -0,0 +1,209 @@
+import decimal
+import math
+import random
+import threading
+from collections import OrderedDict
+
+# Bảng tra 2^-r để tính ước lượng HyperLogLog nhanh hơn
+_POW2_NEG = [2.0 ** -r for r in range(65)]
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+def _hash64(value):
+    """
+    Băm giá trị thành số 64 bit phân bố đều: dùng hash() của Python (1, 1.0 và Decimal(1) cho cùng kết quả)
+    rồi trộn bit bằng bước kết thúc của splitmix64, vì hash() của số nguyên chính là giá trị của nó.
+    """
+    h = hash(value) & _MASK64
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return h ^ (h >> 31)
+
+class HyperLogLog:
+    """Sketch HyperLogLog ước lượng số giá trị phân biệt với bộ nhớ cố định (2^p byte)"""
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & _MASK64
+        rank = min(64 - rest.bit_length() + 1, 64 - self.p + 1)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Gộp sketch khác (cùng p) vào sketch này"""
+        if other.p != self.p:
+            raise ValueError("Không thể gộp HyperLogLog khác độ chính xác")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(_POW2_NEG[r] for r in self.registers)
+        if estimate <= 2.5 * m:
+            # Hiệu chỉnh cho tập nhỏ (linear counting)
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class FrequentValues:
+    """
+    Đếm các giá trị xuất hiện nhiều nhất. Đếm chính xác khi số giá trị phân biệt không vượt quá capacity;
+    vượt quá thì cắt tỉa theo Misra-Gries (trừ đều bộ đếm) để bộ nhớ luôn giới hạn khi quét bảng lớn.
+    """
+    __slots__ = ("capacity", "counts", "exact")
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = {}
+        self.exact = True
+
+    def add(self, value):
+        counts = self.counts
+        counts[value] = counts.get(value, 0) + 1
+        if len(counts) > self.capacity:
+            # Trừ mỗi bộ đếm một lượng bằng trung vị để loại bỏ ít nhất một nửa số giá trị hiếm
+            threshold = sorted(counts.values())[len(counts) // 2]
+            self.counts = {key: count - threshold for key, count in counts.items() if count > threshold}
+            self.exact = False
+
+    def top(self, k):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:k]
+
+def _is_numeric(value):
+    return isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool)
+
+def _histogram(values, bins):
+    """Histogram độ rộng đều cho các giá trị số"""
+    low = min(values)
+    high = max(values)
+    if low == high:
+        return {"edges": [low, high], "counts": [len(values)]}
+    width = (high - low) / bins
+    counts = [0] * bins
+    for value in values:
+        index = int((value - low) / width)
+        counts[min(index, bins - 1)] += 1
+    edges = [round(low + width * i, 6) for i in range(bins)] + [high]
+    return {"edges": edges, "counts": counts}
+
+class ColumnProfiler:
+    """Tích lũy thống kê của một cột theo dạng luồng với bộ nhớ giới hạn"""
+
+    def __init__(self, name, declared_type=None, top_k=5, reservoir_size=5000):
+        self.name = name
+        self.declared_type = declared_type
+        self.top_k = top_k
+        self.rows = 0
+        self.nulls = 0
+        self.minimum = None
+        self.maximum = None
+        self.distinct = HyperLogLog()
+        self.frequent = FrequentValues()
+        self.numeric = 0
+        self.reservoir = []
+        self.reservoir_size = reservoir_size
+        self._random = random.Random(0)
+
+    def _update_range(self, value):
+        if self.minimum is None:
+            self.minimum = self.maximum = value
+            return
+        try:
+            if value < self.minimum:
+                self.minimum = value
+            elif value > self.maximum:
+                self.maximum = value
+        except TypeError:
+            # SQLite cho phép trộn kiểu trong một cột: so sánh theo chuỗi
+            if str(value) < str(self.minimum):
+                self.minimum = value
+            elif str(value) > str(self.maximum):
+                self.maximum = value
+
+    def add(self, value):
+        self.rows += 1
+        if value is None:
+            self.nulls += 1
+            return
+        if isinstance(value, (bytearray, memoryview)):
+            value = bytes(value)
+        self._update_range(value)
+        self.distinct.add(value)
+        self.frequent.add(value)
+        if _is_numeric(value):
+            # Reservoir sampling để giới hạn bộ nhớ cho histogram
+            self.numeric += 1
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir.append(float(value))
+            else:
+                slot = self._random.randrange(self.numeric)
+                if slot < self.reservoir_size:
+                    self.reservoir[slot] = float(value)
+
+    def result(self, bins=10):
+        non_null = self.rows - self.nulls
+        profile = {
+            "name": self.name,
+            "type": self.declared_type,
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "null_ratio": round(self.nulls / self.rows, 4) if self.rows else 0.0,
+            "min": self.minimum,
+            "max": self.maximum,
+            "approx_distinct": min(self.distinct.count(), non_null),
+            "top_values": [[value, count] for value, count in self.frequent.top(self.top_k)],
+            "top_values_exact": self.frequent.exact,
+        }
+        # Chỉ lập histogram khi phần lớn giá trị là số
+        if self.reservoir and self.numeric >= non_null * 0.9 and bins > 0:
+            profile["histogram"] = _histogram(self.reservoir, bins)
+        return profile
+
+def profile_rows(columns, rows, declared_types=None, top_k=5, bins=10):
+    """
+    Tính thống kê cho từng cột từ các dòng (list/iterator các tuple).
+
+    Returns:
+        (số dòng đã duyệt, danh sách thống kê từng cột)
+    """
+    declared_types = declared_types or {}
+    profilers = [ColumnProfiler(name, declared_types.get(name), top_k) for name in columns]
+    count = 0
+    for row in rows:
+        count += 1
+        for profiler, value in zip(profilers, row):
+            profiler.add(value)
+    return count, [profiler.result(bins) for profiler in profilers]
+
+class ProfileCache:
+    """Cache kết quả profile theo (database, bảng, phiên bản dữ liệu, tham số), giới hạn số mục (LRU)"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# Cache dùng chung trong process
+profile_cache = ProfileCache()
@@ -0,0 +1,168 @@
+import random
+import sys
+import threading
+import time
+
+# Độ trễ replica tối đa (giây) mặc định; replica trễ hơn bị bỏ qua cho tới lần kiểm tra sau
+DEFAULT_MAX_LAG = 30
+
+# Khoảng thời gian (giây) giữa hai lần đo độ trễ replication của cùng một replica
+LAG_CHECK_INTERVAL = 10
+
+# Thời gian (giây) loại một replica sau lỗi kết nối: tăng gấp đôi sau mỗi lần lỗi liên tiếp, tối đa MAX_BACKOFF
+BASE_BACKOFF = 2
+MAX_BACKOFF = 60
+
+# Hệ số làm mượt độ trễ kết nối (EWMA) và mức chênh cho phép khi chọn ngẫu nhiên giữa các replica nhanh
+LATENCY_ALPHA = 0.3
+LATENCY_SLACK = 1.5
+
+def parse_endpoint(value, default_port=3306):
+    """Chuẩn hóa một replica: "host", "host:port" hoặc dict {"host", "port", "user", "password"}"""
+    if isinstance(value, dict):
+        endpoint = dict(value)
+        endpoint["port"] = int(endpoint.get("port", default_port))
+        return endpoint
+    host, _, port = str(value).strip().rpartition(":")
+    if not host:
+        return {"host": str(value).strip(), "port": default_port}
+    return {"host": host, "port": int(port)}
+
+class _EndpointState:
+    __slots__ = ("latency", "failures", "down_until", "lag", "lag_checked_at")
+
+    def __init__(self):
+        self.latency = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.lag = None
+        self.lag_checked_at = 0.0
+
+class ReplicaRouter:
+    """
+    Chọn kết nối MySQL cho lưu lượng chỉ đọc: ưu tiên các replica khỏe, có độ trễ replication trong ngưỡng,
+    theo độ trễ kết nối đo được (EWMA); replica lỗi bị loại tạm thời (backoff) và lời gọi chuyển sang replica
+    kế tiếp, cuối cùng là primary.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, endpoint):
+        key = (endpoint["host"], endpoint["port"])
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _EndpointState()
+            return state
+
+    def candidates(self, config):
+        """Thứ tự thử kết nối: các replica dùng được (nhanh trước) rồi tới primary"""
+        now = self.clock()
+        max_lag = config.get("max_replica_lag", DEFAULT_MAX_LAG)
+        replicas = []
+        for endpoint in config.get("replicas") or ():
+            state = self._state(endpoint)
+            if state.down_until > now:
+                continue
+            if state.lag is not None and state.lag > max_lag and now - state.lag_checked_at < LAG_CHECK_INTERVAL:
+                continue
+            replicas.append((state.latency or 0.0, endpoint))
+        replicas.sort(key=lambda item: item[0])
+
+        # Chia tải giữa các replica có độ trễ gần với replica nhanh nhất
+        if len(replicas) > 1:
+            best = replicas[0][0]
+            close = [item for item in replicas if item[0] <= best * LATENCY_SLACK + 0.001]
+            first = random.choice(close)
+            replicas.remove(first)
+            replicas.insert(0, first)
+
+        primary = {"host": config["host"], "port": config["port"], "primary": True}
+        return [endpoint for _, endpoint in replicas] + [primary]
+
+    def record_success(self, endpoint, latency):
+        state = self._state(endpoint)
+        state.failures = 0
+        state.down_until = 0.0
+        state.latency = latency if state.latency is None else LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * state.latency
+
+    def record_failure(self, endpoint, message=None):
+        state = self._state(endpoint)
+        state.failures += 1
+        backoff = min(BASE_BACKOFF * 2 ** (state.failures - 1), MAX_BACKOFF)
+        state.down_until = self.clock() + backoff
+        print(f"[REPLICA] {endpoint['host']}:{endpoint['port']} lỗi, tạm bỏ qua {backoff} giây: {message}", file=sys.stderr)
+
+    def lag_ok(self, endpoint, server, max_lag):
+        """Kiểm tra (tối đa mỗi LAG_CHECK_INTERVAL giây) độ trễ replication của replica vừa kết nối"""
+        state = self._state(endpoint)
+        now = self.clock()
+        if now - state.lag_checked_at >= LAG_CHECK_INTERVAL:
+            state.lag = server.get_replication_lag()
+            state.lag_checked_at = now
+        if state.lag is not None and state.lag > max_lag:
+            print(f"[REPLICA] {endpoint['host']}:{endpoint['port']} trễ {state.lag} giây (ngưỡng {max_lag}), bỏ qua",
+                  file=sys.stderr)
+            return False
+        return True
+
+    def connect(self, config, connect, acquire=None):
+        """
+        Kết nối tới endpoint tốt nhất. connect(endpoint) trả về (server, result) như DatabaseServer.connect_mysql.
+        acquire(endpoint) (tùy chọn) trả về kết nối rảnh có sẵn tới một replica hoặc None; kết nối này cũng phải
+        qua kiểm tra độ trễ replication như kết nối mới, và chỉ được dùng khi replica đó đang được chọn.
+
+        Returns:
+            (server, endpoint) của kết nối thành công
+
+        Raises:
+            Exception nếu không endpoint nào kết nối được
+        """
+        max_lag = config.get("max_replica_lag", DEFAULT_MAX_LAG)
+        errors = []
+        for endpoint in self.candidates(config):
+            pooled = acquire(endpoint) if acquire is not None and not endpoint.get("primary") else None
+            if pooled is not None:
+                if self.lag_ok(endpoint, pooled, max_lag):
+                    return pooled, endpoint
+                pooled.disconnect()
+                errors.append(f"{endpoint['host']}:{endpoint['port']}: trễ replication vượt {max_lag} giây")
+                continue
+            started = self.clock()
+            server, result = connect(endpoint)
+            if result.get("status") != "success":
+                server.disconnect()
+                errors.append(f"{endpoint['host']}:{endpoint['port']}: {result.get('message')}")
+                if not endpoint.get("primary"):
+                    self.record_failure(endpoint, result.get("message"))
+                continue
+            if endpoint.get("primary"):
+                return server, endpoint
+            if not self.lag_ok(endpoint, server, max_lag):
+                server.disconnect()
+                errors.append(f"{endpoint['host']}:{endpoint['port']}: trễ replication vượt {max_lag} giây")
+                continue
+            self.record_success(endpoint, self.clock() - started)
+            return server, endpoint
+        raise Exception("Không thể kết nối đến database: " + "; ".join(errors))
+
+    def stats(self, config):
+        """Trạng thái các replica của một database (để hiển thị)"""
+        now = self.clock()
+        result = []
+        for endpoint in config.get("replicas") or ():
+            state = self._state(endpoint)
+            result.append({
+                "host": endpoint["host"],
+                "port": endpoint["port"],
+                "healthy": state.down_until <= now,
+                "latency_ms": round(state.latency * 1000, 2) if state.latency is not None else None,
+                "lag_seconds": state.lag,
+            })
+        return result
+
+# Router dùng chung trong process
+replica_router = ReplicaRouter()
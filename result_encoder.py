@@ -0,0 +1,78 @@
+import base64
+import datetime
+import decimal
+import json
+import sqlite3
+
+from result_set import ResultSet
+
+# orjson là tùy chọn: nếu có sẽ dùng làm đường serialize nhanh
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _format_timedelta(value):
+    """Định dạng timedelta (kiểu TIME của MySQL) thành [-]HH:MM:SS[.ffffff]"""
+    total_us = (value.days * 86400 + value.seconds) * 1_000_000 + value.microseconds
+    sign = "-" if total_us < 0 else ""
+    seconds, micro = divmod(abs(total_us), 1_000_000)
+    minutes, sec = divmod(seconds, 60)
+    hours, minute = divmod(minutes, 60)
+    text = f"{sign}{hours:02d}:{minute:02d}:{sec:02d}"
+    if micro:
+        text += f".{micro:06d}"
+    return text
+
+def encode_value(value):
+    """
+    Chuyển các kiểu dữ liệu driver trả về mà JSON không hỗ trợ sẵn.
+    Được dùng làm hook `default` nên chỉ bị gọi cho các giá trị không phải kiểu JSON cơ bản.
+    """
+    if isinstance(value, ResultSet):
+        return value.to_payload()
+    if isinstance(value, decimal.Decimal):
+        # DECIMAL nguyên giữ nguyên là int, còn lại dùng chuỗi để không mất độ chính xác (ví dụ tiền tệ)
+        if value == value.to_integral_value():
+            return int(value)
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return _format_timedelta(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+        try:
+            return raw.decode("utf-8")
+        except UnicodeDecodeError:
+            return "base64:" + base64.b64encode(raw).decode("ascii")
+    if hasattr(value, "to_payload"):
+        # Các dạng kết quả khác (ví dụ ColumnarResult)
+        return value.to_payload()
+    if hasattr(value, "tolist"):
+        # Số và mảng NumPy
+        return value.tolist()
+    if isinstance(value, sqlite3.Row):
+        return tuple(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(obj, indent=None):
+    """Serialize đối tượng thành chuỗi JSON, hỗ trợ các kiểu kết quả của MySQL/SQLite"""
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=encode_value, option=option).decode("utf-8")
+        except TypeError:
+            # Ví dụ số nguyên vượt 64 bit: quay về bộ mã hóa chuẩn
+            pass
+    return json.dumps(obj, default=encode_value, ensure_ascii=False, indent=indent)
+
+def loads(text):
+    """Đọc chuỗi JSON (dùng orjson nếu có)"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
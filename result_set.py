@@ -0,0 +1,59 @@
+class ResultSet:
+    """
+    Kết quả truy vấn dạng gọn: một danh sách tên cột dùng chung và các dòng dạng tuple.
+
+    Đối tượng được truyền nguyên vẹn từ DatabaseServer qua tầng tool và chỉ được
+    serialize một lần ở biên MCP (xem result_encoder).
+    """
+    __slots__ = ("columns", "rows", "total", "limited", "truncated", "next_offset")
+
+    def __init__(self, columns, rows, total=None, limited=False, truncated=None, next_offset=None):
+        self.columns = tuple(columns)
+        self.rows = rows
+        self.total = total
+        self.limited = limited
+        # truncated: None nếu truy vấn không bị giới hạn số dòng; True nếu còn dòng sau next_offset
+        self.truncated = truncated
+        self.next_offset = next_offset
+
+    @classmethod
+    def from_cursor(cls, cursor, **kwargs):
+        """Tạo ResultSet từ cursor vừa thực thi (đọc toàn bộ kết quả)"""
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        rows = cursor.fetchall() if cursor.description else []
+        return cls(columns, rows, **kwargs)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __repr__(self):
+        return f"ResultSet(columns={list(self.columns)}, rows={len(self.rows)})"
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    def column(self, name):
+        """Lấy toàn bộ giá trị của một cột theo tên"""
+        index = self.columns.index(name)
+        return [row[index] for row in self.rows]
+
+    def to_dicts(self):
+        """Chuyển sang danh sách dictionary (chỉ dùng khi thực sự cần)"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+    def to_payload(self):
+        """Dạng dữ liệu để serialize: {"columns": [...], "rows": [[...]], "count": n, ...}"""
+        payload = {"columns": self.columns, "rows": self.rows, "count": len(self.rows)}
+        if self.total is not None:
+            payload["total"] = self.total
+            payload["limited"] = self.limited
+        if self.truncated is not None:
+            payload["truncated"] = self.truncated
+            if self.truncated:
+                payload["next_offset"] = self.next_offset
+        return payload
@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from columnar import text_value
+from result_set import ResultSet
+from summaries import CACHE_DIR
+
+# Thư mục chứa kết quả truy vấn được ghi tạm ra đĩa
+SPILL_DIR = os.path.join(CACHE_DIR, "results")
+
+# Thời gian sống (giây) của một kết quả, tổng dung lượng tối đa (byte) và số dòng tối đa của một kết quả
+DEFAULT_TTL = int(os.environ.get("MCP_SPILL_TTL", "900"))
+DEFAULT_QUOTA = int(os.environ.get("MCP_SPILL_QUOTA_MB", "512")) * 1024 * 1024
+DEFAULT_MAX_ROWS = int(os.environ.get("MCP_SPILL_MAX_ROWS", "1000000"))
+
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def _storable(rows):
+    """Đổi các giá trị SQLite không lưu được (DECIMAL, ngày giờ của MySQL...) sang chuỗi"""
+    return [tuple(value if value is None or isinstance(value, (int, float, str, bytes)) else text_value(value)
+                  for value in row) for row in rows]
+
+class SpillStore:
+    """
+    Lưu toàn bộ kết quả truy vấn lớn vào file SQLite tạm (mỗi kết quả một file) để lấy từng trang sau đó
+    mà không phải chạy lại truy vấn. Mỗi kết quả có handle; file hết hạn sau ttl giây và tổng dung lượng
+    các file không vượt quá quota (file cũ nhất bị xóa trước). File đang được ghi không bị xóa và
+    dung lượng của nó được tính vào quota trong suốt lúc ghi.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_TTL, quota_bytes=DEFAULT_QUOTA, max_rows=DEFAULT_MAX_ROWS):
+        self.directory = directory or SPILL_DIR
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        # Các file đang được ghi: đường dẫn -> số byte đã ghi
+        self._writing = {}
+
+    def _path(self, handle):
+        if not _HANDLE_PATTERN.match(str(handle)):
+            raise ValueError(f"Handle không hợp lệ: {handle}")
+        return os.path.join(self.directory, f"{handle}.db")
+
+    def _files(self):
+        """Các file kết quả: danh sách (thời điểm sửa, kích thước, đường dẫn), cũ nhất trước"""
+        files = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return files
+        for name in names:
+            if not name.endswith(".db"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        return files
+
+    def cleanup(self, reserve=0):
+        """
+        Xóa file hết hạn, rồi xóa file cũ nhất cho tới khi tổng dung lượng + reserve không vượt quota.
+        Trả về tổng dung lượng còn lại (kể cả các file đang ghi).
+        """
+        with self._lock:
+            return self._cleanup(reserve)
+
+    def _cleanup(self, reserve=0):
+        now = time.time()
+        files = []
+        for mtime, size, path in self._files():
+            if path in self._writing:
+                continue
+            if now - mtime > self.ttl:
+                self._remove(path)
+            else:
+                files.append((mtime, size, path))
+        total = sum(size for _, size, _ in files) + sum(self._writing.values())
+        for _, size, path in files:
+            if total + reserve <= self.quota_bytes:
+                break
+            self._remove(path)
+            total -= size
+        return total
+
+    def _usage(self, path):
+        """Cập nhật dung lượng đã ghi của file đang ghi và trả về tổng dung lượng của kho"""
+        with self._lock:
+            self._writing[path] = os.path.getsize(path)
+            return self._cleanup()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def spill(self, batches, page_size=1000, info=None):
+        """
+        Ghi các lô (tên cột, dòng) vào một file kết quả mới. Việc đọc dừng ngay khi đủ max_rows dòng hoặc gặp lỗi;
+        bên gọi đóng iterator batches để giải phóng kết quả chưa đọc.
+
+        Returns:
+            {"status", "handle", "columns", "rows", "page_size", "pages", "bytes", "expires_in", "complete"}
+            complete = False nếu kết quả bị cắt ở max_rows dòng
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        handle = uuid.uuid4().hex
+        path = self._path(handle)
+        with self._lock:
+            self._writing[path] = 0
+            self._cleanup()
+        connection = sqlite3.connect(path)
+        columns = []
+        total = 0
+        complete = True
+        try:
+            connection.execute("PRAGMA journal_mode=OFF")
+            connection.execute("PRAGMA synchronous=OFF")
+            insert = None
+            for columns, rows in batches:
+                if insert is None:
+                    names = ", ".join(f"c{index}" for index in range(len(columns)))
+                    connection.execute(f"CREATE TABLE result ({names})")
+                    insert = f"INSERT INTO result VALUES ({', '.join('?' for _ in columns)})"
+                if total + len(rows) > self.max_rows:
+                    rows = rows[:self.max_rows - total]
+                    complete = False
+                try:
+                    connection.executemany(insert, rows)
+                except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+                    connection.executemany(insert, _storable(rows))
+                total += len(rows)
+                if self._usage(path) > self.quota_bytes:
+                    raise ValueError(f"Kết quả vượt quá dung lượng lưu tạm cho phép ({self.quota_bytes // (1024 * 1024)} MB)")
+                if not complete:
+                    break
+            meta = {"columns": list(columns), "rows": total, "page_size": page_size, "complete": complete, "info": info or {}}
+            connection.execute("CREATE TABLE meta (value TEXT)")
+            connection.execute("INSERT INTO meta VALUES (?)", (json.dumps(meta, ensure_ascii=False, default=str),))
+            connection.commit()
+        except Exception as e:
+            connection.close()
+            self._remove(path)
+            return {"status": "error", "message": f"Lỗi khi lưu kết quả tạm: {str(e)}"}
+        finally:
+            with self._lock:
+                self._writing.pop(path, None)
+        connection.close()
+        return {
+            "status": "success",
+            "handle": handle,
+            "columns": list(columns),
+            "rows": total,
+            "page_size": page_size,
+            "pages": max(1, -(-total // page_size)),
+            "bytes": os.path.getsize(path),
+            "expires_in": self.ttl,
+            "complete": complete,
+        }
+
+    def page(self, handle, page=1, page_size=None):
+        """
+        Đọc một trang (đánh số từ 1) của kết quả đã lưu; mỗi lần đọc gia hạn thời gian sống của kết quả.
+        page_size mặc định là kích thước trang khi lưu.
+
+        Returns:
+            {"status", "handle", "page", "pages", "page_size", "rows", "data": ResultSet, "has_more"}
+        """
+        try:
+            path = self._path(handle)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) > self.ttl:
+            return {"status": "error", "message": f"Không tìm thấy kết quả {handle} (đã hết hạn hoặc bị xóa), hãy chạy lại truy vấn"}
+        page = max(int(page), 1)
+
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            meta = json.loads(connection.execute("SELECT value FROM meta").fetchone()[0])
+            page_size = max(int(page_size or meta["page_size"]), 1)
+            start = (page - 1) * page_size
+            # rowid tăng liên tục từ 1 theo thứ tự ghi nên đọc theo khoảng rowid thay vì OFFSET
+            rows = connection.execute("SELECT * FROM result WHERE rowid > ? AND rowid <= ? ORDER BY rowid",
+                                      (start, start + page_size)).fetchall()
+        except sqlite3.Error as e:
+            return {"status": "error", "message": f"Lỗi khi đọc kết quả {handle}: {str(e)}"}
+        finally:
+            connection.close()
+        os.utime(path)
+
+        pages = max(1, -(-meta["rows"] // page_size))
+        return {
+            "status": "success",
+            "handle": handle,
+            "page": page,
+            "pages": pages,
+            "page_size": page_size,
+            "rows": meta["rows"],
+            "complete": meta["complete"],
+            "has_more": page < pages,
+            "data": ResultSet(meta["columns"], rows),
+        }
+
+    def drop(self, handle):
+        try:
+            self._remove(self._path(handle))
+        except ValueError:
+            pass
+
+# Kho kết quả tạm dùng chung trong process
+spill_store = SpillStore()
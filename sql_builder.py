@@ -0,0 +1,216 @@
+import re
+from collections import namedtuple
+
+# Các hàm tổng hợp được hỗ trợ và mẫu SQL tương ứng
+AGGREGATE_FUNCTIONS = {
+    "sum": "SUM({})",
+    "avg": "AVG({})",
+    "min": "MIN({})",
+    "max": "MAX({})",
+    "count": "COUNT({})",
+    "count_distinct": "COUNT(DISTINCT {})",
+}
+
+# Các toán tử lọc được hỗ trợ
+COMPARISON_OPERATORS = {"=", "!=", "<>", "<", "<=", ">", ">="}
+FILTER_OPERATORS = COMPARISON_OPERATORS | {"like", "not like", "in", "not in", "between", "is null", "is not null"}
+
+# Các hàm nhóm theo thời gian dùng trong group_by (ví dụ "month(sale_date)") và biểu thức SQL theo dialect.
+# MySQL dùng LEFT(CAST(...)) thay cho DATE_FORMAT để câu lệnh không chứa ký tự % lẫn với tham số %s
+# Nhãn nhóm: day "YYYY-MM-DD", week "YYYY-MM-DD" (ngày thứ Hai đầu tuần), month "YYYY-MM", quarter "YYYY-Qn", year "YYYY"
+TIME_BUCKETS = {
+    "day": {"SQLite": "strftime('%Y-%m-%d', {})", "MySQL": "LEFT(CAST({} AS CHAR), 10)"},
+    "week": {"SQLite": "date({0}, 'weekday 0', '-6 days')",
+             "MySQL": "CAST(DATE_SUB(DATE({0}), INTERVAL WEEKDAY({0}) DAY) AS CHAR)"},
+    "month": {"SQLite": "strftime('%Y-%m', {})", "MySQL": "LEFT(CAST({} AS CHAR), 7)"},
+    "quarter": {"SQLite": "strftime('%Y', {0}) || '-Q' || ((CAST(strftime('%m', {0}) AS INTEGER) + 2) / 3)",
+                "MySQL": "CONCAT(YEAR({0}), '-Q', QUARTER({0}))"},
+    "year": {"SQLite": "strftime('%Y', {})", "MySQL": "LEFT(CAST({} AS CHAR), 4)"},
+}
+
+Measure = namedtuple("Measure", ["func", "column", "alias"])
+Dimension = namedtuple("Dimension", ["bucket", "column", "alias"])
+
+_MEASURE_PATTERN = re.compile(r"^\s*(\w+)\s*\(\s*(\*|[^()]+?)\s*\)\s*(?:as\s+(\w+))?\s*$", re.IGNORECASE)
+_DIMENSION_PATTERN = re.compile(r"^\s*(\w+)\s*\(\s*([^()]+?)\s*\)\s*(?:as\s+(\w+))?\s*$", re.IGNORECASE)
+
+def quote_identifier(name, dialect):
+    """Đặt tên cột/bảng trong dấu trích dẫn theo dialect (SQLite: "x", MySQL: `x`)"""
+    if dialect == "MySQL":
+        return "`" + name.replace("`", "``") + "`"
+    return '"' + name.replace('"', '""') + '"'
+
+def placeholder(dialect):
+    """Ký hiệu tham số của driver (sqlite3: ?, mysql.connector: %s)"""
+    return "%s" if dialect == "MySQL" else "?"
+
+def parse_measure(spec):
+    """
+    Phân tích một phép đo.
+
+    Chấp nhận chuỗi dạng "sum(total_price)", "count(*)", "count_distinct(customer_id) as buyers"
+    hoặc dictionary {"func": "sum", "column": "total_price", "alias": "revenue"}.
+    """
+    if isinstance(spec, dict):
+        func = str(spec.get("func", "")).lower()
+        column = spec.get("column", "*")
+        alias = spec.get("alias")
+    else:
+        match = _MEASURE_PATTERN.match(str(spec))
+        if not match:
+            raise ValueError(f"Phép đo không hợp lệ: {spec}. Ví dụ hợp lệ: sum(total_price), count(*)")
+        func, column, alias = match.group(1).lower(), match.group(2), match.group(3)
+
+    if func not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f"Hàm tổng hợp không hỗ trợ: {func}. Các hàm hợp lệ: {', '.join(AGGREGATE_FUNCTIONS)}")
+    if column == "*" and func != "count":
+        raise ValueError(f"Chỉ count mới dùng được với '*': {spec}")
+    if not alias:
+        alias = "count" if column == "*" else f"{func}_{column}"
+    return Measure(func, column, alias)
+
+def resolve_column(name, columns):
+    """Tìm tên cột thật trong bảng (không phân biệt hoa thường), báo lỗi nếu không tồn tại"""
+    if columns is None:
+        return name
+    lookup = {column.lower(): column for column in columns}
+    resolved = lookup.get(str(name).lower())
+    if resolved is None:
+        raise ValueError(f"Không tìm thấy cột: {name}. Các cột hợp lệ: {', '.join(columns)}")
+    return resolved
+
+def parse_dimension(spec, columns=None):
+    """
+    Phân tích một cột nhóm: tên cột ("product_id") hoặc hàm thời gian trên một cột
+    ("month(sale_date)", "year(sale_date) as nam"). Tên mặc định của nhóm thời gian là "<hàm>_<cột>".
+    """
+    match = _DIMENSION_PATTERN.match(str(spec))
+    if not match:
+        column = resolve_column(spec, columns)
+        return Dimension(None, column, column)
+    
+    bucket = match.group(1).lower()
+    if bucket not in TIME_BUCKETS:
+        raise ValueError(f"Hàm nhóm thời gian không hỗ trợ: {bucket}. Các hàm hợp lệ: {', '.join(TIME_BUCKETS)}")
+    column = resolve_column(match.group(2), columns)
+    return Dimension(bucket, column, match.group(3) or f"{bucket}_{column}")
+
+def compile_dimension(dimension, dialect):
+    """Biên dịch một cột nhóm thành biểu thức SQL (chưa có alias)"""
+    column = quote_identifier(dimension.column, dialect)
+    if dimension.bucket is None:
+        return column
+    return TIME_BUCKETS[dimension.bucket][dialect].format(column)
+
+def compile_filters(filters, dialect, columns=None):
+    """
+    Biên dịch danh sách điều kiện lọc thành (mệnh đề WHERE, tham số).
+
+    Mỗi điều kiện là dictionary {"column": ..., "op": ..., "value": ...}; các điều kiện được nối bằng AND.
+    """
+    if not filters:
+        return "", []
+
+    mark = placeholder(dialect)
+    clauses = []
+    params = []
+    for condition in filters:
+        if not isinstance(condition, dict) or "column" not in condition:
+            raise ValueError(f"Điều kiện lọc không hợp lệ: {condition}. Dạng hợp lệ: {{\"column\": ..., \"op\": ..., \"value\": ...}}")
+        column = quote_identifier(resolve_column(condition["column"], columns), dialect)
+        op = str(condition.get("op", "=")).lower().strip()
+        value = condition.get("value")
+
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Toán tử lọc không hỗ trợ: {op}. Các toán tử hợp lệ: {', '.join(sorted(FILTER_OPERATORS))}")
+
+        if op in ("is null", "is not null"):
+            clauses.append(f"{column} {op.upper()}")
+        elif op in ("in", "not in"):
+            if not isinstance(value, (list, tuple)) or not value:
+                raise ValueError(f"Toán tử {op} cần một danh sách giá trị không rỗng")
+            clauses.append(f"{column} {op.upper()} ({', '.join([mark] * len(value))})")
+            params.extend(value)
+        elif op == "between":
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise ValueError("Toán tử between cần đúng hai giá trị [từ, đến]")
+            clauses.append(f"{column} BETWEEN {mark} AND {mark}")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} {op.upper()} {mark}")
+            params.append(value)
+
+    return " WHERE " + " AND ".join(clauses), params
+
+def compile_measure(measure, dialect, columns=None):
+    """Biên dịch một phép đo thành biểu thức SQL (chưa có alias)"""
+    if measure.column == "*":
+        target = "*"
+    else:
+        target = quote_identifier(resolve_column(measure.column, columns), dialect)
+    return AGGREGATE_FUNCTIONS[measure.func].format(target)
+
+def compile_aggregate(table, measures, group_by=None, filters=None, order_by=None, limit=None,
+                      dialect="SQLite", columns=None, conditions=None):
+    """
+    Biên dịch yêu cầu tổng hợp thành câu SQL có tham số.
+
+    Args:
+        table: Tên bảng
+        measures: Danh sách phép đo (xem parse_measure)
+        group_by: Danh sách cột nhóm hoặc nhóm thời gian (xem parse_dimension)
+        filters: Danh sách điều kiện lọc (xem compile_filters)
+        order_by: Danh sách cột nhóm/alias để sắp xếp, thêm tiền tố '-' để sắp giảm dần
+        limit: Số nhóm tối đa trả về
+        dialect: "SQLite" hoặc "MySQL"
+        columns: Danh sách cột hợp lệ của bảng để kiểm tra đầu vào
+        conditions: Các điều kiện SQL đã biên dịch sẵn (không có tham số), nối thêm vào WHERE bằng AND
+
+    Returns:
+        (câu SQL, danh sách tham số, danh sách Measure đã phân tích)
+    """
+    if not measures:
+        raise ValueError("Cần ít nhất một phép đo (ví dụ: sum(total_price), count(*))")
+
+    parsed = [parse_measure(spec) for spec in measures]
+    dimensions = [parse_dimension(spec, columns) for spec in (group_by or [])]
+    group_aliases = [dimension.alias for dimension in dimensions]
+
+    select_parts = []
+    aliases = set()
+    for dimension in dimensions:
+        if dimension.alias in aliases:
+            raise ValueError(f"Alias bị trùng: {dimension.alias}")
+        aliases.add(dimension.alias)
+        expression = compile_dimension(dimension, dialect)
+        if dimension.bucket is not None:
+            expression += f" AS {quote_identifier(dimension.alias, dialect)}"
+        select_parts.append(expression)
+    for measure in parsed:
+        if measure.alias in aliases:
+            raise ValueError(f"Alias bị trùng: {measure.alias}")
+        aliases.add(measure.alias)
+        select_parts.append(f"{compile_measure(measure, dialect, columns)} AS {quote_identifier(measure.alias, dialect)}")
+
+    where_sql, params = compile_filters(filters, dialect, columns)
+    if conditions:
+        where_sql = (where_sql + " AND " if where_sql else " WHERE ") + " AND ".join(conditions)
+    sql = f"SELECT {', '.join(select_parts)} FROM {quote_identifier(table, dialect)}{where_sql}"
+
+    if dimensions:
+        sql += " GROUP BY " + ", ".join(compile_dimension(dimension, dialect) for dimension in dimensions)
+
+    order_parts = []
+    for item in (order_by or group_aliases):
+        descending = item.startswith("-")
+        name = item.lstrip("-")
+        if name not in aliases:
+            name = resolve_column(name, group_aliases)
+        order_parts.append(quote_identifier(name, dialect) + (" DESC" if descending else ""))
+    if order_parts:
+        sql += " ORDER BY " + ", ".join(order_parts)
+
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+
+    return sql, params, parsed
@@ -0,0 +1,481 @@
+import datetime
+import decimal
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from result_encoder import encode_value
+from result_set import ResultSet
+from sql_builder import compile_filters, parse_dimension, parse_measure, quote_identifier, resolve_column
+
+# Thư mục cache phụ. Không đặt file *.db ở thư mục làm việc để không bị quét nhầm thành database
+CACHE_DIR = os.environ.get("MCP_CACHE_DIR", ".mcp_cache")
+
+# Các hàm gộp được khi làm mới tăng dần (avg được lưu dưới dạng sum + count)
+MERGEABLE_FUNCTIONS = ("sum", "count", "avg", "min", "max")
+
+# Biểu thức gộp lại (roll-up) từ cột thành phần của bảng tổng hợp
+_ROLLUP = {
+    "sum": "SUM({sum})",
+    "count": "COALESCE(SUM({count}), 0)",
+    "min": "MIN({min})",
+    "max": "MAX({max})",
+    "avg": "SUM({sum}) * 1.0 / NULLIF(SUM({count}), 0)",
+}
+
+def _components(measure):
+    """Các cột thành phần cần lưu cho một phép đo: danh sách (tên cột lưu, hàm, cột nguồn)"""
+    column = "all" if measure.column == "*" else measure.column
+    if measure.func == "avg":
+        return [(f"sum__{column}", "sum", measure.column), (f"count__{column}", "count", measure.column)]
+    return [(f"{measure.func}__{column}", measure.func, measure.column)]
+
+def _dimension_spec(dimension):
+    """Dựng lại chuỗi group_by từ (bucket, cột, alias) đã lưu"""
+    bucket, column, alias = dimension
+    return column if bucket is None else f"{bucket}({column}) as {alias}"
+
+def _filter_key(condition, columns):
+    """Dạng chuẩn của một điều kiện lọc để so khớp với điều kiện của bảng tổng hợp"""
+    return json.dumps({
+        "column": resolve_column(condition.get("column"), columns),
+        "op": str(condition.get("op", "=")).lower().strip(),
+        "value": condition.get("value"),
+    }, sort_keys=True, default=str)
+
+def _normalize(value):
+    """Chuyển giá trị driver trả về (Decimal, date...) sang kiểu lưu được trong SQLite"""
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        # Giá trị tổng hợp cần cộng dồn được nên DECIMAL được lưu dạng số
+        return int(value) if value == value.to_integral_value() else float(value)
+    return encode_value(value)
+
+def _versions(value):
+    """Dấu phiên bản dữ liệu nguồn đã lưu, theo server ({"host:port" hoặc "": phiên bản})"""
+    try:
+        versions = json.loads(value) if value else {}
+    except ValueError:
+        return {}
+    return versions if isinstance(versions, dict) else {}
+
+def _source_columns(summary):
+    """Các cột nguồn mà bảng tổng hợp phụ thuộc vào (cột nhóm, cột của phép đo, cột lọc)"""
+    columns = [dimension[1] for dimension in summary["dimensions"]]
+    columns += [component[2] for component in summary["components"] if component[2] != "*"]
+    columns += [condition.get("column") for condition in summary["filters"]]
+    return list(dict.fromkeys(columns))
+
+def _merge_value(func, current, delta):
+    if current is None:
+        return delta
+    if delta is None:
+        return current
+    if func in ("sum", "count"):
+        return current + delta
+    if func == "min":
+        return min(current, delta)
+    return max(current, delta)
+
+class SummaryStore:
+    """
+    Các bảng tổng hợp (materialized summary) lưu trong một file SQLite phụ.
+
+    Mỗi bảng tổng hợp ứng với một phép tổng hợp cố định (bảng nguồn, group_by, measures, filters) trên một
+    database đã đăng ký. Khi dữ liệu nguồn đổi phiên bản (get_data_version), bảng tổng hợp được làm mới:
+    - tăng dần: nếu có dòng mới sau khóa lớn nhất lần trước và dấu kiểm (get_range_checksum) của các dòng có
+      khóa <= khóa lớn nhất đó không đổi (dữ liệu chỉ được thêm vào), chỉ tổng hợp các dòng mới rồi gộp vào kết quả cũ;
+    - toàn bộ: trong các trường hợp còn lại (không có dòng mới, dòng cũ bị sửa/xóa, bảng không có khóa số nguyên,
+      hoặc full=True).
+    Dấu phiên bản được lưu riêng cho từng server (primary/replica) đã làm mới bảng tổng hợp, nên việc
+    router chuyển giữa các replica không làm bảng tổng hợp bị tính lại khi dữ liệu không đổi.
+
+    _lock chỉ bảo vệ việc đọc/ghi file phụ; việc làm mới (truy vấn database nguồn) của mỗi bảng tổng hợp
+    dùng khóa riêng để các truy vấn trên những bảng tổng hợp/database khác không phải chờ nhau.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "summaries.db")
+        self._lock = threading.RLock()
+        self._summary_locks = {}
+
+    def _summary_lock(self, name):
+        """Khóa làm mới riêng của một bảng tổng hợp"""
+        with self._lock:
+            lock = self._summary_locks.get(name)
+            if lock is None:
+                lock = self._summary_locks[name] = threading.Lock()
+            return lock
+
+    def _load(self, connection, name):
+        with self._lock:
+            summaries = self._load_rows(connection.execute("SELECT * FROM summary_definitions WHERE name = ?", (name,)))
+        return summaries[0] if summaries else None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS summary_definitions (
+                name TEXT PRIMARY KEY,
+                db_name TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                definition TEXT NOT NULL,
+                source_version TEXT,
+                row_count INTEGER,
+                high_key INTEGER,
+                groups INTEGER,
+                refreshed_at TEXT,
+                checksum INTEGER
+            )
+        """)
+        # File phụ tạo trước khi có dấu kiểm: thêm cột (bảng tổng hợp cũ sẽ được tính lại toàn bộ một lần)
+        if "checksum" not in [row[1] for row in connection.execute("PRAGMA table_info(summary_definitions)")]:
+            connection.execute("ALTER TABLE summary_definitions ADD COLUMN checksum INTEGER")
+        return connection
+
+    @staticmethod
+    def _storage(name):
+        return quote_identifier(f"summary__{name}", "SQLite")
+
+    @staticmethod
+    def _load_rows(cursor):
+        summaries = []
+        for name, db_name, table_name, definition, version, row_count, high_key, groups, refreshed_at, checksum in cursor.fetchall():
+            summary = {"name": name, "db_name": db_name, "table_name": table_name}
+            summary.update(json.loads(definition))
+            summary.update({"source_version": _versions(version), "row_count": row_count, "high_key": high_key,
+                            "groups": groups, "refreshed_at": refreshed_at, "checksum": checksum})
+            summaries.append(summary)
+        return summaries
+
+    def get(self, name):
+        """Lấy định nghĩa và trạng thái của một bảng tổng hợp, None nếu không tồn tại"""
+        if not os.path.exists(self.path):
+            return None
+        with self._lock:
+            connection = self._connect()
+            try:
+                summaries = self._load_rows(connection.execute("SELECT * FROM summary_definitions WHERE name = ?", (name,)))
+                return summaries[0] if summaries else None
+            finally:
+                connection.close()
+
+    def list(self, db_name=None):
+        """Danh sách các bảng tổng hợp (có thể lọc theo database)"""
+        if not os.path.exists(self.path):
+            return []
+        with self._lock:
+            connection = self._connect()
+            try:
+                if db_name:
+                    cursor = connection.execute("SELECT * FROM summary_definitions WHERE db_name = ? ORDER BY name", (db_name,))
+                else:
+                    cursor = connection.execute("SELECT * FROM summary_definitions ORDER BY name")
+                return self._load_rows(cursor)
+            finally:
+                connection.close()
+
+    def create(self, server, db_name, name, table_name, measures, group_by=None, filters=None):
+        """Định nghĩa một bảng tổng hợp mới trên database đang kết nối và tính toàn bộ lần đầu"""
+        if not name or not re.fullmatch(r"\w+", name):
+            return {"status": "error", "message": f"Tên bảng tổng hợp không hợp lệ: {name} (chỉ gồm chữ, số, _)"}
+        if not measures:
+            return {"status": "error", "message": "Cần ít nhất một phép đo (ví dụ: sum(total_price), count(*))"}
+
+        try:
+            table_name, columns = server.get_column_names(table_name)
+            dimensions = [parse_dimension(spec, columns) for spec in (group_by or [])]
+            components = []
+            for spec in measures:
+                measure = parse_measure(spec)
+                if measure.func not in MERGEABLE_FUNCTIONS:
+                    raise ValueError(f"Bảng tổng hợp không hỗ trợ {measure.func} (không gộp tăng dần được). "
+                                     f"Các hàm hợp lệ: {', '.join(MERGEABLE_FUNCTIONS)}")
+                if measure.column != "*":
+                    measure = measure._replace(column=resolve_column(measure.column, columns))
+                for component in _components(measure):
+                    if component not in components:
+                        components.append(component)
+            # Kiểm tra điều kiện lọc hợp lệ ngay khi định nghĩa
+            compile_filters(filters, server.db_type, columns)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+        definition = {
+            "dimensions": [list(dimension) for dimension in dimensions],
+            "components": [list(component) for component in components],
+            "filters": filters or [],
+        }
+        with self._summary_lock(name):
+            connection = self._connect()
+            try:
+                with self._lock:
+                    if connection.execute("SELECT 1 FROM summary_definitions WHERE name = ?", (name,)).fetchone():
+                        return {"status": "error", "message": f"Bảng tổng hợp '{name}' đã tồn tại"}
+                    with connection:
+                        connection.execute(
+                            "INSERT INTO summary_definitions (name, db_name, table_name, definition) VALUES (?, ?, ?, ?)",
+                            (name, db_name, table_name, json.dumps(definition, ensure_ascii=False, default=str))
+                        )
+                summary = self._load(connection, name)
+                result = self._refresh(connection, server, summary, full=True)
+                if result["status"] != "success":
+                    with self._lock, connection:
+                        connection.execute("DELETE FROM summary_definitions WHERE name = ?", (name,))
+                return result
+            finally:
+                connection.close()
+
+    def drop(self, name):
+        """Xóa một bảng tổng hợp"""
+        if not os.path.exists(self.path):
+            return {"status": "error", "message": f"Không tìm thấy bảng tổng hợp: {name}"}
+        with self._summary_lock(name), self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    deleted = connection.execute("DELETE FROM summary_definitions WHERE name = ?", (name,)).rowcount
+                    connection.execute(f"DROP TABLE IF EXISTS {self._storage(name)}")
+                if not deleted:
+                    return {"status": "error", "message": f"Không tìm thấy bảng tổng hợp: {name}"}
+                return {"status": "success", "message": f"Đã xóa bảng tổng hợp '{name}'"}
+            finally:
+                connection.close()
+
+    def refresh(self, server, name, full=False):
+        """Làm mới một bảng tổng hợp nếu dữ liệu nguồn đã thay đổi (full=True để tính lại toàn bộ)"""
+        with self._summary_lock(name):
+            connection = self._connect()
+            try:
+                summary = self._load(connection, name)
+                if summary is None:
+                    return {"status": "error", "message": f"Không tìm thấy bảng tổng hợp: {name}"}
+                return self._refresh(connection, server, summary, full)
+            finally:
+                connection.close()
+
+    def _refresh(self, connection, server, summary, full=False):
+        """Làm mới một bảng tổng hợp; người gọi giữ khóa riêng của bảng tổng hợp (_summary_lock)"""
+        name = summary["name"]
+        table_name = summary["table_name"]
+        try:
+            # Đọc phiên bản trước khóa lớn nhất: dòng thêm vào giữa hai bước sẽ làm phiên bản lần sau khác đi
+            version = server.get_data_version(table_name)
+            # Dấu phiên bản được lưu theo từng server (primary/replica có dấu khác nhau cho cùng dữ liệu)
+            endpoint = server.endpoint or ""
+            versions = dict(summary["source_version"])
+            if not full and summary["refreshed_at"] and versions.get(endpoint) == version:
+                return {"status": "success", "name": name, "mode": "unchanged", "groups": summary["groups"]}
+            bounds = server.get_key_bounds(table_name)
+        except Exception as e:
+            return {"status": "error", "message": f"Lỗi khi kiểm tra dữ liệu nguồn của bảng tổng hợp {name}: {str(e)}"}
+
+        high_key = bounds[1] if bounds else None
+        source_columns = _source_columns(summary)
+        mode = "full"
+        # Chỉ gộp tăng dần khi có dòng mới sau khóa lớn nhất cũ và dấu kiểm của các dòng cũ không đổi
+        # (không dòng cũ nào bị sửa/xóa, không dòng nào được chèn vào khoảng khóa cũ)
+        if (not full and bounds and summary["high_key"] is not None and summary["checksum"] is not None
+                and high_key is not None and high_key > summary["high_key"]):
+            try:
+                previous = server.get_range_checksum(table_name, source_columns, (None, summary["high_key"]))
+            except Exception:
+                previous = None
+            if previous == (summary["row_count"], summary["checksum"]):
+                mode = "incremental"
+
+        key_range = None
+        if bounds:
+            key_range = (summary["high_key"], high_key) if mode == "incremental" else (None, high_key)
+
+        dimensions = summary["dimensions"]
+        components = summary["components"]
+        measures = [{"func": func, "column": column, "alias": alias} for alias, func, column in components]
+        delta = server.aggregate(table_name, measures, [_dimension_spec(dimension) for dimension in dimensions],
+                                 summary["filters"] or None, limit=None, key_range=key_range)
+        if delta["status"] != "success":
+            return delta
+        row_count = checksum = None
+        if bounds:
+            try:
+                row_count, checksum = server.get_range_checksum(table_name, source_columns, key_range)
+            except Exception as e:
+                return {"status": "error", "message": f"Lỗi khi tính dấu kiểm của bảng tổng hợp {name}: {str(e)}"}
+            if mode == "incremental":
+                row_count += summary["row_count"]
+                checksum += summary["checksum"]
+
+        storage = self._storage(name)
+        column_names = [dimension[2] for dimension in dimensions] + [component[0] for component in components]
+        column_sql = ", ".join(quote_identifier(column, "SQLite") for column in column_names)
+        insert_sql = f"INSERT INTO {storage} ({column_sql}) VALUES ({', '.join(['?'] * len(column_names))})"
+        group_size = len(dimensions)
+        funcs = [component[1] for component in components]
+        delta_rows = [tuple(_normalize(value) for value in row) for row in delta["data"].rows]
+
+        with self._lock, connection:
+            if mode == "full":
+                connection.execute(f"DROP TABLE IF EXISTS {storage}")
+                connection.execute(f"CREATE TABLE {storage} ({column_sql})")
+                connection.executemany(insert_sql, delta_rows)
+            else:
+                # Gộp các nhóm mới vào các nhóm đã có (theo rowid), thêm nhóm chưa có
+                existing = {}
+                for row in connection.execute(f"SELECT rowid, {column_sql} FROM {storage}"):
+                    existing[tuple(row[1:1 + group_size])] = (row[0], row[1 + group_size:])
+                set_sql = ", ".join(f"{quote_identifier(component[0], 'SQLite')} = ?" for component in components)
+                for row in delta_rows:
+                    key = row[:group_size]
+                    found = existing.get(key)
+                    if found is None:
+                        connection.execute(insert_sql, row)
+                        continue
+                    rowid, current = found
+                    merged = [_merge_value(func, old, new) for func, old, new in zip(funcs, current, row[group_size:])]
+                    connection.execute(f"UPDATE {storage} SET {set_sql} WHERE rowid = ?", merged + [rowid])
+            groups = connection.execute(f"SELECT COUNT(*) FROM {storage}").fetchone()[0]
+            refreshed_at = datetime.datetime.now().isoformat(timespec="seconds")
+            versions[endpoint] = version
+            connection.execute(
+                "UPDATE summary_definitions SET source_version = ?, row_count = ?, high_key = ?, groups = ?, refreshed_at = ?, "
+                "checksum = ? WHERE name = ?",
+                (json.dumps(versions, default=str), row_count, high_key, groups, refreshed_at, checksum, name)
+            )
+
+        return {"status": "success", "name": name, "mode": mode, "groups": groups,
+                "delta_rows": len(delta_rows), "refreshed_at": refreshed_at}
+
+    def _plan(self, summary, measures, dimensions, filters, columns):
+        """
+        Kiểm tra truy vấn có trả lời được từ bảng tổng hợp không.
+
+        Returns:
+            (cặp (cột lưu, alias) của các nhóm, điều kiện lọc áp dụng trên bảng tổng hợp) hoặc None
+        """
+        stored = {(bucket, column): alias for bucket, column, alias in summary["dimensions"]}
+        group_pairs = []
+        for dimension in dimensions:
+            alias = stored.get((dimension.bucket, dimension.column))
+            if alias is None:
+                return None
+            group_pairs.append((alias, dimension.alias))
+
+        available = {component[0] for component in summary["components"]}
+        for measure in measures:
+            if measure.func not in MERGEABLE_FUNCTIONS:
+                return None
+            if any(component[0] not in available for component in _components(measure)):
+                return None
+
+        # Mọi điều kiện lọc của bảng tổng hợp phải có trong truy vấn; điều kiện còn lại phải nằm trên cột nhóm
+        wanted = {_filter_key(condition, columns): condition for condition in (filters or [])}
+        for condition in summary["filters"]:
+            if wanted.pop(_filter_key(condition, columns), None) is None:
+                return None
+        plain = {column: alias for (bucket, column), alias in stored.items() if bucket is None}
+        remaining = []
+        for condition in wanted.values():
+            column = resolve_column(condition.get("column"), columns)
+            if column not in plain:
+                return None
+            remaining.append(dict(condition, column=plain[column]))
+        return group_pairs, remaining
+
+    def answer(self, server, db_name, table_name, measures, group_by=None, filters=None, order_by=None, limit=1000):
+        """
+        Trả lời truy vấn tổng hợp từ một bảng tổng hợp phù hợp (làm mới trước nếu dữ liệu nguồn đã đổi).
+
+        Returns:
+            dictionary kết quả giống DatabaseServer.aggregate kèm "source", hoặc None nếu không có bảng tổng hợp phù hợp
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            table_name, columns = server.get_column_names(table_name)
+            parsed = [parse_measure(spec) for spec in measures]
+            parsed = [measure if measure.column == "*" else measure._replace(column=resolve_column(measure.column, columns))
+                      for measure in parsed]
+            dimensions = [parse_dimension(spec, columns) for spec in (group_by or [])]
+        except ValueError:
+            # Để truy vấn chính xác báo lỗi đầu vào
+            return None
+
+        connection = self._connect()
+        try:
+            with self._lock:
+                candidates = self._load_rows(connection.execute(
+                    "SELECT * FROM summary_definitions WHERE db_name = ? AND table_name = ? ORDER BY groups",
+                    (db_name, table_name)
+                ))
+            for summary in candidates:
+                try:
+                    plan = self._plan(summary, parsed, dimensions, filters, columns)
+                except ValueError:
+                    plan = None
+                if plan is None:
+                    continue
+                with self._summary_lock(summary["name"]):
+                    # Đọc lại trạng thái: luồng khác có thể vừa làm mới hoặc xóa bảng tổng hợp này
+                    summary = self._load(connection, summary["name"])
+                    if summary is None:
+                        continue
+                    refreshed = self._refresh(connection, server, summary)
+                    if refreshed["status"] != "success":
+                        return None
+                    with self._lock:
+                        result = self._query(connection, summary, parsed, plan, order_by, limit)
+                if result is not None:
+                    result["refresh"] = refreshed["mode"]
+                    return result
+            return None
+        finally:
+            connection.close()
+
+    def _query(self, connection, summary, measures, plan, order_by, limit):
+        """Gộp lại (roll-up) bảng tổng hợp theo các nhóm được yêu cầu"""
+        group_pairs, remaining = plan
+        select_parts = []
+        aliases = []
+        for stored, alias in group_pairs:
+            select_parts.append(f"{quote_identifier(stored, 'SQLite')} AS {quote_identifier(alias, 'SQLite')}")
+            aliases.append(alias)
+        for measure in measures:
+            names = {func: quote_identifier(component, "SQLite") for component, func, _ in _components(measure)}
+            select_parts.append(f"{_ROLLUP[measure.func].format(**names)} AS {quote_identifier(measure.alias, 'SQLite')}")
+            aliases.append(measure.alias)
+        if len(set(aliases)) != len(aliases):
+            return None
+
+        try:
+            stored_columns = [dimension[2] for dimension in summary["dimensions"]]
+            where_sql, params = compile_filters(remaining, "SQLite", stored_columns)
+            order_parts = []
+            group_aliases = [alias for _, alias in group_pairs]
+            for item in (order_by or group_aliases):
+                name = item.lstrip("-")
+                if name not in aliases:
+                    name = resolve_column(name, group_aliases)
+                order_parts.append(quote_identifier(name, "SQLite") + (" DESC" if item.startswith("-") else ""))
+        except ValueError:
+            return None
+
+        sql = f"SELECT {', '.join(select_parts)} FROM {self._storage(summary['name'])}{where_sql}"
+        if group_pairs:
+            sql += " GROUP BY " + ", ".join(quote_identifier(stored, "SQLite") for stored, _ in group_pairs)
+        if order_parts:
+            sql += " ORDER BY " + ", ".join(order_parts)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        cursor = connection.execute(sql, params)
+        data = ResultSet.from_cursor(cursor)
+        cursor.close()
+        return {"status": "success", "data": data, "count": len(data), "query": sql, "params": params,
+                "source": f"summary:{summary['name']}"}
+
+# Kho bảng tổng hợp dùng chung trong process
+summary_store = SummaryStore()
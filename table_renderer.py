@@ -0,0 +1,182 @@
+import csv
+import io
+import itertools
+
+# Các định dạng bảng được hỗ trợ
+TABLE_FORMATS = ("pretty", "plain", "markdown", "csv")
+
+# Giá trị mặc định cho việc hiển thị kết quả lớn
+DEFAULT_MAX_CHARS = 20000
+DEFAULT_MAX_CELL_WIDTH = 40
+DEFAULT_SAMPLE_SIZE = 200
+
+def _cell_text(value):
+    """Chuyển giá trị ô thành chuỗi một dòng"""
+    if value is None:
+        return ""
+    text = value if isinstance(value, str) else str(value)
+    if "\n" in text or "\r" in text:
+        text = text.replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
+    return text
+
+def _truncate(text, width):
+    """Cắt ngắn chuỗi dài hơn độ rộng cột, đánh dấu bằng dấu '…'"""
+    if len(text) <= width:
+        return text
+    if width <= 1:
+        return text[:width]
+    return text[:width - 1] + "…"
+
+def _sample_rows(rows, sample_size):
+    """
+    Lấy mẫu các dòng để tính độ rộng cột.
+    Trả về (mẫu, iterator các dòng cần hiển thị) để không phải duyệt toàn bộ dữ liệu hai lần.
+    """
+    if isinstance(rows, (list, tuple)):
+        if len(rows) <= sample_size:
+            return rows, iter(rows)
+        # Lấy mẫu dàn đều: phần đầu (sẽ hiển thị trước) và rải rác phần còn lại
+        head = rows[:sample_size // 2]
+        step = max(1, len(rows) // (sample_size - len(head)))
+        return list(head) + list(rows[len(head)::step]), iter(rows)
+
+    # Iterator/generator: đệm một số dòng đầu làm mẫu rồi nối lại với phần còn lại
+    iterator = iter(rows)
+    head = list(itertools.islice(iterator, sample_size))
+    return head, itertools.chain(head, iterator)
+
+def _column_widths(headers, sample, max_cell_width):
+    """Tính độ rộng mỗi cột từ tiêu đề và các dòng mẫu"""
+    widths = [min(len(_cell_text(h)), max_cell_width) for h in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            if i >= len(widths):
+                widths.append(0)
+            length = len(_cell_text(value))
+            if length > widths[i]:
+                widths[i] = min(length, max_cell_width)
+    return [max(w, 1) for w in widths]
+
+def _normalize(row, column_count):
+    """Đảm bảo mỗi dòng có đúng số cột"""
+    row = list(row)
+    if len(row) < column_count:
+        row.extend([None] * (column_count - len(row)))
+    return row[:column_count]
+
+def _iter_lines(rows, headers, fmt, max_cell_width, sample_size):
+    """Sinh các cặp (là dòng dữ liệu hay không, văn bản) của bảng"""
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"Định dạng bảng không hợp lệ: {fmt}. Các định dạng hợp lệ: {', '.join(TABLE_FORMATS)}")
+
+    headers = list(headers) if headers else []
+    sample, row_iter = _sample_rows(rows, sample_size)
+    widths = _column_widths(headers, sample, max_cell_width)
+    column_count = len(widths)
+    if len(headers) < column_count:
+        headers.extend([""] * (column_count - len(headers)))
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="")
+        if any(headers):
+            writer.writerow(headers)
+            yield False, buffer.getvalue()
+        for row in row_iter:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow([_cell_text(v) for v in _normalize(row, column_count)])
+            yield True, buffer.getvalue()
+        return
+
+    def cells(row):
+        return [_truncate(_cell_text(v), w) for v, w in zip(_normalize(row, column_count), widths)]
+
+    if fmt == "markdown":
+        def line(values):
+            return "| " + " | ".join(v.replace("|", "\\|").ljust(w) for v, w in zip(values, widths)) + " |"
+        yield False, line(cells(headers))
+        yield False, "|" + "|".join("-" * (w + 2) for w in widths) + "|"
+        for row in row_iter:
+            yield True, line(cells(row))
+        return
+
+    if fmt == "plain":
+        def line(values):
+            return "  ".join(v.ljust(w) for v, w in zip(values, widths)).rstrip()
+        if any(headers):
+            yield False, line(cells(headers))
+            yield False, "  ".join("-" * w for w in widths)
+        for row in row_iter:
+            yield True, line(cells(row))
+        return
+
+    # pretty: bảng có viền giống tabulate(tablefmt="pretty")
+    border = "+" + "+".join("-" * (w + 2) for w in widths) + "+"
+
+    def line(values):
+        return "| " + " | ".join(v.ljust(w) for v, w in zip(values, widths)) + " |"
+
+    yield False, border
+    if any(headers):
+        yield False, line(cells(headers))
+        yield False, border
+    for row in row_iter:
+        yield True, line(cells(row))
+    yield False, border
+
+def iter_table(rows, headers=None, fmt="pretty", max_cell_width=DEFAULT_MAX_CELL_WIDTH, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Sinh lần lượt từng dòng văn bản của bảng.
+
+    Độ rộng cột được chọn từ một mẫu dòng thay vì quét toàn bộ dữ liệu; các ô dài hơn
+    độ rộng sẽ bị cắt ngắn. Định dạng csv không cắt ngắn giá trị.
+    """
+    for _, text in _iter_lines(rows, headers, fmt, max_cell_width, sample_size):
+        yield text
+
+def render_table(rows, headers=None, fmt="pretty", max_chars=DEFAULT_MAX_CHARS,
+                 max_cell_width=DEFAULT_MAX_CELL_WIDTH, sample_size=DEFAULT_SAMPLE_SIZE, total_rows=None):
+    """
+    Hiển thị dữ liệu dạng bảng trong giới hạn số ký tự.
+
+    Args:
+        rows: Danh sách (hoặc iterator) các dòng, mỗi dòng là list/tuple giá trị
+        headers: Danh sách tiêu đề cột
+        fmt: Định dạng bảng (pretty, plain, markdown, csv)
+        max_chars: Số ký tự tối đa của kết quả; các dòng vượt quá sẽ bị lược bỏ
+        max_cell_width: Độ rộng tối đa của một ô
+        sample_size: Số dòng mẫu dùng để tính độ rộng cột
+        total_rows: Tổng số dòng (nếu rows là iterator và muốn báo số dòng bị lược bỏ)
+
+    Returns:
+        Chuỗi bảng đã định dạng
+    """
+    if total_rows is None and isinstance(rows, (list, tuple)):
+        total_rows = len(rows)
+
+    lines = []
+    used = 0
+    shown_rows = 0
+    truncated = False
+
+    for is_row, text in _iter_lines(rows, headers, fmt, max_cell_width, sample_size):
+        # Chỉ các dòng dữ liệu bị tính vào giới hạn; tiêu đề và viền luôn được giữ
+        if is_row:
+            if max_chars is not None and used + len(text) + 1 > max_chars and shown_rows:
+                truncated = True
+                break
+            shown_rows += 1
+        lines.append(text)
+        used += len(text) + 1
+
+    if truncated:
+        if fmt == "pretty":
+            # Đóng viền bảng sau khi cắt
+            lines.append(lines[0])
+        if total_rows is not None:
+            lines.append(f"... đã ẩn {total_rows - shown_rows} / {total_rows} dòng (vượt giới hạn {max_chars} ký tự)")
+        else:
+            lines.append(f"... đã ẩn các dòng còn lại (vượt giới hạn {max_chars} ký tự)")
+
+    return "\n".join(lines)
@@ -1,5 +1,6 @@
 from mcp.server.fastmcp import FastMCP
 from mcp_server import DatabaseServer
+from result_encoder import dumps
 import json
 import os
 import sys
@@ -185,7 +186,7 @@ def manage_databases(action: str = "list") -> str:
         removed = old_databases - new_databases
         
         if new_count == 0:
-            return json.dumps({"status": "info", "message": "Không tìm thấy database nào."})
+            return dumps({"status": "info", "message": "Không tìm thấy database nào."})
         elif added:
             scan_result = f"[SUCCESS] Đã phát hiện {new_count} database. Thêm mới: {', '.join(added)}."
         elif removed:
@@ -195,7 +196,7 @@ def manage_databases(action: str = "list") -> str:
     
     # Liệt kê databases
     if not available_databases:
-        return json.dumps({"status": "info", "message": scan_result + "Không tìm thấy database nào."})
+        return dumps({"status": "info", "message": scan_result + "Không tìm thấy database nào."})
     
     database_data = []
     
@@ -212,7 +213,7 @@ def manage_databases(action: str = "list") -> str:
         
         database_data.append(db_info)
     
-    return json.dumps({
+    return dumps({
         "status": "success", 
         "message": scan_result,
         "data": database_data,
@@ -243,7 +244,7 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
     """
     # Kiểm tra xem database có tồn tại không
     if db_name not in available_databases:
-        return json.dumps({
+        return dumps({
             "status": "error", 
             "message": f"Không tìm thấy database: {db_name}. Database hiện có: {', '.join(available_databases.keys())}"
         })
@@ -252,7 +253,7 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
         # Lấy kết nối đến database
         server, error = DatabaseConnection.get_connection(db_name)
         if error:
-            return json.dumps({"status": "error", "message": error})
+            return dumps({"status": "error", "message": error})
         
         result = None
         prompt = ""
@@ -261,81 +262,68 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
             if action == "list_tables":
                 tables = server.get_table_names()
                 if not tables:
-                    return json.dumps({"status": "info", "message": f"Database {db_name} không có bảng nào."})
+                    return dumps({"status": "info", "message": f"Database {db_name} không có bảng nào."})
                 
                 result = {"tables": tables}
                 prompt = "Hiển thị danh sách bảng trong database dưới dạng bảng một cột có tiêu đề 'Tên bảng', luôn luôn để ở dạng bảng"
             
             elif action == "describe_table":
                 if not table_name:
-                    return json.dumps({"status": "error", "message": "Vui lòng cung cấp tham số table_name."})
+                    return dumps({"status": "error", "message": "Vui lòng cung cấp tham số table_name."})
                 
                 schema = server.get_table_schema(table_name)
                 if not schema:
-                    return json.dumps({"status": "info", "message": f"Không tìm thấy bảng: {table_name} trong database {db_name}."})
+                    return dumps({"status": "info", "message": f"Không tìm thấy bảng: {table_name} trong database {db_name}."})
                 
-                # Parse schema từ JSON string
-                try:
-                    schema_data = json.loads(schema)
-                    result = {"schema": schema_data}
-                    prompt = f"""
-                        Hãy hiển thị cấu trúc bảng `{table_name}` dưới dạng từng dòng 1 cách trực quan 
-                    """
-
-                except:
-                    result = {"raw_schema": schema}
-                    prompt = "Hiển thị thông tin schema dưới dạng văn bản có định dạng"
+                if schema["status"] != "success":
+                    return dumps({"status": "error", "message": schema["message"]})
+                result = {"schema": schema["schema"]}
+                prompt = f"""
+                    Hãy hiển thị cấu trúc bảng `{table_name}` dưới dạng từng dòng 1 cách trực quan 
+                """
             
             elif action == "get_data":
                 if not table_name:
-                    return json.dumps({"status": "error", "message": "Vui lòng cung cấp tham số table_name."})
+                    return dumps({"status": "error", "message": "Vui lòng cung cấp tham số table_name."})
                 
                 data = server.get_all_data(table_name, limit)
                 if not data:
-                    return json.dumps({"status": "info", "message": f"Không có dữ liệu trong bảng: {table_name} của database {db_name}."})
+                    return dumps({"status": "info", "message": f"Không có dữ liệu trong bảng: {table_name} của database {db_name}."})
                 
-                # Parse data từ JSON string
-                try:
-                    table_data = json.loads(data)
-                    result = {"data": table_data}
-                    prompt = f"Hiển thị dữ liệu của bảng {table_name} dưới dạng bảng với tất cả các cột"
-                except:
-                    result = {"raw_data": data}
-                    prompt = "Hiển thị dữ liệu dưới dạng văn bản có định dạng"
+                if data["status"] != "success":
+                    return dumps({"status": "error", "message": data["message"]})
+                result = {"data": data["data"]}
+                prompt = f"Hiển thị dữ liệu của bảng {table_name} dưới dạng bảng với tất cả các cột"
             
             elif action == "search_data":
                 if not table_name:
-                    return json.dumps({"status": "error", "message": "Vui lòng cung cấp tham số table_name."})
+                    return dumps({"status": "error", "message": "Vui lòng cung cấp tham số table_name."})
                 if not search_term:
-                    return json.dumps({"status": "error", "message": "Vui lòng cung cấp tham số search_term."})
+                    return dumps({"status": "error", "message": "Vui lòng cung cấp tham số search_term."})
                 
                 search_result = server.search_data(table_name, search_term, limit=limit)
                 if not search_result:
-                    return json.dumps({"status": "info", "message": f"Không tìm thấy dữ liệu phù hợp với từ khóa '{search_term}' trong bảng: {table_name}."})
+                    return dumps({"status": "info", "message": f"Không tìm thấy dữ liệu phù hợp với từ khóa '{search_term}' trong bảng: {table_name}."})
                 
-                # Parse result từ JSON string
-                try:
-                    search_data = json.loads(search_result)
-                    result = {"data": search_data}
-                    prompt = f"Hiển thị kết quả tìm kiếm từ khóa '{search_term}' trong bảng {table_name} dưới dạng bảng"
-                except:
-                    result = {"raw_data": search_result}
-                    prompt = "Hiển thị kết quả tìm kiếm dưới dạng văn bản có định dạng"
+                if search_result["status"] != "success":
+                    return dumps({"status": "error", "message": search_result["message"]})
+                result = {"data": search_result["data"]}
+                prompt = f"Hiển thị kết quả tìm kiếm từ khóa '{search_term}' trong bảng {table_name} dưới dạng bảng"
             
             else:
-                return json.dumps({
+                return dumps({
                     "status": "error", 
                     "message": f"Hành động không hợp lệ: {action}. Các hành động hợp lệ: list_tables, describe_table, get_data, search_data"
                 })
             
-            return json.dumps({
+            return dumps({
                 "status": "success",
                 "result": result,
                 "prompt": prompt
             })
             
         except Exception as e:
-            return json.dumps({"status": "error", "message": f"Lỗi khi thực hiện hành động {action}: {str(e)}"})
+            return dumps({"status": "error", "message": f"Lỗi khi thực hiện hành động {action}: {str(e)}"})
         finally:
             # Đảm bảo luôn ngắt kết nối sau khi thực hiện xong
             DatabaseConnection.close_connection()
@@ -343,7 +331,7 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
     except Exception as e:
         # Đảm bảo ngắt kết nối trong trường hợp lỗi
         DatabaseConnection.close_connection()
-        return json.dumps({"status": "error", "message": str(e)})
+        return dumps({"status": "error", "message": str(e)})
 
 @mcp.tool()
 def execute_query(db_name: str, query: str) -> str:
@@ -362,33 +350,26 @@ def execute_query(db_name: str, query: str) -> str:
     """
     # Kiểm tra câu lệnh SQL có an toàn không
     if not is_safe_query(query):
-        return json.dumps({"status": "error", "message": "Chỉ cho phép câu lệnh SELECT để đảm bảo chế độ chỉ đọc"})
+        return dumps({"status": "error", "message": "Chỉ cho phép câu lệnh SELECT để đảm bảo chế độ chỉ đọc"})
     
     try:
         # Lấy kết nối đến database
         server, error = DatabaseConnection.get_connection(db_name)
         if error:
-            return json.dumps({"status": "error", "message": error})
+            return dumps({"status": "error", "message": error})
         
         try:
             result = server.execute_query(query)
             if not result:
-                return json.dumps({"status": "info", "message": f"Không có kết quả cho truy vấn: {query}"})
+                return dumps({"status": "info", "message": f"Không có kết quả cho truy vấn: {query}"})
             
-            # Parse result từ JSON string
-            try:
-                query_data = json.loads(result)
-                return json.dumps({
-                    "status": "success",
-                    "result": {"data": query_data},
-                    "prompt": f"Hiển thị kết quả truy vấn SQL dưới dạng bảng: {query}"
-                })
-            except:
-                return json.dumps({
-                    "status": "success",
-                    "result": {"raw_data": result},
-                    "prompt": "Hiển thị kết quả truy vấn SQL dưới dạng văn bản có định dạng"
-                })
+            if result["status"] != "success":
+                return dumps({"status": "error", "message": result["message"]})
+            return dumps({
+                "status": "success",
+                "result": {"data": result.get("data")},
+                "prompt": f"Hiển thị kết quả truy vấn SQL dưới dạng bảng: {query}"
+            })
         finally:
             # Đảm bảo luôn ngắt kết nối sau khi thực hiện xong
             DatabaseConnection.close_connection()
@@ -396,7 +377,7 @@ def execute_query(db_name: str, query: str) -> str:
     except Exception as e:
         # Đảm bảo ngắt kết nối trong trường hợp lỗi
         DatabaseConnection.close_connection()
-        return json.dumps({"status": "error", "message": str(e)})
+        return dumps({"status": "error", "message": str(e)})
 
 @mcp.tool()
 def get_database_summary(db_name: str) -> str:
@@ -416,27 +397,20 @@ def get_database_summary(db_name: str) -> str:
         # Lấy kết nối đến database
         server, error = DatabaseConnection.get_connection(db_name)
         if error:
-            return json.dumps({"status": "error", "message": error})
+            return dumps({"status": "error", "message": error})
         
         try:
             info = server.get_database_info()
             if not info:
-                return json.dumps({"status": "info", "message": f"Không có thông tin nào về database {db_name}."})
+                return dumps({"status": "info", "message": f"Không có thông tin nào về database {db_name}."})
             
-            # Parse info từ JSON string
-            try:
-                db_info = json.loads(info)
-                return json.dumps({
-                    "status": "success",
-                    "result": {"info": db_info},
-                    "prompt": f"Hiển thị thông tin tổng quan về database {db_name} dưới dạng bảng"
-                })
-            except:
-                return json.dumps({
-                    "status": "success",
-                    "result": {"raw_info": info},
-                    "prompt": "Hiển thị thông tin tổng quan dưới dạng văn bản có định dạng"
-                })
+            if info["status"] != "success":
+                return dumps({"status": "error", "message": info["message"]})
+            return dumps({
+                "status": "success",
+                "result": {"info": info["info"]},
+                "prompt": f"Hiển thị thông tin tổng quan về database {db_name} dưới dạng bảng"
+            })
         finally:
             # Đảm bảo luôn ngắt kết nối sau khi thực hiện xong
             DatabaseConnection.close_connection()
@@ -444,7 +418,7 @@ def get_database_summary(db_name: str) -> str:
     except Exception as e:
         # Đảm bảo ngắt kết nối trong trường hợp lỗi
         DatabaseConnection.close_connection()
-        return json.dumps({"status": "error", "message": str(e)})
+        return dumps({"status": "error", "message": str(e)})
 
 @mcp.tool()
 def rescan_databases() -> str:
@@ -481,7 +455,7 @@ def rescan_databases() -> str:
         message = f"Không có thay đổi, vẫn có {new_count} database có sẵn."
         status = "info"
     
-    return json.dumps({
+    return dumps({
         "status": status,
         "message": message,
         "count": new_count,
@@ -515,7 +489,7 @@ def add_mysql_database(name: str, host: str, user: str, password: str, database:
     
     # Kiểm tra xem tên đã tồn tại chưa
     if name in available_databases:
-        return json.dumps({"status": "error", "message": f"Database với tên '{name}' đã tồn tại."})
+        return dumps({"status": "error", "message": f"Database với tên '{name}' đã tồn tại."})
     
     # Kiểm tra kết nối
     server = DatabaseServer()
@@ -523,7 +497,7 @@ def add_mysql_database(name: str, host: str, user: str, password: str, database:
     
     if result.get("status") != "success":
         server.disconnect()
-        return json.dumps({"status": "error", "message": f"Không thể kết nối đến MySQL database: {result.get('message')}"})
+        return dumps({"status": "error", "message": f"Không thể kết nối đến MySQL database: {result.get('message')}"})
     
     server.disconnect()
     print(f"[INFO] Đã kiểm tra và ngắt kết nối thử nghiệm đến MySQL {host}/{database}")
@@ -555,7 +529,7 @@ def add_mysql_database(name: str, host: str, user: str, password: str, database:
         with open("mysql_config.json", "w") as f:
             json.dump(configs, f, indent=2)
         
-        return json.dumps({
+        return dumps({
             "status": "success", 
             "message": f"Đã thêm MySQL database '{name}' và lưu cấu hình.",
             "database": {
@@ -570,7 +544,7 @@ def add_mysql_database(name: str, host: str, user: str, password: str, database:
     except Exception as e:
         # Xóa khỏi available_databases nếu lưu file thất bại
         del available_databases[name]
-        return json.dumps({"status": "error", "message": f"Lỗi khi lưu cấu hình: {str(e)}"})
+        return dumps({"status": "error", "message": f"Lỗi khi lưu cấu hình: {str(e)}"})
 
 if __name__ == "__main__":
     print("=== Đang quét database có sẵn... ===")
@@ -6,7 +6,8 @@ import sys
 import glob
 import re
 from typing import Optional, Dict, Any, List, Union
-from tabulate import tabulate
+from table_renderer import render_table, DEFAULT_MAX_CHARS
+from result_set import ResultSet
 
 # Đặt mã hóa UTF-8 cho đầu ra
 sys.stdout.reconfigure(encoding='utf-8')
@@ -53,57 +54,55 @@ def discover_databases():
     
     return databases
 
-def format_as_table(data, headers=None):
-    """Format dữ liệu dưới dạng bảng sử dụng tabulate"""
+# Cấu hình hiển thị bảng (có thể thay đổi qua biến môi trường)
+TABLE_FORMAT = os.environ.get("MCP_TABLE_FORMAT", "pretty")
+TABLE_MAX_CHARS = int(os.environ.get("MCP_TABLE_MAX_CHARS", DEFAULT_MAX_CHARS))
+
+def format_as_table(data, headers=None, fmt=None, max_chars=None):
+    """
+    Format dữ liệu dưới dạng bảng.
+    
+    Dữ liệu có cấu trúc (dict, list) được đưa thẳng vào renderer mà không parse/dựng lại;
+    chỉ chuỗi trông giống JSON mới được parse.
+    """
+    fmt = fmt or TABLE_FORMAT
+    max_chars = max_chars or TABLE_MAX_CHARS
+    
     if isinstance(data, str):
+        stripped = data.lstrip()
+        if not stripped.startswith(("{", "[")):
+            return data
         try:
-            # Thử parse JSON nếu data là chuỗi JSON
-            parsed_data = json.loads(data)
-            if isinstance(parsed_data, dict):
-                # Nếu là dict, chuyển thành dạng bảng
-                table_data = []
-                if parsed_data and isinstance(list(parsed_data.values())[0], dict):
-                    # Trường hợp dictionary lồng nhau
-                    for key, value in parsed_data.items():
-                        row = [key]
-                        row.extend(value.values())
-                        table_data.append(row)
-                    headers = ["Name"] + list(list(parsed_data.values())[0].keys())
-                else:
-                    # Trường hợp dictionary đơn giản
-                    for key, value in parsed_data.items():
-                        table_data.append([key, value])
-                    headers = ["Key", "Value"]
-                return tabulate(table_data, headers=headers, tablefmt="pretty")
-            elif isinstance(parsed_data, list):
-                # Nếu là list, kiểm tra nếu là list của dictionary
-                if parsed_data and isinstance(parsed_data[0], dict):
-                    if not headers:
-                        headers = list(parsed_data[0].keys())
-                    table_data = []
-                    for item in parsed_data:
-                        table_data.append(list(item.values()))
-                    return tabulate(table_data, headers=headers, tablefmt="pretty")
-                else:
-                    # List đơn giản
-                    return tabulate([[item] for item in parsed_data], headers=["Value"], tablefmt="pretty")
-        except:
+            data = json.loads(data)
+        except ValueError:
             # Nếu không phải JSON, trả về nguyên bản
-            pass
+            return data
+    
+    if isinstance(data, ResultSet):
+        return render_table(data.rows, data.columns, fmt, max_chars)
+    
+    if isinstance(data, dict):
+        if not data:
+            return render_table([], headers or ["Key", "Value"], fmt, max_chars)
+        first = next(iter(data.values()))
+        if isinstance(first, dict):
+            # Trường hợp dictionary lồng nhau
+            rows = [[key, *(value.get(column) for column in first)] for key, value in data.items()]
+            return render_table(rows, ["Name", *first.keys()], fmt, max_chars)
+        # Trường hợp dictionary đơn giản
+        return render_table(list(data.items()), ["Key", "Value"], fmt, max_chars)
     
     if isinstance(data, list):
-        # Nếu data là list
         if data and isinstance(data[0], dict):
-            # List của dictionaries
+            # List của dictionaries: lấy giá trị theo thứ tự tiêu đề, sinh dòng theo kiểu lười
             if not headers:
                 headers = list(data[0].keys())
-            table_data = []
-            for item in data:
-                table_data.append(list(item.values()))
-            return tabulate(table_data, headers=headers, tablefmt="pretty")
-        else:
-            # List đơn giản
-            return tabulate([[item] for item in data], headers=["Value"], tablefmt="pretty")
+            rows = (tuple(item.get(header) for header in headers) for item in data)
+            return render_table(rows, headers, fmt, max_chars, total_rows=len(data))
+        if data and isinstance(data[0], (list, tuple)):
+            return render_table(data, headers, fmt, max_chars)
+        # List đơn giản
+        return render_table([(item,) for item in data], headers or ["Value"], fmt, max_chars)
     
     # Trường hợp còn lại, trả về dạng chuỗi
     return str(data)
@@ -319,12 +318,9 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
                 if not schema:
                     return f"[INFO] Không tìm thấy bảng: {table_name} trong database {db_name}."
                 
-                # Parse schema từ JSON string
-                try:
-                    schema_data = json.loads(schema)
-                    result = format_as_table(schema_data)
-                except:
-                    result = schema  # Trả về nguyên bản nếu không parse được
+                if schema["status"] != "success":
+                    return f"[ERROR] {schema['message']}"
+                result = format_as_table(schema["schema"])
             
             elif action == "get_data":
                 if not table_name:
@@ -334,12 +330,11 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
                 if not data:
                     return f"[INFO] Không có dữ liệu trong bảng: {table_name} của database {db_name}."
                 
-                # Parse data từ JSON string
-                try:
-                    table_data = json.loads(data)
-                    result = format_as_table(table_data)
-                except:
-                    result = data  # Trả về nguyên bản nếu không parse được
+                if data["status"] != "success":
+                    return f"[ERROR] {data['message']}"
+                result = format_as_table(data["data"])
+                if data["limited"]:
+                    result += f"\n[INFO] Hiển thị {data['count']} / {data['total']} bản ghi."
             
             elif action == "search_data":
                 if not table_name:
@@ -351,12 +346,9 @@ def explore_database(db_name: str, action: str = "list_tables", table_name: str
                 if not search_result:
                     return f"[INFO] Không tìm thấy dữ liệu phù hợp với từ khóa '{search_term}' trong bảng: {table_name}."
                 
-                # Parse result từ JSON string
-                try:
-                    search_data = json.loads(search_result)
-                    result = format_as_table(search_data)
-                except:
-                    result = search_result  # Trả về nguyên bản nếu không parse được
+                if search_result["status"] != "success":
+                    return f"[ERROR] {search_result['message']}"
+                result = format_as_table(search_result["data"])
             
             else:
                 return f"[ERROR] Hành động không hợp lệ: {action}. Các hành động hợp lệ: list_tables, describe_table, get_data, search_data"
@@ -405,12 +397,11 @@ def execute_query(db_name: str, query: str) -> str:
             if not result:
                 return f"[INFO] Không có kết quả cho truy vấn: {query}"
             
-            # Parse result từ JSON string
-            try:
-                query_data = json.loads(result)
-                return format_as_table(query_data)
-            except:
-                return result  # Trả về nguyên bản nếu không parse được
+            if result["status"] != "success":
+                return f"[ERROR] {result['message']}"
+            if "data" not in result:
+                return f"[INFO] {result.get('message', '')}"
+            return format_as_table(result["data"])
         finally:
             # Đảm bảo luôn ngắt kết nối sau khi thực hiện xong
             DatabaseConnection.close_connection()
@@ -446,12 +437,13 @@ def get_database_summary(db_name: str) -> str:
             if not info:
                 return f"[INFO] Không có thông tin nào về database {db_name}."
             
-            # Parse info từ JSON string
-            try:
-                db_info = json.loads(info)
-                return format_as_table(db_info)
-            except:
-                return info  # Trả về nguyên bản nếu không parse được
+            if info["status"] != "success":
+                return f"[ERROR] {info['message']}"
+            
+            # Thông tin chung dạng Key/Value, chi tiết từng bảng dạng bảng riêng
+            db_info = info["info"]
+            overview = {key: value for key, value in db_info.items() if key != "table_details"}
+            return format_as_table(overview) + "\n\n" + format_as_table(db_info["table_details"])
         finally:
             # Đảm bảo luôn ngắt kết nối sau khi thực hiện xong
             DatabaseConnection.close_connection()
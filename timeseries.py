@@ -0,0 +1,171 @@
+from columnar import load_numpy
+from result_set import ResultSet
+from sql_builder import TIME_BUCKETS, parse_measure
+
+# Số nhóm thời gian tối đa của một chuỗi (mỗi shard)
+MAX_BUCKETS = 50000
+
+# Cách gộp giá trị của cùng một nhóm thời gian từ nhiều shard
+_MERGES = {"sum": "sum", "count": "sum", "count_distinct": "sum", "min": "min", "max": "max"}
+
+def plan_measures(measures):
+    """
+    Chuyển các phép đo của người dùng thành các phép đo chạy trên từng shard sao cho gộp được:
+    avg(x) được tính bằng sum(x) / count(x) sau khi gộp.
+
+    Returns:
+        (danh sách phép đo dạng dict cho DatabaseServer.aggregate, danh sách Measure gốc)
+    """
+    if not measures:
+        raise ValueError("Cần ít nhất một phép đo (ví dụ: sum(total_price), count(*))")
+    parsed = [parse_measure(spec) for spec in measures]
+    query_measures = []
+    for measure in parsed:
+        if measure.func == "avg":
+            query_measures.append({"func": "sum", "column": measure.column, "alias": f"__sum_{measure.alias}"})
+            query_measures.append({"func": "count", "column": measure.column, "alias": f"__count_{measure.alias}"})
+        else:
+            query_measures.append({"func": measure.func, "column": measure.column, "alias": measure.alias})
+    return query_measures, parsed
+
+def _combine(func, current, value):
+    if current is None:
+        return value
+    if value is None:
+        return current
+    if func == "min":
+        return min(current, value)
+    if func == "max":
+        return max(current, value)
+    return current + value
+
+def merge_shards(shard_results, query_measures, parsed):
+    """
+    Gộp chuỗi thời gian (ResultSet cột "bucket" + các phép đo) của nhiều shard theo nhãn nhóm.
+
+    Returns:
+        (danh sách dòng đã sắp theo nhóm, danh sách alias count_distinct bị cộng dồn giữa các shard (không chính xác))
+    """
+    aliases = [measure["alias"] for measure in query_measures]
+    funcs = [_MERGES[measure["func"]] for measure in query_measures]
+    merged = {}
+    overlapping = set()
+    for data in shard_results:
+        indexes = [data.columns.index(alias) for alias in aliases]
+        bucket_index = data.columns.index("bucket")
+        for row in data.rows:
+            label = row[bucket_index]
+            if label is None:
+                continue
+            values = [row[index] for index in indexes]
+            current = merged.get(label)
+            if current is None:
+                merged[label] = values
+                continue
+            overlapping.add(label)
+            merged[label] = [_combine(func, old, new) for func, old, new in zip(funcs, current, values)]
+
+    inexact = []
+    if overlapping:
+        inexact = [measure.alias for measure in parsed if measure.func == "count_distinct"]
+
+    position = {alias: index for index, alias in enumerate(aliases)}
+    rows = []
+    for label in sorted(merged):
+        values = merged[label]
+        row = [label]
+        for measure in parsed:
+            if measure.func == "avg":
+                total = values[position[f"__sum_{measure.alias}"]]
+                count = values[position[f"__count_{measure.alias}"]]
+                row.append(total / count if total is not None and count else None)
+            else:
+                row.append(values[position[measure.alias]])
+        rows.append(tuple(row))
+    return rows, inexact
+
+def bucket_ordinals(labels, bucket):
+    """Vị trí trên trục thời gian của các nhãn nhóm (số ngày, số tháng, số quý hoặc năm)"""
+    np = load_numpy()
+    if bucket not in TIME_BUCKETS:
+        raise ValueError(f"Kích thước nhóm không hỗ trợ: {bucket}. Các giá trị hợp lệ: {', '.join(TIME_BUCKETS)}")
+    if bucket in ("day", "week"):
+        return np.array([str(label)[:10] for label in labels], dtype="datetime64[D]").astype(np.float64)
+    values = []
+    for label in labels:
+        label = str(label)
+        year = int(label[:4])
+        if bucket == "month":
+            values.append(year * 12 + int(label[5:7]) - 1)
+        elif bucket == "quarter":
+            values.append(year * 4 + int(label.rsplit("Q", 1)[1]) - 1)
+        else:
+            values.append(year)
+    return np.array(values, dtype=np.float64)
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: chọn threshold điểm giữ hình dạng của chuỗi để vẽ.
+    Luôn giữ điểm đầu và điểm cuối; mỗi khoảng giữa chọn điểm tạo tam giác lớn nhất với điểm đã chọn trước
+    và trung bình của khoảng kế tiếp.
+
+    Returns:
+        Mảng chỉ số các điểm được giữ (tăng dần)
+    """
+    np = load_numpy()
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    selected[-1] = n - 1
+    return selected
+
+def downsample(rows, bucket, points, value_index=1):
+    """Giảm chuỗi xuống points điểm bằng LTTB theo cột giá trị value_index (NULL được coi là 0)"""
+    np = load_numpy()
+    if not points or len(rows) <= points:
+        return rows
+    x = bucket_ordinals([row[0] for row in rows], bucket)
+    y = np.array([row[value_index] if row[value_index] is not None else 0 for row in rows], dtype=np.float64)
+    return [rows[index] for index in lttb(x, y, points)]
+
+def build_series(shard_results, measures, bucket, points=None, downsample_by=None):
+    """
+    Gộp kết quả các shard thành chuỗi thời gian gọn, có thể giảm điểm bằng LTTB.
+
+    Returns:
+        {"series": ResultSet(["bucket", <alias>...]), "buckets", "points", "downsampled", "inexact"}
+    """
+    query_measures, parsed = plan_measures(measures)
+    rows, inexact = merge_shards(shard_results, query_measures, parsed)
+    aliases = [measure.alias for measure in parsed]
+    value_index = 1
+    if downsample_by:
+        if downsample_by not in aliases:
+            raise ValueError(f"Không tìm thấy phép đo: {downsample_by}. Các phép đo: {', '.join(aliases)}")
+        value_index = aliases.index(downsample_by) + 1
+    total = len(rows)
+    rows = downsample(rows, bucket, points, value_index)
+    result = {
+        "series": ResultSet(["bucket"] + aliases, rows),
+        "buckets": total,
+        "points": len(rows),
+        "downsampled": len(rows) < total,
+    }
+    if inexact:
+        result["inexact"] = inexact
+    return result
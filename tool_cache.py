@@ -0,0 +1,100 @@
+import json
+import time
+
+# Thời gian sống (giây) của kết quả cache theo tool, hoặc theo "tool:action" cho explore_database.
+# Tool không có trong danh sách không được cache.
+DEFAULT_TTLS = {
+    "list_available_databases": 300,
+    "get_database_summary": 120,
+    "explore_database:list_tables": 300,
+    "explore_database:describe_table": 300,
+    "explore_database:profile_table": 120,
+    "explore_database:get_data": 30,
+}
+
+# Các tool làm thay đổi danh sách database hoặc bảng: gọi xong thì xóa toàn bộ cache
+INVALIDATING_TOOLS = ("rescan_databases", "add_mysql_database", "import_data")
+
+def _result_text(result):
+    """Phần nội dung dạng chuỗi của kết quả tool (có thể là chuỗi, danh sách content block hoặc (content, artifact))"""
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in result)
+    return str(result)
+
+class ToolResultCache:
+    """
+    Cache kết quả tool MCP trong một phiên chat của client: các lời gọi chỉ đọc, cùng tham số,
+    còn trong TTL được trả lời ngay mà không đi qua stdio tới server.
+    Kết quả lỗi ([ERROR] hoặc exception) không được cache.
+
+    Một cache có thể dùng chung cho tool của nhiều phiên MCP trên cùng tập database (ví dụ các slot của
+    web_gateway): lời gọi tool thay đổi dữ liệu ở bất kỳ phiên nào đều xóa cache của tất cả, và generation
+    tăng lên để các phiên khác biết cần đồng bộ lại.
+    """
+
+    def __init__(self, ttls=None, invalidating_tools=INVALIDATING_TOOLS, clock=time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.invalidating_tools = set(invalidating_tools)
+        self.clock = clock
+        self.entries = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, tool_name, arguments):
+        """TTL cho một lời gọi: ưu tiên "tool:action", sau đó tới tên tool; None nếu không cache"""
+        action = arguments.get("action")
+        if tool_name == "explore_database" and action is None:
+            action = "list_tables"
+        if action is not None and f"{tool_name}:{action}" in self.ttls:
+            return self.ttls[f"{tool_name}:{action}"]
+        return self.ttls.get(tool_name)
+
+    def invalidate(self):
+        self.entries.clear()
+        self.generation += 1
+
+    def wrap(self, tool):
+        """Trả về bản sao của tool LangChain (từ load_mcp_tools) có đi qua cache"""
+        if tool.coroutine is None:
+            return tool
+        call_tool = tool.coroutine
+        tool_name = tool.name
+        argument_names = set(tool.args)
+
+        async def cached_call(*args, **kwargs):
+            # Chỉ dùng các tham số của tool làm khóa (bỏ qua tham số runtime do LangChain truyền vào)
+            arguments = {name: value for name, value in kwargs.items() if name in argument_names}
+
+            if tool_name in self.invalidating_tools:
+                self.invalidate()
+                return await call_tool(*args, **kwargs)
+
+            ttl = self.ttl_for(tool_name, arguments)
+            if not ttl:
+                return await call_tool(*args, **kwargs)
+
+            key = (tool_name, json.dumps(arguments, sort_keys=True, default=str))
+            entry = self.entries.get(key)
+            now = self.clock()
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            generation = self.generation
+            result = await call_tool(*args, **kwargs)
+            # Không lưu kết quả nếu cache bị xóa trong lúc chờ (kết quả có thể đã cũ)
+            if generation == self.generation and not _result_text(result).startswith("[ERROR]"):
+                self.entries[key] = (now + ttl, result)
+            return result
+
+        return tool.model_copy(update={"coroutine": cached_call})
+
+    def wrap_tools(self, tools):
+        return [self.wrap(tool) for tool in tools]
+
+    def describe(self):
+        return f"[CACHE] Tool cache: {self.hits} lần trúng, {self.misses} lần gọi server, {len(self.entries)} mục"
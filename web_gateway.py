@@ -0,0 +1,248 @@
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_mcp_adapters.tools import load_mcp_tools
+from langgraph.prebuilt import create_react_agent
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from conversation_memory import ConversationMemory
+from tool_cache import ToolResultCache
+
+# Số phiên MCP (mỗi phiên là một tiến trình mcp_tool.py) và agent được tạo sẵn
+POOL_SIZE = int(os.environ.get("GATEWAY_POOL_SIZE", "4"))
+
+# Số người dùng giữ trạng thái hội thoại và thời gian (giây) không hoạt động trước khi bị xóa
+MAX_USERS = int(os.environ.get("GATEWAY_MAX_USERS", "1000"))
+USER_IDLE_SECONDS = int(os.environ.get("GATEWAY_USER_IDLE_SECONDS", "3600"))
+
+SESSION_COOKIE = "chat_session"
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PAGE = os.path.join(SERVER_DIR, "templates", "index.html")
+INITIAL_MESSAGE = "Xin chào, tôi là Database Agent. Bạn có thể hỏi tôi về database hoặc yêu cầu tôi thực hiện các thao tác như crawl dữ liệu."
+
+class AgentSlot:
+    """
+    Một phiên MCP stdio đã khởi tạo cùng agent dựng sẵn trên các tool của phiên đó.
+    generation là generation của tool cache lần cuối phiên được đồng bộ danh sách database.
+    """
+
+    def __init__(self, index, session, agent, generation=0):
+        self.index = index
+        self.session = session
+        self.agent = agent
+        self.generation = generation
+
+class AgentPool:
+    """
+    Nhóm phiên MCP và agent được khởi tạo một lần khi gateway khởi động.
+    Mỗi yêu cầu chat mượn một slot rồi trả lại, nên không phải khởi động tiến trình server
+    và quét database cho từng yêu cầu. Các slot là các tiến trình riêng nên các tool đồng bộ
+    (chạy trực tiếp trên event loop của server) của nhiều người dùng không chặn nhau.
+
+    Các slot dùng chung một tool cache. Khi một slot gọi tool làm đổi danh sách database
+    (rescan_databases, add_mysql_database...), các slot khác quét lại database trước lần dùng kế tiếp.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.tool_cache = ToolResultCache()
+        self.slots = asyncio.Queue()
+        self.exit_stack = contextlib.AsyncExitStack()
+        self.in_use = 0
+        self.waiting = 0
+
+    async def start(self):
+        model = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=os.getenv("GOOGLE_API_KEY"))
+        # Server quét database trong thư mục làm việc: chạy trong thư mục của gateway dù khởi động từ đâu
+        server_params = StdioServerParameters(command=sys.executable, args=[os.path.join(SERVER_DIR, "mcp_tool.py")],
+                                              cwd=SERVER_DIR)
+        for index in range(self.size):
+            read, write = await self.exit_stack.enter_async_context(stdio_client(server_params))
+            session = await self.exit_stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            tools = self.tool_cache.wrap_tools(await load_mcp_tools(session))
+            agent = create_react_agent(model, tools)
+            self.slots.put_nowait(AgentSlot(index, session, agent, self.tool_cache.generation))
+            print(f"[GATEWAY] Đã khởi tạo phiên MCP {index + 1}/{self.size}", file=sys.stderr)
+
+    async def close(self):
+        await self.exit_stack.aclose()
+
+    async def _sync(self, slot):
+        """Quét lại database của slot nếu slot khác đã làm đổi danh sách database từ lần đồng bộ trước"""
+        generation = self.tool_cache.generation
+        if slot.generation == generation:
+            return
+        try:
+            await slot.session.call_tool("rescan_databases", {})
+        except Exception as e:
+            print(f"[GATEWAY] Không quét lại được database của phiên MCP {slot.index + 1}: {str(e)}", file=sys.stderr)
+        slot.generation = generation
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            slot = await self.slots.get()
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        try:
+            await self._sync(slot)
+            yield slot
+        finally:
+            self.in_use -= 1
+            self.slots.put_nowait(slot)
+
+    def stats(self):
+        return {"size": self.size, "in_use": self.in_use, "waiting": self.waiting}
+
+class UserState:
+    """Trạng thái hội thoại của một người dùng; lock đảm bảo các lượt của cùng người dùng chạy tuần tự"""
+
+    def __init__(self):
+        self.memory = ConversationMemory(
+            max_tokens=int(os.getenv("MCP_MEMORY_MAX_TOKENS", "8000")),
+            keep_recent_turns=int(os.getenv("MCP_MEMORY_RECENT_TURNS", "3")),
+            tool_result_chars=int(os.getenv("MCP_MEMORY_TOOL_CHARS", "300")),
+        )
+        self.memory.add(AIMessage(content=INITIAL_MESSAGE))
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+class UserStates:
+    """Trạng thái theo người dùng (cookie), giới hạn số lượng và xóa người dùng không hoạt động"""
+
+    def __init__(self, max_users=MAX_USERS, idle_seconds=USER_IDLE_SECONDS):
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self.states = OrderedDict()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        state = self.states.pop(user_id, None) or UserState()
+        state.last_seen = now
+        self.states[user_id] = state
+        while self.states:
+            oldest_id, oldest = next(iter(self.states.items()))
+            if len(self.states) <= self.max_users and now - oldest.last_seen < self.idle_seconds:
+                break
+            if oldest.lock.locked():
+                break
+            del self.states[oldest_id]
+        return state
+
+pool = AgentPool()
+users = UserStates()
+
+def _event(name, data):
+    """Một sự kiện Server-Sent Events"""
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _text(content):
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+async def _chat_events(state, user_message):
+    """Chạy một lượt chat và phát các sự kiện SSE: start, tool, token, done hoặc error"""
+    yield _event("start", {"pool": pool.stats()})
+    async with state.lock:
+        mark = len(state.memory.messages)
+        state.memory.add(HumanMessage(content=user_message))
+        context = state.memory.context()
+        print(state.memory.describe(), file=sys.stderr)
+        final_messages = None
+        finished = False
+        try:
+            try:
+                async with pool.acquire() as slot:
+                    async for mode, payload in slot.agent.astream({"messages": context}, stream_mode=["messages", "values"]):
+                        if mode == "values":
+                            final_messages = payload["messages"]
+                            continue
+                        message, metadata = payload
+                        if isinstance(message, AIMessageChunk):
+                            for call in message.tool_call_chunks or ():
+                                if call.get("name"):
+                                    yield _event("tool", {"name": call["name"]})
+                            text = _text(message.content)
+                            if text:
+                                yield _event("token", {"text": text})
+            except Exception as e:
+                error_message = f"Lỗi xảy ra: {str(e)}"
+                state.memory.add(AIMessage(content=error_message))
+                finished = True
+                yield _event("error", {"error": error_message})
+                return
+
+            if final_messages is None:
+                final_messages = list(context)
+            state.memory.extend(final_messages[len(context):])
+            finished = True
+            response = _text(final_messages[-1].content) if len(final_messages) > len(context) else ""
+            yield _event("done", {"response": response})
+        finally:
+            if not finished:
+                # Client ngắt kết nối giữa chừng: bỏ câu hỏi chưa có câu trả lời khỏi lịch sử
+                state.memory.truncate(mark)
+
+async def index(request):
+    return FileResponse(INDEX_PAGE)
+
+async def chat(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Yêu cầu không phải JSON hợp lệ"}, status_code=400)
+    user_message = str(body.get("message", "")).strip()
+    if not user_message:
+        return JSONResponse({"error": "Vui lòng nhập tin nhắn"}, status_code=400)
+
+    user_id = request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
+    response = StreamingResponse(
+        _chat_events(users.get(user_id), user_message), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    response.set_cookie(SESSION_COOKIE, user_id, httponly=True, samesite="lax")
+    return response
+
+async def health(request):
+    return JSONResponse({"pool": pool.stats(), "users": len(users.states)})
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    await pool.start()
+    try:
+        yield
+    finally:
+        await pool.close()
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/health", health),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    if not os.getenv("GOOGLE_API_KEY"):
+        print("[ERROR] Chưa đặt biến môi trường GOOGLE_API_KEY", file=sys.stderr)
+        sys.exit(1)
+    uvicorn.run(app, host=os.environ.get("GATEWAY_HOST", "127.0.0.1"), port=int(os.environ.get("GATEWAY_PORT", "5000")))